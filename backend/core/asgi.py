@@ -3,6 +3,15 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Los eventos en vivo (/api/eventos/, Server-Sent Events) solo funcionan con un
+servidor ASGI. Para producción, con las lecturas async y el pool de conexiones:
+
+    DB_POOL=1 LECTURAS_ASYNC=1 uvicorn core.asgi:application --workers 4
+
+Con DB_POOL=1 cada worker abre su propio pool (DB_POOL_MIN..DB_POOL_MAX
+conexiones); workers x DB_POOL_MAX no debe superar max_connections de
+PostgreSQL. core.wsgi sigue sirviendo la API completa con vistas sync.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para que el total incluya a los demás middlewares (solo con RENDIMIENTO_ACTIVO)
+    'servicios.rendimiento.RendimientoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -84,9 +87,29 @@ DATABASES = {
         'PASSWORD': 'Carmen25',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Revisa que la conexión siga viva antes de reutilizarla (persistente o del pool)
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Conexiones a PostgreSQL. Por defecto cada hilo de WSGI mantiene su conexión
+# abierta DB_CONN_MAX_AGE segundos. Con DB_POOL=1 se usa el pool de psycopg 3
+# (psycopg[pool]); es lo recomendado bajo ASGI, donde las conexiones
+# persistentes por hilo no se reutilizan bien. El pool exige CONN_MAX_AGE=0.
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+            # Segundos que un request espera una conexión libre antes de fallar
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,10 +166,41 @@ CORS_ALLOWED_ORIGINS = [
 # Configuración de Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT de simplejwt + roles precargados desde el claim 'roles' del token
+        'servicios.authentication.RolJWTAuthentication',
     )
 }
 
+# Caché (por defecto en memoria local del proceso; en producción puede apuntar a Redis/Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'systma-cache',
+    }
+}
+
+# Segundos que se reutilizan las estadísticas del dashboard (se invalidan al cambiar órdenes/avances)
+DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', 60))
+
+# Segundos que se guardan los cuerpos de estados, usuarios y detalle de órdenes
+# (GET condicional con ETag/Last-Modified; las señales los invalidan antes)
+RESPUESTAS_CACHE_TTL = int(os.environ.get('RESPUESTAS_CACHE_TTL', 300))
+
+# Medición por request (header Server-Timing + log 'servicios.rendimiento').
+# Los requests que superan los umbrales se registran como WARNING y, si su ruta
+# empieza con alguna de RENDIMIENTO_PERFIL_RUTAS, una muestra se guarda como .prof
+RENDIMIENTO_ACTIVO = os.environ.get('RENDIMIENTO_ACTIVO', '0') == '1'
+RENDIMIENTO_UMBRAL_MS = int(os.environ.get('RENDIMIENTO_UMBRAL_MS', 500))
+RENDIMIENTO_UMBRAL_QUERIES = int(os.environ.get('RENDIMIENTO_UMBRAL_QUERIES', 50))
+RENDIMIENTO_PERFIL_RUTAS = [r for r in os.environ.get('RENDIMIENTO_PERFIL_RUTAS', '').split(',') if r]
+RENDIMIENTO_PERFIL_MUESTRA = float(os.environ.get('RENDIMIENTO_PERFIL_MUESTRA', 0.1))
+RENDIMIENTO_PERFIL_DIR = os.environ.get('RENDIMIENTO_PERFIL_DIR', os.path.join(BASE_DIR, 'perfiles'))
+
+# Con LECTURAS_ASYNC=1 el listado de órdenes, los avances por orden y las estadísticas
+# del dashboard se atienden con vistas async (servicios/vistas_async.py). Pensado para
+# uvicorn (core.asgi); bajo WSGI conviene dejarlo apagado para no pasar por async_to_sync
+LECTURAS_ASYNC = os.environ.get('LECTURAS_ASYNC', '0') == '1'
+
 # Configuración básica de JWT (Opcional: aquí podrías cambiar cuánto dura la sesión)
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -154,8 +208,70 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# El usuario autenticado se arma con los claims del JWT (id, username, roles) sin leer
+# auth_user en cada request; activo/revocado se revisa con una caché de pocos segundos
+JWT_USUARIO_DESDE_TOKEN = os.environ.get('JWT_USUARIO_DESDE_TOKEN', '1') == '1'
+JWT_ESTADO_USUARIO_TTL = int(os.environ.get('JWT_ESTADO_USUARIO_TTL', 30))
+
 import os
 
 # Configuración de archivos multimedia (Fotos)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Hilos del pool que genera los reportes PDF en segundo plano (POST /api/ordenes/<id>/pdf/)
+REPORTES_PDF_WORKERS = int(os.environ.get('REPORTES_PDF_WORKERS', 2))
+
+# Subida de fotos: se escriben por bloques a un archivo temporal (no en memoria)
+# y se descartan en cuanto superan FOTO_MAX_BYTES
+FILE_UPLOAD_HANDLERS = [
+    'servicios.uploads.LimiteTamanoUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FOTO_MAX_BYTES = int(os.environ.get('FOTO_MAX_BYTES', 15 * 1024 * 1024))
+AVANCE_MAX_FOTOS = int(os.environ.get('AVANCE_MAX_FOTOS', 30))
+# Hilos para guardar en paralelo las fotos de un avance
+FOTOS_WORKERS = int(os.environ.get('FOTOS_WORKERS', 4))
+
+# Máximo de filas por lote en /api/ordenes/bulk/
+ORDENES_BULK_MAX = int(os.environ.get('ORDENES_BULK_MAX', 1000))
+
+# Filas que se leen por vez del cursor al exportar órdenes y avances a CSV/XLSX
+EXPORTAR_CHUNK = int(os.environ.get('EXPORTAR_CHUNK', 2000))
+
+# Días de validez de la URL .ics de suscripción al calendario (también deja de
+# servir si el técnico se desactiva o cambia su contraseña)
+CALENDARIO_SUSCRIPCION_DIAS = int(os.environ.get('CALENDARIO_SUSCRIPCION_DIAS', 90))
+
+# Ruta diaria de los técnicos (GET /api/rutas/): jornada, velocidad media en ciudad,
+# minutos por visita y segundos máximos de cálculo por request
+RUTAS_INICIO_JORNADA = os.environ.get('RUTAS_INICIO_JORNADA', '08:00')
+RUTAS_FIN_JORNADA = os.environ.get('RUTAS_FIN_JORNADA', '18:00')
+RUTAS_VELOCIDAD_KMH = float(os.environ.get('RUTAS_VELOCIDAD_KMH', 30))
+RUTAS_MINUTOS_SERVICIO = int(os.environ.get('RUTAS_MINUTOS_SERVICIO', 45))
+RUTAS_PRESUPUESTO_S = float(os.environ.get('RUTAS_PRESUPUESTO_S', 2.0))
+RUTAS_MAX_PARADAS = int(os.environ.get('RUTAS_MAX_PARADAS', 500))
+
+# Sincronización incremental (GET /api/sync/): días que se guardan los registros de
+# borrado (un celular más desactualizado recibe todo de nuevo), segundos de margen
+# hacia atrás en cada consulta y máximo de avances por subida offline
+SYNC_RETENCION_DIAS = int(os.environ.get('SYNC_RETENCION_DIAS', 30))
+SYNC_MARGEN_S = int(os.environ.get('SYNC_MARGEN_S', 5))
+SYNC_MAX_AVANCES = int(os.environ.get('SYNC_MAX_AVANCES', 50))
+
+# Asignación automática de técnicos: puntaje = carga abierta * PESO_CARGA
+# + km a sus órdenes abiertas * PESO_KM + choques de agenda * PESO_SOLAPE
+ASIGNACION_PESO_CARGA = float(os.environ.get('ASIGNACION_PESO_CARGA', 1.0))
+ASIGNACION_PESO_KM = float(os.environ.get('ASIGNACION_PESO_KM', 0.2))
+ASIGNACION_PESO_SOLAPE = float(os.environ.get('ASIGNACION_PESO_SOLAPE', 5.0))
+# Duración supuesta (minutos) de una orden sin fecha_fin
+ASIGNACION_DURACION_MIN = int(os.environ.get('ASIGNACION_DURACION_MIN', 120))
+
+# Eventos en vivo (GET /api/eventos/, Server-Sent Events; requiere servir con core.asgi).
+# Con varios procesos ASGI se necesita un broker: EVENTOS_REDIS_URL=redis://... (paquete 'redis').
+# Vacío = pub/sub en memoria del proceso.
+EVENTOS_REDIS_URL = os.environ.get('EVENTOS_REDIS_URL', '')
+# Segundos entre comentarios "ping" para que los proxies no corten la conexión
+EVENTOS_PING_S = int(os.environ.get('EVENTOS_PING_S', 15))
+# Segundos que vale el ticket de un solo uso para abrir el stream (POST /api/eventos/ticket/)
+EVENTOS_TICKET_S = int(os.environ.get('EVENTOS_TICKET_S', 30))
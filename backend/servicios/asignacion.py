@@ -0,0 +1,198 @@
+import bisect
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .estadisticas import filtro_abiertas, invalidar_estadisticas
+from .models import OrdenTrabajo
+from .reportes import invalidar_cache_reporte
+from .rutas import distancias_entre
+from .sincronizacion import registrar_salidas
+
+# --- ASIGNACIÓN AUTOMÁTICA DE TÉCNICOS ---
+# Un lote completo se resuelve con tres consultas: las órdenes a asignar
+# (ordenes_para_asignar) y, al proponer, dos más: técnicos con su carga y
+# posición (promedio de sus órdenes abiertas) y la agenda abierta de la ventana
+# del lote. La elección se hace en memoria, orden por
+# orden, actualizando la carga y la agenda de cada técnico al asignar.
+
+CAMPOS_ORDEN = ('id', 'latitud', 'longitud', 'fecha_inicio', 'fecha_fin', 'tecnico', 'supervisor', 'actualizado_en')
+
+
+def _pesos():
+    return (
+        getattr(settings, 'ASIGNACION_PESO_CARGA', 1.0),
+        getattr(settings, 'ASIGNACION_PESO_KM', 0.2),
+        getattr(settings, 'ASIGNACION_PESO_SOLAPE', 5.0),
+    )
+
+
+def _intervalo(orden, duracion):
+    inicio = orden.fecha_inicio
+    if inicio is None:
+        return None
+    fin = orden.fecha_fin if orden.fecha_fin and orden.fecha_fin > inicio else inicio + duracion
+    return inicio, fin
+
+
+class _Plantel:
+    """Estado en memoria de los técnicos candidatos mientras se asigna un lote."""
+
+    def __init__(self, ordenes):
+        self.duracion = timedelta(minutes=getattr(settings, 'ASIGNACION_DURACION_MIN', 120))
+        abiertas = filtro_abiertas('ordenes_tecnico__')
+        con_ubicacion = abiertas & Q(ordenes_tecnico__latitud__isnull=False, ordenes_tecnico__longitud__isnull=False)
+        tecnicos = list(
+            User.objects.filter(groups__name='Tecnico', is_active=True)
+            .annotate(
+                abiertas=Count('ordenes_tecnico', filter=abiertas),
+                lat=Avg('ordenes_tecnico__latitud', filter=con_ubicacion),
+                lon=Avg('ordenes_tecnico__longitud', filter=con_ubicacion),
+                con_ubicacion=Count('ordenes_tecnico', filter=con_ubicacion),
+            )
+            .order_by('id')
+            .values('id', 'username', 'abiertas', 'lat', 'lon', 'con_ubicacion')
+        )
+        self.ids = [t['id'] for t in tecnicos]
+        self.nombres = [t['username'] for t in tecnicos]
+        self.carga = np.array([t['abiertas'] for t in tecnicos], dtype=float)
+        self.lat = np.array([np.nan if t['lat'] is None else float(t['lat']) for t in tecnicos])
+        self.lon = np.array([np.nan if t['lon'] is None else float(t['lon']) for t in tecnicos])
+        self.con_ubicacion = np.array([t['con_ubicacion'] for t in tecnicos], dtype=float)
+        self.agenda = self._cargar_agenda(ordenes)
+
+    def _cargar_agenda(self, ordenes):
+        intervalos = [i for i in (_intervalo(o, self.duracion) for o in ordenes) if i]
+        agenda = {tecnico_id: [] for tecnico_id in self.ids}
+        if not intervalos or not self.ids:
+            return agenda
+        desde = min(i[0] for i in intervalos) - timedelta(days=1)
+        hasta = max(i[1] for i in intervalos)
+        filas = (
+            OrdenTrabajo.objects.filter(filtro_abiertas(), tecnico_id__in=self.ids, fecha_inicio__gte=desde, fecha_inicio__lt=hasta)
+            .exclude(id__in=[o.id for o in ordenes])
+            .only('tecnico', 'fecha_inicio', 'fecha_fin')
+        )
+        for orden in filas:
+            agenda[orden.tecnico_id].append(_intervalo(orden, self.duracion))
+        for intervalos_tecnico in agenda.values():
+            intervalos_tecnico.sort()
+        return agenda
+
+    def _solapes(self, tecnico_id, intervalo):
+        if intervalo is None:
+            return 0
+        inicio, fin = intervalo
+        # Solo pueden solapar los que empiezan entre (inicio - 1 día) y fin
+        intervalos = self.agenda[tecnico_id]
+        desde = bisect.bisect_left(intervalos, inicio - timedelta(days=1), key=lambda i: i[0])
+        hasta = bisect.bisect_left(intervalos, fin, key=lambda i: i[0])
+        return sum(1 for _, fin_otro in intervalos[desde:hasta] if fin_otro > inicio)
+
+    def evaluar(self, orden):
+        """Devuelve (puntaje, distancias_km, solapes) de la orden para cada técnico."""
+        peso_carga, peso_km, peso_solape = _pesos()
+        if orden.latitud is not None and orden.longitud is not None:
+            distancias = distancias_entre([orden.latitud], [orden.longitud], self.lat, self.lon)[0]
+        else:
+            distancias = np.full(len(self.ids), np.nan)
+        # Sin posición conocida se asume la distancia mediana para no premiar ni castigar
+        conocidas = distancias[~np.isnan(distancias)]
+        relleno = float(np.median(conocidas)) if conocidas.size else 0.0
+        costo_km = np.where(np.isnan(distancias), relleno, distancias)
+
+        intervalo = _intervalo(orden, self.duracion)
+        solapes = np.array([self._solapes(t, intervalo) for t in self.ids], dtype=float)
+        puntaje = peso_carga * self.carga + peso_km * costo_km + peso_solape * solapes
+        return puntaje, distancias, solapes
+
+    def asignar(self, indice, orden):
+        self.carga[indice] += 1
+        if orden.latitud is not None and orden.longitud is not None:
+            # La posición del técnico es el promedio de sus órdenes abiertas
+            n = self.con_ubicacion[indice]
+            if n == 0:
+                self.lat[indice], self.lon[indice] = float(orden.latitud), float(orden.longitud)
+            else:
+                self.lat[indice] = (self.lat[indice] * n + float(orden.latitud)) / (n + 1)
+                self.lon[indice] = (self.lon[indice] * n + float(orden.longitud)) / (n + 1)
+            self.con_ubicacion[indice] = n + 1
+        intervalo = _intervalo(orden, self.duracion)
+        if intervalo:
+            bisect.insort(self.agenda[self.ids[indice]], intervalo)
+
+    def candidato(self, indice, puntaje, distancias, solapes):
+        return {
+            'tecnico': self.ids[indice],
+            'tecnico_nombre': self.nombres[indice],
+            'puntaje': round(float(puntaje[indice]), 3),
+            'carga': int(self.carga[indice]),
+            'distancia_km': None if np.isnan(distancias[indice]) else round(float(distancias[indice]), 3),
+            'solapes': int(solapes[indice]),
+        }
+
+
+def sugerir_tecnicos(orden, limite=5):
+    """Técnicos ordenados del más al menos conveniente para la orden."""
+    plantel = _Plantel([orden])
+    if not plantel.ids:
+        return []
+    puntaje, distancias, solapes = plantel.evaluar(orden)
+    return [plantel.candidato(i, puntaje, distancias, solapes) for i in np.argsort(puntaje, kind='stable')[:limite]]
+
+
+def proponer_asignaciones(ordenes):
+    """
+    Elige un técnico para cada orden del lote (primero las que empiezan antes).
+    Devuelve [{'orden': id, 'tecnico': id, ...}] sin guardar nada.
+    """
+    plantel = _Plantel(ordenes)
+    if not plantel.ids:
+        return []
+    propuestas = []
+    pendientes = sorted(ordenes, key=lambda o: (o.fecha_inicio is None, o.fecha_inicio or 0, o.id))
+    for orden in pendientes:
+        puntaje, distancias, solapes = plantel.evaluar(orden)
+        indice = int(np.argmin(puntaje))
+        propuestas.append({'orden': orden.id, **plantel.candidato(indice, puntaje, distancias, solapes)})
+        plantel.asignar(indice, orden)
+    return propuestas
+
+
+def aplicar_asignaciones(ordenes, propuestas):
+    por_id = {o.id: o for o in ordenes}
+    ahora = timezone.now()
+    cambiadas = []
+    for propuesta in propuestas:
+        orden = por_id[propuesta['orden']]
+        orden.tecnico_id = propuesta['tecnico']
+        orden.actualizado_en = ahora
+        cambiadas.append(orden)
+    with transaction.atomic():
+        OrdenTrabajo.objects.bulk_update(cambiadas, ['tecnico', 'actualizado_en'])
+        registrar_salidas(cambiadas)
+    # bulk_update no dispara señales
+    invalidar_estadisticas()
+    for orden in cambiadas:
+        invalidar_cache_reporte(orden.id)
+    return cambiadas
+
+
+def ordenes_para_asignar(ids=None, supervisor_id=None):
+    """
+    Órdenes abiertas del lote (o todas las abiertas sin técnico) que el usuario
+    puede asignar. Las finalizadas o canceladas del lote se omiten.
+    """
+    queryset = OrdenTrabajo.objects.only(*CAMPOS_ORDEN).filter(filtro_abiertas())
+    if ids is None:
+        queryset = queryset.filter(tecnico__isnull=True)
+    else:
+        queryset = queryset.filter(id__in=ids)
+    if supervisor_id is not None:
+        queryset = queryset.filter(Q(supervisor_id=supervisor_id) | Q(supervisor__isnull=True))
+    return list(queryset.order_by('id')[:getattr(settings, 'ORDENES_BULK_MAX', 1000)])
@@ -0,0 +1,152 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .rendimiento import medir
+from .roles import asignar_roles
+
+
+class UsuarioToken(TokenUser):
+    """
+    Usuario armado con los claims del JWT (id, username, roles). is_staff e
+    is_superuser salen de la caché de estado, no de los claims (que pueden
+    tener hasta una hora). Si una vista necesita cualquier otro dato (email, first_name,
+    ...), grupos, permisos de Django o el modelo en sí (ver usuario_modelo),
+    se carga el User de la base una sola vez.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def modelo(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    # TokenUser responde vacío/False en todo esto; se delega al User real
+    @property
+    def groups(self):
+        return self.modelo.groups
+
+    @property
+    def user_permissions(self):
+        return self.modelo.user_permissions
+
+    def get_group_permissions(self, obj=None):
+        return self.modelo.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.modelo.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        return self.modelo.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return self.modelo.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module):
+        return self.modelo.has_module_perms(module)
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self.modelo, nombre)
+
+
+def usuario_modelo(user):
+    """Instancia real de User (para asignarla a una FK), sin importar el modo de autenticación."""
+    return user.modelo if isinstance(user, UsuarioToken) else user
+
+
+# --- ESTADO DE LOS USUARIOS (activo / contraseña / staff) CON TTL CORTO ---
+# Evita leer auth_user en cada request sin dejar de detectar, en pocos
+# segundos, a un usuario desactivado o con la contraseña cambiada.
+
+_estado_usuarios = {}
+_lock = threading.Lock()
+
+
+def _estado_usuario(user_id):
+    ttl = getattr(settings, 'JWT_ESTADO_USUARIO_TTL', 30)
+    ahora = time.monotonic()
+    with _lock:
+        guardado = _estado_usuarios.get(user_id)
+    if guardado and guardado[0] > ahora:
+        return guardado[1]
+
+    fila = (
+        get_user_model().objects.filter(pk=user_id)
+        .values('is_active', 'is_staff', 'is_superuser', 'password').first()
+    )
+    estado = fila and {
+        'is_active': fila['is_active'],
+        'is_staff': fila['is_staff'],
+        'is_superuser': fila['is_superuser'],
+        'password_hash': get_md5_hash_password(fila['password']),
+    }
+    with _lock:
+        _estado_usuarios[user_id] = (ahora + ttl, estado)
+    return estado
+
+
+def olvidar_estado_usuario(user_id):
+    with _lock:
+        _estado_usuarios.pop(user_id, None)
+
+
+class RolJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que confía en el claim 'roles' del token (lo agrega
+    MyTokenObtainPairSerializer), así las validaciones de rol no consultan
+    la base de datos. Los tokens antiguos sin el claim siguen funcionando:
+    los roles se resuelven con una consulta la primera vez que se piden.
+
+    Con JWT_USUARIO_DESDE_TOKEN activo tampoco se lee el User en cada request:
+    se devuelve un UsuarioToken y el estado activo/revocado se valida contra
+    una caché en memoria de JWT_ESTADO_USUARIO_TTL segundos.
+    """
+
+    def authenticate(self, request):
+        with medir('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        roles = validated_token.get('roles')
+        if roles is not None and getattr(settings, 'JWT_USUARIO_DESDE_TOKEN', False):
+            return self._usuario_desde_token(validated_token, roles)
+
+        user = super().get_user(validated_token)
+        if roles is not None:
+            asignar_roles(user, roles)
+        return user
+
+    def _usuario_desde_token(self, validated_token, roles):
+        try:
+            user = UsuarioToken(validated_token)
+            user_id = user.id
+        except (KeyError, ValueError) as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        estado = _estado_usuario(user_id)
+        if estado is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not estado['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != estado['password_hash']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        user.is_staff = estado['is_staff']
+        user.is_superuser = estado['is_superuser']
+        asignar_roles(user, roles)
+        return user
+
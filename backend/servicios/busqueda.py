@@ -0,0 +1,178 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.utils.html import escape
+
+from .models import Avance, OrdenTrabajo
+
+# --- BÚSQUEDA DE TEXTO COMPLETO EN ÓRDENES Y BITÁCORA ---
+# En PostgreSQL cada orden guarda su tsvector (columna 'busqueda', índice GIN)
+# con pesos: titulo A, descripcion B, direccion C y el contenido de sus avances D.
+# Se recalcula desde signals.py al confirmar la transacción, solo si cambió algún
+# texto (y en las cargas masivas). En otros motores (SQLite en las pruebas) se
+# busca con icontains y se ordena en Python.
+
+CONFIG = 'spanish'
+PESOS = {'titulo': 1.0, 'descripcion': 0.4, 'direccion': 0.2, 'avance': 0.1}
+# Marcas temporales del resaltado: se reemplazan por <mark> después de escapar el HTML
+_INICIO, _FIN = '\x02', '\x03'
+MAX_CANDIDATAS_SIN_POSTGRES = 2000
+
+
+def usa_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _vector(texto_avances):
+    return (
+        SearchVector('titulo', weight='A', config=CONFIG)
+        + SearchVector('descripcion', weight='B', config=CONFIG)
+        + SearchVector('direccion', weight='C', config=CONFIG)
+        + SearchVector(Value(texto_avances), weight='D', config=CONFIG)
+    )
+
+
+def actualizar_indice_busqueda(orden_ids):
+    """Recalcula el tsvector de las órdenes indicadas (solo PostgreSQL)."""
+    orden_ids = [i for i in orden_ids if i is not None]
+    if not usa_postgres() or not orden_ids:
+        return
+    textos = defaultdict(list)
+    for orden_id, contenido in Avance.objects.filter(orden_id__in=orden_ids).order_by('id').values_list('orden_id', 'contenido'):
+        textos[orden_id].append(contenido)
+
+    # Las órdenes sin avances (p. ej. recién importadas) se actualizan en un solo UPDATE
+    sin_avances = [i for i in orden_ids if i not in textos]
+    if sin_avances:
+        OrdenTrabajo.objects.filter(pk__in=sin_avances).update(busqueda=_vector(''))
+    for orden_id, contenidos in textos.items():
+        OrdenTrabajo.objects.filter(pk=orden_id).update(busqueda=_vector(' '.join(contenidos)))
+
+
+def resaltado_html(texto):
+    """Escapa el fragmento y convierte las marcas en <mark>."""
+    return escape(texto).replace(_INICIO, '<mark>').replace(_FIN, '</mark>')
+
+
+def _headline(campo, query):
+    return SearchHeadline(campo, query, config=CONFIG, start_sel=_INICIO, stop_sel=_FIN, max_fragments=2)
+
+
+def _buscar_postgres(queryset, texto, limite):
+    query = SearchQuery(texto, search_type='websearch', config=CONFIG)
+    ranking = list(
+        queryset.filter(busqueda=query)
+        .annotate(rank=SearchRank(F('busqueda'), query))
+        .order_by('-rank', '-id')
+        .values_list('id', 'rank')[:limite]
+    )
+    if not ranking:
+        return []
+    ids = [orden_id for orden_id, _ in ranking]
+
+    # Los fragmentos se calculan solo para las órdenes que se devuelven
+    filas = OrdenTrabajo.objects.filter(pk__in=ids).annotate(
+        h_titulo=_headline('titulo', query),
+        h_descripcion=_headline('descripcion', query),
+        h_direccion=_headline('direccion', query),
+    ).values('id', 'titulo', 'estado__nombre', 'h_titulo', 'h_descripcion', 'h_direccion')
+    avances = (
+        Avance.objects.filter(orden_id__in=ids)
+        .annotate(vector=SearchVector('contenido', config=CONFIG))
+        .filter(vector=query)
+        .annotate(h_contenido=_headline('contenido', query))
+        .order_by('-creado_en')
+        .values_list('orden_id', 'h_contenido')
+    )
+    fragmento_avance = {}
+    for orden_id, fragmento in avances:
+        fragmento_avance.setdefault(orden_id, fragmento)
+
+    por_id = {fila['id']: fila for fila in filas}
+    resultados = []
+    for orden_id, rank in ranking:
+        fila = por_id[orden_id]
+        fragmentos = {
+            'titulo': fila['h_titulo'], 'descripcion': fila['h_descripcion'],
+            'direccion': fila['h_direccion'], 'avance': fragmento_avance.get(orden_id, ''),
+        }
+        resultados.append(_resultado(fila, rank, fragmentos))
+    return resultados
+
+
+# --- RESPALDO SIN POSTGRESQL ---
+
+def _terminos(texto):
+    return [t for t in re.findall(r'\w+', texto.lower()) if len(t) > 1]
+
+
+def _fragmento(texto, terminos, ancho=160):
+    """Recorta alrededor de la primera coincidencia y marca los términos."""
+    patron = re.compile('|'.join(re.escape(t) for t in terminos), re.IGNORECASE)
+    coincidencia = patron.search(texto or '')
+    if not coincidencia:
+        return ''
+    inicio = max(0, coincidencia.start() - ancho // 3)
+    recorte = texto[inicio:inicio + ancho]
+    recorte = patron.sub(lambda m: f'{_INICIO}{m.group(0)}{_FIN}', recorte)
+    return ('…' if inicio else '') + recorte + ('…' if inicio + ancho < len(texto) else '')
+
+
+def _buscar_sin_postgres(queryset, texto, limite):
+    terminos = _terminos(texto)
+    if not terminos:
+        return []
+    filtro = Q()
+    for termino in terminos:
+        filtro &= (
+            Q(titulo__icontains=termino) | Q(descripcion__icontains=termino)
+            | Q(direccion__icontains=termino) | Q(avances__contenido__icontains=termino)
+        )
+    filas = list(
+        queryset.filter(filtro).distinct().order_by('-id')
+        .values('id', 'titulo', 'descripcion', 'direccion', 'estado__nombre')[:MAX_CANDIDATAS_SIN_POSTGRES]
+    )
+    avances = defaultdict(list)
+    for orden_id, contenido in Avance.objects.filter(orden_id__in=[f['id'] for f in filas]).order_by('-creado_en').values_list('orden_id', 'contenido'):
+        avances[orden_id].append(contenido)
+
+    resultados = []
+    for fila in filas:
+        textos = {
+            'titulo': fila['titulo'], 'descripcion': fila['descripcion'],
+            'direccion': fila['direccion'], 'avance': ' '.join(avances[fila['id']]),
+        }
+        rank = sum(
+            peso * textos[campo].lower().count(termino)
+            for campo, peso in PESOS.items() for termino in terminos
+        )
+        fragmentos = {campo: _fragmento(textos[campo], terminos) for campo in ('titulo', 'descripcion', 'direccion')}
+        # Fragmento del avance más reciente que coincide
+        fragmentos['avance'] = next(filter(None, (_fragmento(a, terminos) for a in avances[fila['id']])), '')
+        resultados.append(_resultado(fila, rank, fragmentos))
+    resultados.sort(key=lambda r: (-r['rank'], -r['id']))
+    return resultados[:limite]
+
+
+def _resultado(fila, rank, fragmentos):
+    return {
+        'id': fila['id'],
+        'titulo': fila['titulo'],
+        'estado': fila['estado__nombre'],
+        'rank': round(float(rank), 4),
+        # Solo los campos donde hubo coincidencias
+        'resaltado': {campo: resaltado_html(f) for campo, f in fragmentos.items() if f and _INICIO in f},
+    }
+
+
+def buscar_ordenes(queryset, texto, limite=50):
+    """Órdenes que coinciden con el texto, de la más a la menos relevante, con fragmentos resaltados."""
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    if usa_postgres():
+        return _buscar_postgres(queryset, texto, limite)
+    return _buscar_sin_postgres(queryset, texto, limite)
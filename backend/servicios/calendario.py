@@ -0,0 +1,137 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import OrdenTrabajo
+
+# --- CALENDARIO: EVENTOS LIVIANOS E ICS ---
+
+CAMPOS_EVENTO = (
+    'id', 'titulo', 'fecha_inicio', 'fecha_fin', 'tecnico_id', 'tecnico__username',
+    'estado__nombre', 'estado__color',
+)
+COLOR_POR_DEFECTO = '#3788d8'
+SAL_SUSCRIPCION = 'servicios.calendario.suscripcion'
+
+
+def eventos_en_ventana(inicio, fin, tecnico_id=None):
+    """Órdenes que empiezan en [inicio, fin), solo con los campos que necesita un evento."""
+    queryset = OrdenTrabajo.objects.filter(fecha_inicio__gte=inicio, fecha_inicio__lt=fin)
+    if tecnico_id is not None:
+        queryset = queryset.filter(tecnico_id=tecnico_id)
+    for fila in queryset.order_by('fecha_inicio', 'id').values(*CAMPOS_EVENTO):
+        yield {
+            'id': fila['id'],
+            'titulo': fila['titulo'],
+            'fecha_inicio': fila['fecha_inicio'],
+            'fecha_fin': fila['fecha_fin'],
+            'estado': fila['estado__nombre'],
+            'color': fila['estado__color'] or COLOR_POR_DEFECTO,
+            'tecnico': fila['tecnico_id'],
+            'tecnico_nombre': fila['tecnico__username'],
+        }
+
+
+# --- SUSCRIPCIÓN (URL FIRMADA) ---
+# Las apps de calendario del celular no envían el JWT, así que el feed .ics se
+# protege con un token firmado que identifica al técnico. El token vence a los
+# CALENDARIO_SUSCRIPCION_DIAS y lleva una huella de la contraseña: si el técnico
+# la cambia (o se desactiva) las URLs filtradas dejan de servir.
+
+def _huella(password_hash):
+    return salted_hmac(SAL_SUSCRIPCION, password_hash).hexdigest()[:16]
+
+
+def token_suscripcion(tecnico_id):
+    password_hash = User.objects.filter(pk=tecnico_id).values_list('password', flat=True).first() or ''
+    return signing.dumps([tecnico_id, _huella(password_hash)], salt=SAL_SUSCRIPCION)
+
+
+def tecnico_de_token(token):
+    """Id del técnico si el token está vigente y el usuario sigue activo con la misma contraseña."""
+    dias = getattr(settings, 'CALENDARIO_SUSCRIPCION_DIAS', 90)
+    try:
+        tecnico_id, huella = signing.loads(token, salt=SAL_SUSCRIPCION, max_age=timedelta(days=dias))
+        tecnico_id = int(tecnico_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    password_hash = User.objects.filter(pk=tecnico_id, is_active=True).values_list('password', flat=True).first()
+    if password_hash is None or not constant_time_compare(huella, _huella(password_hash)):
+        return None
+    return tecnico_id
+
+
+# --- FORMATO iCalendar (RFC 5545) ---
+
+def _escapar(texto):
+    return (
+        (texto or '')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _fecha_ics(fecha):
+    return fecha.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _linea(contenido):
+    # Las líneas de más de 75 octetos se pliegan con CRLF + espacio
+    datos = contenido.encode('utf-8')
+    if len(datos) <= 75:
+        return contenido + '\r\n'
+    partes, actual = [], ''
+    for caracter in contenido:
+        limite = 75 if not partes else 74
+        if len((actual + caracter).encode('utf-8')) > limite:
+            partes.append(actual)
+            actual = ''
+        actual += caracter
+    partes.append(actual)
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def generar_ics(ordenes, nombre_calendario):
+    """Genera el calendario línea por línea para enviarlo con StreamingHttpResponse."""
+    ahora = _fecha_ics(timezone.now())
+    yield _linea('BEGIN:VCALENDAR')
+    yield _linea('VERSION:2.0')
+    yield _linea('PRODID:-//SystMa//Gestion de Ordenes//ES')
+    yield _linea('CALSCALE:GREGORIAN')
+    yield _linea(f'X-WR-CALNAME:{_escapar(nombre_calendario)}')
+    for orden in ordenes:
+        fin = orden['fecha_fin'] if orden['fecha_fin'] and orden['fecha_fin'] > orden['fecha_inicio'] \
+            else orden['fecha_inicio'] + timedelta(hours=1)
+        yield _linea('BEGIN:VEVENT')
+        yield _linea(f"UID:orden-{orden['id']}@systma")
+        yield _linea(f'DTSTAMP:{ahora}')
+        yield _linea(f"DTSTART:{_fecha_ics(orden['fecha_inicio'])}")
+        yield _linea(f'DTEND:{_fecha_ics(fin)}')
+        yield _linea(f"SUMMARY:{_escapar(orden['titulo'])}")
+        if orden['direccion']:
+            yield _linea(f"LOCATION:{_escapar(orden['direccion'])}")
+        if orden['estado__nombre']:
+            yield _linea(f"DESCRIPTION:{_escapar('Estado: ' + orden['estado__nombre'])}")
+        yield _linea('END:VEVENT')
+    yield _linea('END:VCALENDAR')
+
+
+def ordenes_para_ics(tecnico_id, dias_atras=90, dias_adelante=365):
+    ahora = timezone.now()
+    return (
+        OrdenTrabajo.objects.filter(
+            tecnico_id=tecnico_id,
+            fecha_inicio__gte=ahora - timedelta(days=dias_atras),
+            fecha_inicio__lt=ahora + timedelta(days=dias_adelante),
+        )
+        .order_by('fecha_inicio', 'id')
+        .values('id', 'titulo', 'direccion', 'fecha_inicio', 'fecha_fin', 'estado__nombre')
+        .iterator(chunk_size=500)
+    )
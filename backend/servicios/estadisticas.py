@@ -0,0 +1,182 @@
+import hashlib
+import uuid
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Estado
+
+# --- ESTADÍSTICAS DEL DASHBOARD ---
+
+ESTADO_FINALIZADO = 'Finalizado'
+ESTADOS_CERRADOS = ('Finalizado', 'Cancelado')
+
+
+def filtro_abiertas(prefijo=''):
+    """
+    Q de las órdenes abiertas: sin estado o con un estado que no cierra. Es la
+    definición única (listado ?abiertas=1, asignación, rutas); fecha_fin no sirve
+    porque también es la hora de fin planificada y cancelar no la completa.
+    """
+    return ~Q(**{f'{prefijo}estado__nombre__in': ESTADOS_CERRADOS}) | Q(**{f'{prefijo}estado__isnull': True})
+
+# Claves "planas" que el Dashboard ya conocía (total, pendientes, ...)
+CLAVES_POR_ESTADO = {
+    'Pendiente': 'pendientes',
+    'En Progreso': 'en_progreso',
+    'En Revisión': 'en_revision',
+    'Finalizado': 'finalizados',
+    'Cancelado': 'cancelados',
+}
+
+
+def _conteos_por_estado(queryset, estados):
+    # Una sola query con agregación condicional para todos los estados
+    agregados = {'total': Count('id'), 'sin_estado': Count('id', filter=Q(estado__isnull=True))}
+    for estado in estados:
+        agregados[f'estado_{estado.id}'] = Count('id', filter=Q(estado_id=estado.id))
+    fila = queryset.aggregate(**agregados)
+
+    resultado = {'total': fila['total'], 'sin_estado': fila['sin_estado']}
+    resultado.update({clave: 0 for clave in CLAVES_POR_ESTADO.values()})
+    por_estado = []
+    for estado in estados:
+        cantidad = fila[f'estado_{estado.id}']
+        por_estado.append({'id': estado.id, 'nombre': estado.nombre, 'color': estado.color, 'total': cantidad})
+        if estado.nombre in CLAVES_POR_ESTADO:
+            resultado[CLAVES_POR_ESTADO[estado.nombre]] = cantidad
+    resultado['por_estado'] = por_estado
+    return resultado
+
+
+def _carga_por_usuario(queryset, campo):
+    filas = (
+        queryset.filter(**{f'{campo}__isnull': False})
+        .values(campo, f'{campo}__username')
+        .annotate(
+            total=Count('id'),
+            abiertas=Count('id', filter=filtro_abiertas()),
+            finalizadas=Count('id', filter=Q(estado__nombre=ESTADO_FINALIZADO)),
+        )
+        .order_by(f'{campo}__username')
+    )
+    return [
+        {
+            'id': fila[campo],
+            'username': fila[f'{campo}__username'],
+            'total': fila['total'],
+            'abiertas': fila['abiertas'],
+            'finalizadas': fila['finalizadas'],
+        }
+        for fila in filas
+    ]
+
+
+def _conteo_diario(queryset, campo_fecha, inicio):
+    filas = (
+        queryset.filter(**{f'{campo_fecha}__gte': inicio})
+        .annotate(dia=TruncDate(campo_fecha))
+        .values('dia')
+        .annotate(cantidad=Count('id'))
+        .order_by()
+    )
+    return {fila['dia']: fila['cantidad'] for fila in filas}
+
+
+def _histogramas(queryset, dias, semanas):
+    hoy = timezone.localdate()
+    # Las semanas van de lunes a domingo; se consulta una sola vez la ventana más larga
+    primer_lunes = hoy - timedelta(days=hoy.weekday()) - timedelta(weeks=semanas - 1)
+    primer_dia = min(hoy - timedelta(days=dias - 1), primer_lunes)
+    inicio = timezone.make_aware(datetime.combine(primer_dia, time.min))
+
+    creadas = _conteo_diario(queryset, 'creado_en', inicio)
+    # La fecha de cierre es fecha_fin, que se registra al finalizar la orden
+    finalizadas = _conteo_diario(queryset.filter(estado__nombre=ESTADO_FINALIZADO), 'fecha_fin', inicio)
+
+    diario = []
+    for i in range(dias - 1, -1, -1):
+        dia = hoy - timedelta(days=i)
+        diario.append({'fecha': dia, 'creadas': creadas.get(dia, 0), 'finalizadas': finalizadas.get(dia, 0)})
+
+    semanal = []
+    for i in range(semanas):
+        lunes = primer_lunes + timedelta(weeks=i)
+        semana = [lunes + timedelta(days=d) for d in range(7)]
+        semanal.append({
+            'semana': lunes,
+            'creadas': sum(creadas.get(d, 0) for d in semana),
+            'finalizadas': sum(finalizadas.get(d, 0) for d in semana),
+        })
+
+    return {'diario': diario, 'semanal': semanal}
+
+
+def calcular_estadisticas(queryset, dias=30, semanas=12):
+    """
+    Resumen del dashboard sobre `queryset` (ya filtrado): conteos por cada
+    Estado, carga por técnico y supervisor e histogramas diarios/semanales
+    de órdenes creadas y finalizadas. Son seis queries de tamaño fijo (estados,
+    conteos, una agrupación por técnico, otra por supervisor y una por cada
+    fecha del histograma): cada una agrupa por otra columna, y el resultado
+    queda en caché hasta que cambia una orden o un avance.
+    """
+    estados = list(Estado.objects.order_by('orden', 'id'))
+
+    datos = _conteos_por_estado(queryset, estados)
+    datos['por_tecnico'] = _carga_por_usuario(queryset, 'tecnico')
+    datos['por_supervisor'] = _carga_por_usuario(queryset, 'supervisor')
+    datos['histograma'] = _histogramas(queryset, dias, semanas)
+    return datos
+
+
+# --- CACHÉ ---
+# Cada combinación de filtros se guarda bajo una "versión" global; las señales
+# cambian la versión y así todas las entradas anteriores quedan obsoletas a la vez.
+
+CLAVE_VERSION = 'dashboard-stats:version'
+
+
+def _version_actual():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(CLAVE_VERSION, version, None)
+        version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def clave_estadisticas(params):
+    filtros = '&'.join(f'{k}={v}' for k, valores in sorted(params.lists()) for v in valores)
+    resumen = hashlib.md5(filtros.encode('utf-8')).hexdigest()
+    # El día forma parte de la clave porque los histogramas terminan en "hoy"
+    return f'dashboard-stats:{_version_actual()}:{timezone.localdate().isoformat()}:{resumen}'
+
+
+def invalidar_estadisticas():
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, None)
+
+
+def obtener_estadisticas(params, calcular):
+    """Devuelve las estadísticas en caché para `params` o las calcula con `calcular()`."""
+    clave = clave_estadisticas(params)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular()
+        cache.set(clave, datos, getattr(settings, 'DASHBOARD_STATS_TTL', 60))
+    return datos
+
+
+async def aobtener_estadisticas(params, calcular):
+    """Versión async de obtener_estadisticas; `calcular` es sync y corre en un hilo."""
+    clave = await sync_to_async(clave_estadisticas)(params)
+    datos = await cache.aget(clave)
+    if datos is None:
+        datos = await sync_to_async(calcular)()
+        await cache.aset(clave, datos, getattr(settings, 'DASHBOARD_STATS_TTL', 60))
+    return datos
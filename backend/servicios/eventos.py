@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import json
+import logging
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .imagenes import url_variante
+from .models import Avance, OrdenTrabajo
+
+logger = logging.getLogger(__name__)
+
+# --- EVENTOS EN TIEMPO REAL (Server-Sent Events) ---
+# Los cambios se publican en canales: 'usuario:<id>' para el cliente, técnico y
+# supervisor de la orden, y 'staff' para administradores. Sin broker configurado
+# (EVENTOS_REDIS_URL) el pub/sub es en memoria: sirve con un solo proceso ASGI.
+
+CANAL_STAFF = 'staff'
+MAX_PENDIENTES = 100
+_ids = itertools.count(1)
+
+
+def canal_usuario(user_id):
+    return f'usuario:{user_id}'
+
+
+def canales_de(user):
+    canales = [canal_usuario(user.id)]
+    if user.is_staff or user.is_superuser:
+        canales.append(CANAL_STAFF)
+    return canales
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión SSE (vive en el event loop de esa conexión)."""
+
+    def __init__(self, canales):
+        self.canales = canales
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=MAX_PENDIENTES)
+        self.desbordada = False
+
+    def entregar(self, evento):
+        # Se llama desde el loop de la suscripción (call_soon_threadsafe)
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # El cliente no alcanza a leer: se le pide recargar en vez de acumular memoria
+            self.desbordada = True
+            self.cola.get_nowait()
+            self.cola.put_nowait({'id': next(_ids), 'tipo': 'resync', 'datos': {}})
+
+    async def siguiente(self, espera):
+        return await asyncio.wait_for(self.cola.get(), timeout=espera)
+
+
+class BrokerLocal:
+    """Pub/sub en memoria del proceso; publicar() puede llamarse desde cualquier hilo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = {}
+
+    def suscribir(self, suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                self._suscripciones.setdefault(canal, set()).add(suscripcion)
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                self._suscripciones.get(canal, set()).discard(suscripcion)
+
+    def tiene_suscriptores(self):
+        with self._lock:
+            return any(self._suscripciones.values())
+
+    def publicar(self, canales, evento):
+        with self._lock:
+            destinos = {s for canal in canales for s in self._suscripciones.get(canal, ())}
+        for suscripcion in destinos:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El loop de esa conexión ya se cerró
+                self.desuscribir(suscripcion)
+
+
+class BrokerRedis(BrokerLocal):
+    """
+    Reparte los eventos entre procesos con Redis pub/sub. Cada proceso escucha
+    los canales en un hilo y los entrega a sus suscripciones locales.
+    """
+
+    PREFIJO = 'systma:eventos:'
+
+    def __init__(self, url):
+        super().__init__()
+        import redis  # dependencia opcional, solo si se configura EVENTOS_REDIS_URL
+        self._redis = redis.Redis.from_url(url)
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.PREFIJO}*')
+        threading.Thread(target=self._escuchar, args=(pubsub,), daemon=True, name='eventos-redis').start()
+
+    def tiene_suscriptores(self):
+        # Puede haber conexiones abiertas en otros procesos
+        return True
+
+    def _escuchar(self, pubsub):
+        for mensaje in pubsub.listen():
+            canal = mensaje['channel'].decode()[len(self.PREFIJO):]
+            super().publicar([canal], json.loads(mensaje['data']))
+
+    def publicar(self, canales, evento):
+        datos = json.dumps(evento, cls=DjangoJSONEncoder)
+        for canal in canales:
+            self._redis.publish(f'{self.PREFIJO}{canal}', datos)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obtener_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = getattr(settings, 'EVENTOS_REDIS_URL', '')
+            _broker = BrokerRedis(url) if url else BrokerLocal()
+    return _broker
+
+
+def publicar(tipo, datos, canales):
+    evento = {'id': next(_ids), 'tipo': tipo, 'datos': datos}
+    try:
+        obtener_broker().publicar(canales, evento)
+    except Exception:
+        # Un fallo del canal en vivo no debe romper el guardado de la orden
+        logger.warning('No se pudo publicar el evento %s', tipo, exc_info=True)
+
+
+def hay_suscriptores():
+    return obtener_broker().tiene_suscriptores()
+
+
+def formato_sse(evento):
+    datos = json.dumps(evento['datos'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+# --- TICKETS DE CONEXIÓN ---
+# EventSource no permite enviar Authorization y el access token en la URL queda
+# en logs de proxies e historial. El frontend cambia su JWT por un ticket de un
+# solo uso y pocos segundos (POST /api/eventos/ticket/) y abre el stream con él.
+# Con varios procesos ASGI el cache tiene que ser compartido (Redis, Memcached).
+
+PREFIJO_TICKET = 'eventos:ticket:'
+
+
+def crear_ticket(user, vence):
+    """Ticket para abrir un stream; `vence` es el exp (epoch) del JWT que lo pidió."""
+    ticket = secrets.token_urlsafe(32)
+    datos = {'canales': canales_de(user), 'vence': vence}
+    cache.set(f'{PREFIJO_TICKET}{ticket}', datos, getattr(settings, 'EVENTOS_TICKET_S', 30))
+    return ticket
+
+
+async def consumir_ticket(ticket):
+    """Datos del ticket, o None si no existe, venció o ya se usó."""
+    clave = f'{PREFIJO_TICKET}{ticket}'
+    datos = await cache.aget(clave)
+    # delete() informa si la clave seguía ahí: de dos conexiones con el mismo ticket gana una
+    if datos is None or not await cache.adelete(clave):
+        return None
+    return datos
+
+
+async def flujo_sse(canales, vence=None):
+    """
+    Generador asíncrono con el stream SSE de una conexión (requiere servidor ASGI).
+    Con `vence` (epoch del exp del JWT) envía 'expirado' y corta al llegar esa hora.
+    """
+    espera = getattr(settings, 'EVENTOS_PING_S', 15)
+    broker = obtener_broker()
+    suscripcion = Suscripcion(canales)
+    broker.suscribir(suscripcion)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            restante = None if vence is None else vence - time.time()
+            if restante is not None and restante <= 0:
+                yield formato_sse({'id': next(_ids), 'tipo': 'expirado', 'datos': {}})
+                return
+            try:
+                evento = await suscripcion.siguiente(espera if restante is None else min(espera, restante))
+            except asyncio.TimeoutError:
+                if restante is not None and restante < espera:
+                    continue  # llegó la hora de vencimiento, no la del ping
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ': ping\n\n'
+                continue
+            yield formato_sse(evento)
+            if evento['tipo'] == 'resync':
+                return
+    finally:
+        broker.desuscribir(suscripcion)
+
+
+# --- EVENTOS DE ÓRDENES Y AVANCES ---
+
+def _canales_orden(cliente_id, tecnico_id, supervisor_id):
+    return [canal_usuario(u) for u in {cliente_id, tecnico_id, supervisor_id} if u] + [CANAL_STAFF]
+
+
+def publicar_orden(orden_id, eliminada=False, participantes=None):
+    """Publica el estado compacto de la orden (se llama después del commit)."""
+    if eliminada:
+        publicar('orden.eliminada', {'id': orden_id}, _canales_orden(*participantes))
+        return
+    fila = (
+        OrdenTrabajo.objects.filter(pk=orden_id)
+        .values('id', 'titulo', 'cliente_id', 'tecnico_id', 'supervisor_id', 'fecha_inicio', 'fecha_fin',
+                'estado_id', 'estado__nombre', 'estado__color')
+        .first()
+    )
+    if fila is None:
+        return
+    datos = {
+        'id': fila['id'],
+        'titulo': fila['titulo'],
+        'estado': fila['estado_id'],
+        'estado_nombre': fila['estado__nombre'],
+        'estado_color': fila['estado__color'],
+        'tecnico': fila['tecnico_id'],
+        'supervisor': fila['supervisor_id'],
+        'fecha_inicio': fila['fecha_inicio'],
+        'fecha_fin': fila['fecha_fin'],
+    }
+    publicar('orden.actualizada', datos, _canales_orden(fila['cliente_id'], fila['tecnico_id'], fila['supervisor_id']))
+
+
+def publicar_avance(avance_id):
+    avance = (
+        Avance.objects.select_related('orden').prefetch_related('imagenes')
+        .filter(pk=avance_id).first()
+    )
+    if avance is None:
+        return
+    archivos = ([avance.foto] if avance.foto else []) + [f.foto for f in avance.imagenes.all()]
+    orden = avance.orden
+    datos = {
+        'id': avance.id,
+        'orden': orden.id,
+        'contenido': avance.contenido[:280],
+        'creado_en': avance.creado_en,
+        'miniaturas': [url_variante(a, 'miniatura') for a in archivos],
+    }
+    publicar('avance.creado', datos, _canales_orden(orden.cliente_id, orden.tecnico_id, orden.supervisor_id))
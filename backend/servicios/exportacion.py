@@ -0,0 +1,250 @@
+import csv
+import re
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+# --- EXPORTACIÓN MASIVA (CSV / XLSX) EN STREAMING ---
+# Las filas salen de un cursor del servidor (.iterator() por bloques) con los
+# JOIN resueltos en values(), y se van enviando a medida que se leen: la memoria
+# no crece con el tamaño de la exportación y el encabezado sale de inmediato.
+# El XLSX se arma a mano (zip en streaming con cadenas en línea), sin dependencias.
+# Bajo ASGI Django consume un iterador sync completo en memoria antes de enviarlo,
+# así que ahí el generador se entrega envuelto en uno async (ver _en_async).
+
+# Columnas (encabezado, campo de values()). Las de órdenes coinciden con las que
+# acepta la carga masiva, así un CSV exportado se puede editar y volver a subir.
+COLUMNAS_ORDENES = (
+    ('id', 'id'),
+    ('titulo', 'titulo'),
+    ('descripcion', 'descripcion'),
+    ('estado', 'estado__nombre'),
+    ('cliente', 'cliente__username'),
+    ('tecnico', 'tecnico__username'),
+    ('supervisor', 'supervisor__username'),
+    ('direccion', 'direccion'),
+    ('latitud', 'latitud'),
+    ('longitud', 'longitud'),
+    ('fecha_inicio', 'fecha_inicio'),
+    ('fecha_fin', 'fecha_fin'),
+    ('creado_en', 'creado_en'),
+    ('actualizado_en', 'actualizado_en'),
+)
+COLUMNAS_AVANCES = (
+    ('id', 'id'),
+    ('orden', 'orden_id'),
+    ('orden_titulo', 'orden__titulo'),
+    ('contenido', 'contenido'),
+    ('creado_en', 'creado_en'),
+)
+FORMATOS = ('csv', 'xlsx')
+MAX_FILAS_XLSX = 1048575  # límite de Excel menos el encabezado
+
+
+def _chunk():
+    return getattr(settings, 'EXPORTAR_CHUNK', 2000)
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat() if timezone.is_aware(valor) else valor.isoformat()
+    return valor
+
+
+def filas(queryset, columnas):
+    """Tuplas de valores desde un cursor del servidor, con fechas en ISO 8601."""
+    campos = [campo for _, campo in columnas]
+    for fila in queryset.values_list(*campos).iterator(chunk_size=_chunk()):
+        yield [_valor(v) for v in fila]
+
+
+# --- CSV ---
+
+class _Eco:
+    """'Archivo' para csv.writer que devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+# Excel y LibreOffice evalúan como fórmula una celda que empieza con estos
+# caracteres (inyección de fórmulas): se antepone ' para que quede como texto.
+# La carga masiva lo quita (sin_proteccion_formula) para que el CSV vuelva igual.
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celda_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return f"'{valor}"
+    return valor
+
+
+def sin_proteccion_formula(valor):
+    """Deshace _celda_csv en un valor leído de un CSV exportado."""
+    if isinstance(valor, str) and valor.startswith("'") and valor[1:].startswith(_INICIO_FORMULA):
+        return valor[1:]
+    return valor
+
+
+def generar_csv(columnas, filas_datos):
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el archivo como UTF-8 (tildes y ñ); la carga masiva lo ignora
+    yield '\ufeff' + escritor.writerow([encabezado for encabezado, _ in columnas])
+    # Se agrupan las filas para no entregar al servidor un fragmento diminuto por fila
+    while True:
+        bloque = list(islice(filas_datos, 500))
+        if not bloque:
+            return
+        yield ''.join(escritor.writerow([_celda_csv(v) for v in fila]) for fila in bloque)
+
+
+# --- XLSX ---
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+_CABECERA_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+# Caracteres de control que XML no admite
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _workbook(hoja):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(hoja)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(v) for v in valores) + '</row>'
+
+
+class _SalidaZip:
+    """Destino sin seek para zipfile: acumula lo escrito hasta que se entrega."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def generar_xlsx(columnas, filas_datos, hoja):
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        libro.writestr('_rels/.rels', _RELS)
+        libro.writestr('xl/workbook.xml', _workbook(hoja))
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write((_CABECERA_HOJA + _fila_xml([e for e, _ in columnas])).encode())
+            filas_datos = islice(filas_datos, MAX_FILAS_XLSX)
+            while True:
+                bloque = list(islice(filas_datos, 500))
+                if not bloque:
+                    break
+                hoja_xml.write(''.join(_fila_xml(fila) for fila in bloque).encode())
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+            hoja_xml.write(b'</sheetData></worksheet>')
+    yield salida.vaciar()
+
+
+# --- RESPUESTA ---
+
+async def _en_async(generador):
+    """
+    Recorre el generador sync de a un bloque por vez en el hilo de la vista
+    (thread_sensitive: la misma conexión y cursor del servidor).
+    """
+    siguiente = sync_to_async(next)
+    fin = object()
+    try:
+        while (parte := await siguiente(generador, fin)) is not fin:
+            yield parte
+    finally:
+        # Cierra el cursor aunque el cliente corte la descarga
+        await sync_to_async(generador.close)()
+
+
+def respuesta_exportacion(request, queryset, columnas, nombre):
+    """StreamingHttpResponse con el queryset en el formato pedido (?formato=csv|xlsx)."""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        raise ValidationError({'formato': f"Formatos disponibles: {', '.join(FORMATOS)}."})
+    datos = filas(queryset.order_by('id'), columnas)
+    archivo = f'{nombre}_{timezone.localdate():%Y%m%d}.{formato}'
+    if formato == 'xlsx':
+        contenido = generar_xlsx(columnas, datos, nombre.capitalize())
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        contenido = generar_csv(columnas, datos)
+        content_type = 'text/csv; charset=utf-8'
+    if 'wsgi.version' not in request.META:
+        contenido = _en_async(contenido)
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    # Evita que un proxy (nginx) acumule toda la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,132 @@
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .estadisticas import filtro_abiertas
+from .models import OrdenTrabajo
+
+# --- FILTROS DEL LISTADO DE ÓRDENES ---
+# Se usan en la API de órdenes y en cualquier vista que deba respetar
+# los mismos parámetros (?tecnico=, ?estado=, ?desde=, ?search=, ...)
+
+
+def _parse_id(params, nombre):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        return None
+    if not str(valor).isdigit():
+        raise ValidationError({nombre: "Debe ser un identificador numérico."})
+    return int(valor)
+
+
+def parse_entero(params, nombre, defecto, minimo, maximo):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        return defecto
+    if not str(valor).isdigit() or not minimo <= int(valor) <= maximo:
+        raise ValidationError({nombre: f"Debe ser un entero entre {minimo} y {maximo}."})
+    return int(valor)
+
+
+def parse_numero(params, nombre, minimo, maximo, defecto=None):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        if defecto is None:
+            raise ValidationError({nombre: "Este parámetro es obligatorio."})
+        return defecto
+    try:
+        numero = float(valor)
+    except ValueError:
+        numero = None
+    if numero is None or not minimo <= numero <= maximo:
+        raise ValidationError({nombre: f"Debe ser un número entre {minimo} y {maximo}."})
+    return numero
+
+
+def parse_fecha(params, nombre, fin_de_dia=False):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        return None
+
+    try:
+        fecha = parse_datetime(valor)
+        dia = parse_date(valor) if fecha is None else None
+    except ValueError:
+        fecha = dia = None
+
+    if fecha is None:
+        if dia is None:
+            raise ValidationError({nombre: "Fecha inválida. Use AAAA-MM-DD o ISO 8601."})
+        # 'hasta' con solo fecha incluye el día completo
+        fecha = datetime.combine(dia, time.max if fin_de_dia else time.min)
+
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def filtrar_ordenes(queryset, params):
+    """Aplica los filtros de query string al queryset de OrdenTrabajo."""
+    for campo in ('tecnico', 'supervisor', 'cliente'):
+        valor = _parse_id(params, campo)
+        if valor is not None:
+            queryset = queryset.filter(**{f'{campo}_id': valor})
+
+    # El estado se puede pedir por id (?estado=2) o por nombre (?estado=Pendiente)
+    estado = params.get('estado')
+    if estado:
+        if estado.isdigit():
+            queryset = queryset.filter(estado_id=int(estado))
+        else:
+            queryset = queryset.filter(estado__nombre=estado)
+
+    # ?abiertas=1: órdenes que no están finalizadas ni canceladas
+    if params.get('abiertas') in ('1', 'true'):
+        queryset = queryset.filter(filtro_abiertas())
+
+    desde = parse_fecha(params, 'desde')
+    if desde:
+        queryset = queryset.filter(creado_en__gte=desde)
+    hasta = parse_fecha(params, 'hasta', fin_de_dia=True)
+    if hasta:
+        queryset = queryset.filter(creado_en__lte=hasta)
+
+    texto = params.get('search', '').strip()
+    if texto:
+        queryset = queryset.filter(
+            Q(titulo__icontains=texto)
+            | Q(descripcion__icontains=texto)
+            | Q(direccion__icontains=texto)
+            | Q(cliente__username__icontains=texto)
+        )
+
+    return queryset
+
+
+# --- FILTROS DE LA BITÁCORA ---
+
+# Filtros del listado de órdenes que también se aceptan al listar avances
+FILTROS_DE_ORDEN = ('tecnico', 'supervisor', 'cliente', 'estado', 'abiertas', 'search')
+
+
+def filtrar_avances(queryset, params):
+    """?orden=, ?desde= / ?hasta= (fecha del avance) y los filtros de su orden."""
+    orden_id = _parse_id(params, 'orden')
+    if orden_id is not None:
+        queryset = queryset.filter(orden_id=orden_id)
+
+    desde = parse_fecha(params, 'desde')
+    if desde:
+        queryset = queryset.filter(creado_en__gte=desde)
+    hasta = parse_fecha(params, 'hasta', fin_de_dia=True)
+    if hasta:
+        queryset = queryset.filter(creado_en__lte=hasta)
+
+    filtros_orden = {clave: params.get(clave) for clave in FILTROS_DE_ORDEN if params.get(clave)}
+    if filtros_orden:
+        ordenes = filtrar_ordenes(OrdenTrabajo.objects.all(), filtros_orden)
+        queryset = queryset.filter(orden__in=ordenes.values('id'))
+    return queryset
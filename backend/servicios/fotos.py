@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from .imagenes import generar_variantes
+from .models import FotoAvance
+from .reportes import invalidar_cache_reporte
+
+# --- INGESTA DE FOTOS DE UN AVANCE ---
+# Las escrituras en storage (original + variantes) se hacen en paralelo y fuera
+# de la transacción; la base de datos solo recibe un bulk_create al final.
+
+_executor = None
+
+
+def _obtener_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'FOTOS_WORKERS', 4),
+            thread_name_prefix='fotos-avance',
+        )
+    return _executor
+
+
+def _guardar_archivo(archivo):
+    foto = FotoAvance()
+    foto.foto.save(archivo.name, archivo, save=False)
+    generar_variantes(foto.foto)
+    return foto
+
+
+def _borrar_archivos(fotos):
+    for foto in fotos:
+        foto.foto.delete(save=False)
+
+
+def guardar_fotos(archivos):
+    """Escribe los archivos en storage y devuelve instancias FotoAvance sin guardar."""
+    if len(archivos) <= 1:
+        return [_guardar_archivo(a) for a in archivos]
+
+    futuros = [_obtener_executor().submit(_guardar_archivo, a) for a in archivos]
+    fotos, error = [], None
+    for futuro in futuros:
+        try:
+            fotos.append(futuro.result())
+        except Exception as exc:
+            error = error or exc
+    if error:
+        _borrar_archivos(fotos)
+        raise error
+    return fotos
+
+
+def crear_avance_con_fotos(serializer, archivos, antes_de_guardar=None):
+    """
+    Guarda el avance (serializer ya validado) y sus fotos en una sola transacción.
+    `antes_de_guardar()` corre dentro de esa transacción (p. ej. el cambio de estado
+    de la orden); si falla, no se guarda nada. Devuelve el avance con `imagenes`
+    ya cargado para serializar la respuesta.
+    """
+    fotos = guardar_fotos(archivos)
+    try:
+        with transaction.atomic():
+            if antes_de_guardar:
+                antes_de_guardar()
+            avance = serializer.save()
+            for foto in fotos:
+                foto.avance = avance
+            FotoAvance.objects.bulk_create(fotos)
+    except Exception:
+        _borrar_archivos(fotos)
+        raise
+
+    # bulk_create no dispara post_save: se invalida aquí el PDF en caché
+    if fotos:
+        invalidar_cache_reporte(avance.orden_id)
+
+    # Evita otra consulta de 'imagenes' al serializar la respuesta
+    imagenes = avance.imagenes.all()
+    imagenes._result_cache = fotos
+    imagenes._prefetch_done = True
+    avance._prefetched_objects_cache = {'imagenes': imagenes}
+    return avance
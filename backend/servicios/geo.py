@@ -0,0 +1,129 @@
+import heapq
+import math
+
+from django.db.models import Q
+
+# --- BÚSQUEDA GEOGRÁFICA SIN PostGIS ---
+# Cada orden guarda el geohash de su ubicación (celda_geo). Una zona se cubre
+# con unas pocas celdas, que se consultan como rangos sobre el índice B-tree;
+# luego se recorta por el rectángulo exacto y, para el radio, por haversine.
+
+PRECISION_CELDA = 7  # ~150 m x 150 m
+MAX_CELDAS = 32
+RADIO_TIERRA_KM = 6371.0088
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+CAMPOS_MAPA = (
+    'id', 'titulo', 'direccion', 'latitud', 'longitud', 'fecha_inicio', 'tecnico_id',
+    'estado__nombre', 'estado__color',
+)
+
+
+def geohash(latitud, longitud, precision=PRECISION_CELDA):
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    resultado, bits, valor, es_lon = [], 0, 0, True
+    while len(resultado) < precision:
+        if es_lon:
+            medio = (lon_min + lon_max) / 2
+            valor = valor * 2 + (longitud >= medio)
+            lon_min, lon_max = (medio, lon_max) if longitud >= medio else (lon_min, medio)
+        else:
+            medio = (lat_min + lat_max) / 2
+            valor = valor * 2 + (latitud >= medio)
+            lat_min, lat_max = (medio, lat_max) if latitud >= medio else (lat_min, medio)
+        es_lon = not es_lon
+        bits += 1
+        if bits == 5:
+            resultado.append(_BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(resultado)
+
+
+def celda_de(latitud, longitud):
+    if latitud is None or longitud is None:
+        return ''
+    return geohash(float(latitud), float(longitud))
+
+
+def asignar_celda(orden):
+    """Actualiza orden.celda_geo según su latitud/longitud (para save y bulk_*)."""
+    orden.celda_geo = celda_de(orden.latitud, orden.longitud)
+    return orden
+
+
+def _tamano_celda(precision):
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def _pasos(minimo, maximo, paso):
+    # Puntos separados por 'paso' que tocan todas las celdas entre minimo y maximo
+    valor = minimo
+    while valor < maximo:
+        yield valor
+        valor += paso
+    yield maximo
+
+
+def celdas_para_caja(sur, oeste, norte, este):
+    """Prefijos de geohash (los más largos posibles, máx. MAX_CELDAS) que cubren la caja."""
+    for precision in range(PRECISION_CELDA, 0, -1):
+        alto, ancho = _tamano_celda(precision)
+        if (math.ceil((norte - sur) / alto) + 1) * (math.ceil((este - oeste) / ancho) + 1) > MAX_CELDAS:
+            continue
+        return sorted({
+            geohash(lat, lon, precision)
+            for lat in _pasos(sur, norte, alto)
+            for lon in _pasos(oeste, este, ancho)
+        })
+    return []
+
+
+def _filtro_caja(sur, oeste, norte, este):
+    celdas = celdas_para_caja(sur, oeste, norte, este)
+    # Rango [prefijo, prefijo + '~') en vez de LIKE para que use el índice en cualquier motor
+    filtro = Q()
+    for celda in celdas:
+        filtro |= Q(celda_geo__gte=celda, celda_geo__lt=celda + '~')
+    return filtro & Q(latitud__gte=sur, latitud__lte=norte, longitud__gte=oeste, longitud__lte=este)
+
+
+def filtrar_caja(queryset, sur, oeste, norte, este):
+    """Órdenes dentro del rectángulo; si oeste > este la caja cruza el antimeridiano."""
+    if oeste > este:
+        return queryset.filter(_filtro_caja(sur, oeste, norte, 180.0) | _filtro_caja(sur, -180.0, norte, este))
+    return queryset.filter(_filtro_caja(sur, oeste, norte, este))
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caja_de_radio(latitud, longitud, radio_km):
+    """Rectángulo que contiene el círculo; (sur, oeste, norte, este)."""
+    delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+    sur, norte = max(-90.0, latitud - delta_lat), min(90.0, latitud + delta_lat)
+    if sur == -90.0 or norte == 90.0:
+        return sur, -180.0, norte, 180.0
+    delta_lon = math.degrees(radio_km / (RADIO_TIERRA_KM * math.cos(math.radians(latitud))))
+    if delta_lon >= 180.0:
+        return sur, -180.0, norte, 180.0
+    oeste, este = longitud - delta_lon, longitud + delta_lon
+    oeste = oeste + 360.0 if oeste < -180.0 else oeste
+    este = este - 360.0 if este > 180.0 else este
+    return sur, oeste, norte, este
+
+
+def ordenes_cercanas(queryset, latitud, longitud, radio_km, limite, campos):
+    """Filas (values) a menos de radio_km, ordenadas por distancia y con 'distancia_km'."""
+    candidatas = filtrar_caja(queryset, *caja_de_radio(latitud, longitud, radio_km)).values(*campos)
+
+    def dentro_del_radio():
+        for fila in candidatas.iterator(chunk_size=2000):
+            distancia = distancia_km(latitud, longitud, float(fila['latitud']), float(fila['longitud']))
+            if distancia <= radio_km:
+                fila['distancia_km'] = round(distancia, 3)
+                yield fila
+
+    return heapq.nsmallest(limite, dentro_del_radio(), key=lambda f: (f['distancia_km'], f['id']))
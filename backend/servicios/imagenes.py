@@ -0,0 +1,96 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# --- VARIANTES REDIMENSIONADAS DE LAS FOTOS ---
+# Las fotos de los celulares pesan 4-8 MB. Se guardan copias reducidas junto al
+# original, en variantes/<nombre>/<ruta original>.<ext>, para la API y el PDF.
+# Se generan fuera de los GET (al confirmar la subida, en el worker de reportes
+# o con manage.py generar_variantes); la API solo arma las URLs.
+
+VARIANTES = {
+    # nombre: (lado máximo en px, formato, extensión, calidad)
+    'miniatura': (320, 'WEBP', '.webp', 70),
+    'reporte': (600, 'JPEG', '.jpg', 75),
+    'completa': (1600, 'JPEG', '.jpg', 82),
+}
+
+
+def ruta_variante(nombre_original, variante):
+    # Conserva la extensión original: foto.jpg y foto.png no comparten variante
+    _, _, extension, _ = VARIANTES[variante]
+    return f'variantes/{variante}/{nombre_original}{extension}'
+
+
+def tiene_variantes(nombre_original):
+    """Si el archivo es una imagen que Pillow sabe abrir (las demás no tienen variantes)."""
+    _, extension = os.path.splitext(nombre_original)
+    return extension.lower() in Image.registered_extensions()
+
+
+def url_variante(archivo, variante):
+    """URL de la variante sin tocar el storage; la del original si no es una imagen."""
+    if tiene_variantes(archivo.name):
+        return default_storage.url(ruta_variante(archivo.name, variante))
+    return archivo.url
+
+
+def _renderizar(imagen, variante):
+    lado, formato, _, calidad = VARIANTES[variante]
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+
+    salida = BytesIO()
+    opciones = {'quality': calidad}
+    if formato == 'JPEG':
+        opciones.update(optimize=True, progressive=True)
+    copia.save(salida, format=formato, **opciones)
+    return salida.getvalue()
+
+
+def generar_variantes(archivo, variantes=None):
+    """
+    Crea las variantes que falten para `archivo` (un FieldFile de imagen).
+    Abre el original una sola vez. Devuelve {variante: ruta} de las que existen.
+    """
+    if not archivo:
+        return {}
+
+    rutas = {v: ruta_variante(archivo.name, v) for v in (variantes or VARIANTES)}
+    faltantes = [v for v, ruta in rutas.items() if not default_storage.exists(ruta)]
+    if not faltantes:
+        return rutas
+
+    try:
+        with archivo.storage.open(archivo.name, 'rb') as original:
+            imagen = Image.open(original)
+            # Respeta la orientación EXIF de las fotos tomadas con el celular
+            imagen = ImageOps.exif_transpose(imagen).convert('RGB')
+        for variante in faltantes:
+            default_storage.save(rutas[variante], ContentFile(_renderizar(imagen, variante)))
+    except FileNotFoundError:
+        logger.warning('No existe el archivo original %s', archivo.name)
+        return {}
+    except (UnidentifiedImageError, OSError):
+        logger.warning('No se pudieron generar las variantes de %s', archivo.name, exc_info=True)
+        return {v: ruta for v, ruta in rutas.items() if v not in faltantes}
+    return rutas
+
+
+def obtener_variante(archivo, variante):
+    """Ruta en storage de la variante, generándola si todavía no existe (None si no se puede)."""
+    return generar_variantes(archivo, [variante]).get(variante)
+
+
+def ruta_local_variante(archivo, variante):
+    """Ruta en disco de la variante, o del original si no se pudo generar (para xhtml2pdf)."""
+    if not archivo:
+        return None
+    ruta = obtener_variante(archivo, variante)
+    return default_storage.path(ruta) if ruta else archivo.path
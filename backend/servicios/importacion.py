@@ -0,0 +1,274 @@
+import codecs
+import csv
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+from .busqueda import actualizar_indice_busqueda
+from .estadisticas import invalidar_estadisticas
+from .exportacion import sin_proteccion_formula
+from .geo import asignar_celda
+from .models import Estado, OrdenTrabajo
+from .reportes import invalidar_cache_reporte
+from .sincronizacion import registrar_salidas
+
+# --- IMPORTACIÓN / ACTUALIZACIÓN MASIVA DE ÓRDENES ---
+# Cada fila se valida sin tocar la base de datos; las referencias a usuarios y
+# estados se resuelven después con una sola consulta por tabla.
+
+CAMPOS_REFERENCIA = ('cliente', 'tecnico', 'supervisor', 'estado')
+
+
+class LoteInvalido(Exception):
+    """El lote tiene filas con errores; `errores` es [{'fila': n, 'errores': {...}}]."""
+
+    def __init__(self, errores):
+        super().__init__('El lote contiene filas inválidas.')
+        self.errores = sorted(errores, key=lambda e: e['fila'])
+
+
+class CSVParser(BaseParser):
+    """Permite enviar el lote como text/csv con encabezados (una orden por fila)."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return leer_csv(stream, (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET))
+
+
+def leer_csv(binario, encoding=None):
+    """
+    Filas (dicts) de un CSV en bytes. Ignora el BOM que agrega Excel al guardar
+    en UTF-8 y el ' con que la exportación protege las celdas tipo fórmula; un
+    archivo en otra codificación (p. ej. Windows-1252) es un ParseError.
+    """
+    encoding = encoding or settings.DEFAULT_CHARSET
+    if codecs.lookup(encoding).name == 'utf-8':
+        encoding = 'utf-8-sig'
+    try:
+        return [
+            {campo: sin_proteccion_formula(valor) for campo, valor in fila.items()}
+            for fila in csv.DictReader(codecs.iterdecode(binario, encoding))
+        ]
+    except UnicodeDecodeError:
+        raise ParseError(f'CSV inválido: el archivo debe estar en {encoding.upper().removesuffix("-SIG")}.')
+    except csv.Error as exc:
+        raise ParseError(f'CSV inválido: {exc}')
+
+
+class OrdenFilaSerializer(serializers.ModelSerializer):
+    # Las referencias llegan como id o como texto (username / nombre del estado)
+    id = serializers.IntegerField(required=False)
+    cliente = serializers.CharField(required=False)
+    tecnico = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    supervisor = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    estado = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    class Meta:
+        model = OrdenTrabajo
+        fields = [
+            'id', 'titulo', 'descripcion', 'fecha_inicio', 'fecha_fin', 'direccion',
+            'latitud', 'longitud', 'cliente', 'tecnico', 'supervisor', 'estado',
+        ]
+
+    def to_internal_value(self, data):
+        # En CSV las celdas vacías significan "sin valor"
+        if isinstance(data, dict):
+            data = {k: v for k, v in data.items() if v != '' or k in CAMPOS_REFERENCIA}
+        return super().to_internal_value(data)
+
+
+def leer_filas(request):
+    """Devuelve la lista de filas enviadas como JSON, text/csv o archivo CSV ('archivo')."""
+    archivo = request.FILES.get('archivo') if hasattr(request, 'FILES') else None
+    if archivo:
+        filas = leer_csv(archivo)
+    else:
+        filas = request.data
+        if isinstance(filas, dict):
+            filas = filas.get('ordenes', filas)
+
+    if not isinstance(filas, list):
+        raise ValidationError({'detail': 'Se esperaba una lista de órdenes.'})
+    if not filas:
+        raise ValidationError({'detail': 'El lote está vacío.'})
+    maximo = getattr(settings, 'ORDENES_BULK_MAX', 1000)
+    if len(filas) > maximo:
+        raise ValidationError({'detail': f'Máximo {maximo} órdenes por lote.'})
+    return filas
+
+
+def _es_id(valor):
+    return isinstance(valor, int) or (isinstance(valor, str) and valor.isdigit())
+
+
+class _Referencias:
+    """Resuelve usuarios y estados de todo el lote con una consulta por tabla."""
+
+    def __init__(self, filas):
+        usuarios = {f[c] for f in filas for c in ('cliente', 'tecnico', 'supervisor') if f.get(c)}
+        estados = {f['estado'] for f in filas if f.get('estado')}
+
+        self.usuarios = {}
+        self.grupos = {}
+        if usuarios:
+            ids = [int(v) for v in usuarios if _es_id(v)]
+            nombres = [v for v in usuarios if not _es_id(v)]
+            filas_usuario = User.objects.filter(Q(id__in=ids) | Q(username__in=nombres)).values_list(
+                'id', 'username', 'groups__name'
+            )
+            for user_id, username, grupo in filas_usuario:
+                self.usuarios[str(user_id)] = self.usuarios[username] = user_id
+                self.grupos.setdefault(user_id, set()).add(grupo)
+
+        self.estados = {}
+        if estados:
+            ids = [int(v) for v in estados if _es_id(v)]
+            nombres = [v for v in estados if not _es_id(v)]
+            for estado_id, nombre in Estado.objects.filter(Q(id__in=ids) | Q(nombre__in=nombres)).values_list('id', 'nombre'):
+                self.estados[str(estado_id)] = self.estados[nombre] = estado_id
+
+    def usuario(self, valor, rol=None):
+        user_id = self.usuarios.get(str(valor))
+        if user_id is None:
+            raise KeyError(f"Usuario '{valor}' no existe.")
+        if rol and rol not in self.grupos.get(user_id, set()):
+            raise KeyError(f"El usuario '{valor}' no pertenece al grupo {rol}.")
+        return user_id
+
+    def estado(self, valor):
+        estado_id = self.estados.get(str(valor))
+        if estado_id is None:
+            raise KeyError(f"Estado '{valor}' no existe.")
+        return estado_id
+
+
+def _resolver(datos, referencias):
+    """Convierte las referencias de una fila validada a *_id. Devuelve (valores, errores)."""
+    valores, errores = {}, {}
+    for campo, valor in datos.items():
+        if campo not in CAMPOS_REFERENCIA:
+            valores[campo] = valor
+            continue
+        if valor in (None, ''):
+            if campo == 'cliente':
+                errores[campo] = ['Este campo no puede ser nulo.']
+            else:
+                valores[f'{campo}_id'] = None
+            continue
+        try:
+            if campo == 'estado':
+                valores['estado_id'] = referencias.estado(valor)
+            else:
+                rol = {'tecnico': 'Tecnico', 'supervisor': 'Supervisor'}.get(campo)
+                valores[f'{campo}_id'] = referencias.usuario(valor, rol)
+        except KeyError as exc:
+            errores[campo] = [exc.args[0]]
+    return valores, errores
+
+
+def _validar_lote(filas, parcial):
+    validadas, errores = [], []
+    for numero, fila in enumerate(filas, start=1):
+        serializer = OrdenFilaSerializer(data=fila, partial=parcial)
+        if serializer.is_valid():
+            validadas.append((numero, serializer.validated_data))
+        else:
+            errores.append({'fila': numero, 'errores': serializer.errors})
+    return validadas, errores
+
+
+def _invalidar_caches(ids):
+    # bulk_create/bulk_update no disparan señales
+    invalidar_estadisticas()
+    for orden_id in ids:
+        invalidar_cache_reporte(orden_id)
+
+
+def crear_ordenes(filas, supervisor=None):
+    """
+    Valida y crea todas las órdenes del lote en una transacción.
+    Si alguna fila tiene errores no se crea ninguna (LoteInvalido con el detalle por fila).
+    """
+    validadas, errores = _validar_lote(filas, parcial=False)
+    referencias = _Referencias([d for _, d in validadas])
+
+    ordenes = []
+    for numero, datos in validadas:
+        datos.pop('id', None)
+        if 'cliente' not in datos:
+            errores.append({'fila': numero, 'errores': {'cliente': ['Este campo es requerido.']}})
+            continue
+        valores, errores_fila = _resolver(datos, referencias)
+        if errores_fila:
+            errores.append({'fila': numero, 'errores': errores_fila})
+            continue
+        if supervisor is not None:
+            valores['supervisor_id'] = supervisor.id
+        ordenes.append(asignar_celda(OrdenTrabajo(**valores)))
+
+    if errores:
+        raise LoteInvalido(errores)
+
+    with transaction.atomic():
+        creadas = OrdenTrabajo.objects.bulk_create(ordenes)
+        actualizar_indice_busqueda([o.id for o in creadas])
+    invalidar_estadisticas()
+    return creadas
+
+
+def actualizar_ordenes(filas, puede_modificar):
+    """
+    Actualiza parcialmente varias órdenes (cada fila con su 'id') con un solo bulk_update.
+    `puede_modificar(orden)` devuelve un mensaje de error si el usuario no puede tocarla.
+    """
+    validadas, errores = _validar_lote(filas, parcial=True)
+    referencias = _Referencias([d for _, d in validadas])
+    ids = [d['id'] for _, d in validadas if 'id' in d]
+    existentes = OrdenTrabajo.objects.in_bulk(ids)
+
+    ordenes, campos = [], set()
+    for numero, datos in validadas:
+        if 'id' not in datos:
+            errores.append({'fila': numero, 'errores': {'id': ['Este campo es requerido.']}})
+            continue
+        orden = existentes.get(datos.pop('id'))
+        if orden is None:
+            errores.append({'fila': numero, 'errores': {'id': ['La orden no existe.']}})
+            continue
+        mensaje = puede_modificar(orden)
+        if mensaje:
+            errores.append({'fila': numero, 'errores': {'detail': [mensaje]}})
+            continue
+        valores, errores_fila = _resolver(datos, referencias)
+        if errores_fila:
+            errores.append({'fila': numero, 'errores': errores_fila})
+            continue
+        for campo, valor in valores.items():
+            setattr(orden, campo, valor)
+        campos.update(valores)
+        if 'latitud' in valores or 'longitud' in valores:
+            asignar_celda(orden)
+            campos.add('celda_geo')
+        ordenes.append(orden)
+
+    if errores:
+        raise LoteInvalido(errores)
+
+    if campos:
+        # bulk_update no aplica auto_now
+        ahora = timezone.now()
+        for orden in ordenes:
+            orden.actualizado_en = ahora
+        with transaction.atomic():
+            OrdenTrabajo.objects.bulk_update(ordenes, sorted(campos | {'actualizado_en'}))
+            registrar_salidas(ordenes)
+            if campos & {'titulo', 'descripcion', 'direccion'}:
+                actualizar_indice_busqueda([o.id for o in ordenes])
+        _invalidar_caches([o.id for o in ordenes])
+    return ordenes
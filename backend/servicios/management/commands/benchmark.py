@@ -0,0 +1,259 @@
+import json
+import math
+import os
+import random
+import secrets
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from servicios.estadisticas import invalidar_estadisticas
+from servicios.management.commands.generar_datos import PREFIJO
+from servicios.models import Avance, FotoAvance, OrdenTrabajo
+from servicios.reportes import invalidar_cache_reporte
+
+# --- BENCHMARK DE LA API ---
+# Recorre los endpoints principales con el cliente de pruebas de Django contra
+# la base configurada (idealmente poblada con generar_datos) y guarda en JSON
+# p50/p95 de latencia, queries por request y memoria máxima. Con --comparar se
+# contrasta con una línea base anterior y falla si algún escenario empeora.
+# Solo corre sobre una base con datos de generar_datos (usuarios 'sint_'), salvo
+# --permitir-produccion. El superusuario bench_admin se crea con la contraseña de
+# --contrasena / BENCHMARK_CONTRASENA (o una al azar) y se borra al terminar.
+
+USUARIO = 'bench_admin'
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar)."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Escenario:
+    def __init__(self, nombre, peticion, repeticiones=None, preparar=None, limpiar=None):
+        self.nombre = nombre
+        # peticion(cliente, azar) -> response
+        self.peticion = peticion
+        self.repeticiones = repeticiones
+        # preparar(azar) corre antes de cada request, fuera de lo medido;
+        # limpiar() al terminar el escenario
+        self.preparar = preparar
+        self.limpiar = limpiar
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, queries y memoria de los endpoints principales y guarda una línea base JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=2, help='Requests descartados antes de medir.')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', default='benchmark.json')
+        parser.add_argument('--comparar', help='Línea base JSON anterior para comparar.')
+        parser.add_argument('--umbral', type=float, default=20.0, help='Empeoramiento máximo aceptado (%%) en p95.')
+        parser.add_argument('--escenarios', help='Nombres separados por coma (por defecto, todos).')
+        parser.add_argument('--contrasena', default=os.environ.get('BENCHMARK_CONTRASENA'),
+                            help=f'Contraseña de {USUARIO} (por defecto BENCHMARK_CONTRASENA o una al azar).')
+        parser.add_argument('--permitir-produccion', action='store_true',
+                            help=f"Corre aunque la base no tenga usuarios '{PREFIJO}' de generar_datos.")
+
+    def handle(self, *args, **opciones):
+        if not opciones['permitir_produccion'] and not User.objects.filter(username__startswith=PREFIJO).exists():
+            raise CommandError(
+                f"La base no tiene datos de generar_datos (usuarios '{PREFIJO}'): "
+                'use --permitir-produccion para medir igual.'
+            )
+        orden_ids = list(OrdenTrabajo.objects.order_by('id').values_list('id', flat=True)[:5000])
+        if not orden_ids:
+            raise CommandError('No hay órdenes: ejecute primero generar_datos.')
+
+        escenarios = self._escenarios(orden_ids, opciones['repeticiones'])
+        if opciones['escenarios']:
+            pedidos = set(opciones['escenarios'].split(','))
+            escenarios = [e for e in escenarios if e.nombre in pedidos]
+
+        self.contrasena = opciones['contrasena'] or secrets.token_urlsafe(16)
+        creado = self._preparar_usuario()
+        # Habilita 'testserver' en ALLOWED_HOSTS mientras se usa el cliente de pruebas
+        propio = True
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            propio = False  # ya activo (p. ej. dentro de la suite de pruebas)
+        try:
+            cliente = Client()
+            cliente.defaults['HTTP_AUTHORIZATION'] = f'Bearer {self._login(cliente)}'
+            resultados = {}
+            for escenario in escenarios:
+                azar = random.Random(opciones['semilla'])
+                try:
+                    resultados[escenario.nombre] = self._medir(cliente, escenario, azar, opciones)
+                finally:
+                    if escenario.limpiar:
+                        escenario.limpiar()
+                self._mostrar(escenario.nombre, resultados[escenario.nombre])
+        finally:
+            if propio:
+                teardown_test_environment()
+            if creado:
+                User.objects.filter(username=USUARIO).delete()
+
+        linea_base = {
+            'fecha': timezone.now().isoformat(),
+            'commit': _commit_actual(),
+            'base_de_datos': connection.vendor,
+            'volumen': {
+                'ordenes': OrdenTrabajo.objects.count(),
+                'avances': Avance.objects.count(),
+                'fotos': FotoAvance.objects.count(),
+            },
+            'escenarios': resultados,
+        }
+        with open(opciones['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(linea_base, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {opciones['salida']}"))
+
+        if opciones['comparar']:
+            self._comparar(opciones['comparar'], resultados, opciones['umbral'])
+
+    # --- ESCENARIOS ---
+
+    def _escenarios(self, orden_ids, repeticiones):
+        def login(cliente, azar):
+            return Client().post('/api/token/', {'username': USUARIO, 'password': self.contrasena},
+                                 content_type='application/json')
+
+        pdf = {'orden': None, 'usadas': set()}
+
+        def elegir_orden_pdf(azar):
+            pdf['orden'] = azar.choice(orden_ids)
+            pdf['usadas'].add(pdf['orden'])
+            invalidar_cache_reporte(pdf['orden'])
+
+        def borrar_pdfs():
+            for orden_id in pdf['usadas']:
+                invalidar_cache_reporte(orden_id)
+
+        return [
+            Escenario('login', login),
+            Escenario('ordenes_lista', lambda c, azar: c.get('/api/ordenes/')),
+            Escenario('ordenes_detalle', lambda c, azar: c.get(f'/api/ordenes/{azar.choice(orden_ids)}/')),
+            Escenario('avances_orden', lambda c, azar: c.get('/api/avances/', {'orden': azar.choice(orden_ids)})),
+            # Tras el calentamiento el primero sale del caché; el segundo lo invalida en cada request
+            Escenario('dashboard_stats', lambda c, azar: c.get('/api/dashboard-stats/')),
+            Escenario('dashboard_stats_sin_cache', lambda c, azar: c.get('/api/dashboard-stats/'),
+                      preparar=lambda azar: invalidar_estadisticas()),
+            # El PDF es caro: menos repeticiones. La semilla es fija, así que las
+            # órdenes se repiten entre corridas: se borra su PDF en disco antes de
+            # cada request (mide la generación) y al terminar (no deja archivos)
+            Escenario('reporte_pdf', lambda c, azar: c.get(f"/api/ordenes/{pdf['orden']}/pdf/"),
+                      repeticiones=max(3, repeticiones // 4), preparar=elegir_orden_pdf, limpiar=borrar_pdfs),
+        ]
+
+    def _preparar_usuario(self):
+        """Crea bench_admin si no existe (devuelve True) y nunca cambia la contraseña de uno existente."""
+        usuario = User.objects.filter(username=USUARIO).first()
+        if usuario is not None:
+            if not usuario.check_password(self.contrasena):
+                raise CommandError(f'{USUARIO} ya existe con otra contraseña: indíquela con --contrasena.')
+            return False
+        User.objects.create_superuser(USUARIO, password=self.contrasena)
+        return True
+
+    def _login(self, cliente):
+        response = cliente.post('/api/token/', {'username': USUARIO, 'password': self.contrasena},
+                                content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'No se pudo iniciar sesión ({response.status_code}).')
+        return response.json()['access']
+
+    # --- MEDICIÓN ---
+
+    def _medir(self, cliente, escenario, azar, opciones):
+        repeticiones = escenario.repeticiones or opciones['repeticiones']
+        for _ in range(opciones['calentamiento']):
+            if escenario.preparar:
+                escenario.preparar(azar)
+            escenario.peticion(cliente, azar)
+
+        # Pasada de tiempos, sin tracemalloc (que distorsiona la latencia)
+        tiempos, errores = [], 0
+        for _ in range(repeticiones):
+            if escenario.preparar:
+                escenario.preparar(azar)
+            inicio = time.perf_counter()
+            response = escenario.peticion(cliente, azar)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            errores += response.status_code >= 400
+
+        # Pasada de queries y memoria
+        queries, memoria = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(min(repeticiones, 5)):
+                if escenario.preparar:
+                    escenario.preparar(azar)
+                tracemalloc.reset_peak()
+                with CaptureQueriesContext(connection) as ctx:
+                    escenario.peticion(cliente, azar)
+                queries.append(len(ctx.captured_queries))
+                memoria.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'repeticiones': repeticiones,
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'media_ms': round(statistics.fmean(tiempos), 2),
+            'max_ms': round(max(tiempos), 2),
+            'queries': max(queries),
+            'memoria_max_kb': round(max(memoria) / 1024, 1),
+            'errores': errores,
+        }
+
+    def _mostrar(self, nombre, r):
+        self.stdout.write(
+            f"{nombre:<26} p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+            f"{r['queries']:>3} queries  {r['memoria_max_kb']:>9.1f} KB  errores {r['errores']}"
+        )
+
+    def _comparar(self, ruta, resultados, umbral):
+        with open(ruta, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)['escenarios']
+        peores = []
+        self.stdout.write(f'\nComparación con {ruta}:')
+        for nombre, actual in resultados.items():
+            base = anterior.get(nombre)
+            if not base:
+                continue
+            cambio = (actual['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+            mas_queries = actual['queries'] - base['queries']
+            self.stdout.write(
+                f"{nombre:<26} p95 {base['p95_ms']:.2f} -> {actual['p95_ms']:.2f} ms ({cambio:+.1f}%)  "
+                f"queries {base['queries']} -> {actual['queries']}"
+            )
+            if cambio > umbral or mas_queries > 0:
+                peores.append(nombre)
+        if peores:
+            raise CommandError(f"Empeoraron: {', '.join(peores)}")
@@ -0,0 +1,209 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from servicios.busqueda import actualizar_indice_busqueda
+from servicios.estadisticas import invalidar_estadisticas
+from servicios.geo import asignar_celda
+from servicios.imagenes import generar_variantes
+from servicios.models import Avance, Estado, FotoAvance, OrdenTrabajo
+
+# --- DATOS SINTÉTICOS A ESCALA DE PRODUCCIÓN ---
+# Con --escala 1: 200 clientes, 40 técnicos, 10 supervisores, 10.000 órdenes,
+# ~30.000 avances y ~10.000 fotos. Todo se inserta con bulk_create por lotes;
+# la misma --semilla genera siempre los mismos datos.
+
+PREFIJO = 'sint_'
+CONTRASENA = 'sintetico123'
+LOTE = 2000
+
+ESTADOS_BASE = (
+    ('Pendiente', '#FFC107', 1),
+    ('En Progreso', '#2196F3', 2),
+    ('En Revisión', '#9C27B0', 3),
+    ('Finalizado', '#4CAF50', 4),
+    ('Cancelado', '#F44336', 5),
+)
+# Proporción aproximada de órdenes en cada estado en un sistema con historia
+PESOS_ESTADO = {'Pendiente': 20, 'En Progreso': 15, 'En Revisión': 10, 'Finalizado': 50, 'Cancelado': 5}
+
+TRABAJOS = (
+    'Mantención de bomba', 'Revisión de tablero eléctrico', 'Cambio de medidor', 'Reparación de filtración',
+    'Instalación de luminarias', 'Inspección de caldera', 'Limpieza de ductos', 'Cambio de cerradura',
+    'Reparación de portón', 'Instalación de aire acondicionado',
+)
+CALLES = ('Av. Providencia', 'Los Leones', 'Av. Matta', 'Gran Avenida', 'Irarrázaval', 'Vicuña Mackenna', 'Apoquindo')
+NOTAS = (
+    'Se revisa el equipo y se detecta desgaste en las piezas.', 'Cliente no se encontraba, se reagenda.',
+    'Se reemplaza el repuesto y se prueba el funcionamiento.', 'Falta material, se solicita a bodega.',
+    'Trabajo terminado, se deja el área limpia.', 'Se toman fotos de la falla para el informe.',
+)
+# Zona urbana donde caen las órdenes (Santiago)
+LATITUD = (-33.60, -33.35)
+LONGITUD = (-70.80, -70.50)
+
+
+@contextmanager
+def _fechas_manuales(modelo, *campos):
+    """Desactiva auto_now/auto_now_add para insertar fechas históricas."""
+    originales = []
+    for nombre in campos:
+        campo = modelo._meta.get_field(nombre)
+        originales.append((campo, campo.auto_now, campo.auto_now_add))
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Genera usuarios, órdenes, avances y fotos sintéticos para pruebas de carga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0, help='Multiplica los volúmenes base (1 = 10.000 órdenes).')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--dias', type=int, default=365, help='Días hacia atrás en que se reparten las órdenes.')
+
+    def handle(self, *args, **opciones):
+        escala = opciones['escala']
+        if escala <= 0:
+            raise CommandError('--escala debe ser mayor que cero.')
+        if User.objects.filter(username__startswith=PREFIJO).exists():
+            raise CommandError(f"Ya existen usuarios '{PREFIJO}*': use una base de datos limpia.")
+
+        self.azar = random.Random(opciones['semilla'])
+        self.ahora = timezone.now()
+        self.dias = opciones['dias']
+
+        estados = self._estados()
+        clientes, tecnicos, supervisores = self._usuarios(escala)
+        ordenes = self._ordenes(int(10000 * escala), estados, clientes, tecnicos, supervisores)
+        avances = self._avances(ordenes)
+        fotos = self._fotos(avances)
+
+        for inicio in range(0, len(ordenes), LOTE):
+            actualizar_indice_busqueda([o.id for o in ordenes[inicio:inicio + LOTE]])
+        invalidar_estadisticas()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(clientes) + len(tecnicos) + len(supervisores)} usuarios, {len(ordenes)} órdenes, '
+            f'{len(avances)} avances y {fotos} fotos creados (contraseña: {CONTRASENA}).'
+        ))
+
+    # --- CATÁLOGOS Y USUARIOS ---
+
+    def _estados(self):
+        for nombre, color, orden in ESTADOS_BASE:
+            Estado.objects.get_or_create(nombre=nombre, defaults={'color': color, 'orden': orden})
+        return {e.nombre: e for e in Estado.objects.filter(nombre__in=PESOS_ESTADO)}
+
+    def _usuarios(self, escala):
+        # El hash es lento a propósito: se calcula una vez y se comparte
+        contrasena = make_password(CONTRASENA)
+        creados = {}
+        for rol, cantidad in (('cliente', 200), ('tecnico', 40), ('supervisor', 10)):
+            usuarios = [
+                User(username=f'{PREFIJO}{rol}_{n}', email=f'{rol}{n}@ejemplo.cl', password=contrasena,
+                     first_name=rol.capitalize(), last_name=str(n))
+                for n in range(max(1, int(cantidad * escala)))
+            ]
+            creados[rol] = User.objects.bulk_create(usuarios, batch_size=LOTE)
+
+        miembros = User.groups.through
+        grupos = {nombre: Group.objects.get_or_create(name=nombre)[0] for nombre in ('Tecnico', 'Supervisor')}
+        miembros.objects.bulk_create(
+            [miembros(user_id=u.id, group_id=grupos['Tecnico'].id) for u in creados['tecnico']]
+            + [miembros(user_id=u.id, group_id=grupos['Supervisor'].id) for u in creados['supervisor']]
+        )
+        return creados['cliente'], creados['tecnico'], creados['supervisor']
+
+    # --- ÓRDENES, AVANCES Y FOTOS ---
+
+    def _fecha_pasada(self):
+        return self.ahora - timedelta(minutes=self.azar.randint(0, self.dias * 24 * 60))
+
+    def _ordenes(self, cantidad, estados, clientes, tecnicos, supervisores):
+        azar = self.azar
+        nombres = [n for n in PESOS_ESTADO if n in estados]
+        pesos = [PESOS_ESTADO[n] for n in nombres]
+        ordenes = []
+        for n in range(cantidad):
+            estado = estados[azar.choices(nombres, pesos)[0]]
+            creado = self._fecha_pasada()
+            inicio = creado + timedelta(hours=azar.randint(2, 240))
+            cerrada = estado.nombre in ('Finalizado', 'Cancelado')
+            orden = OrdenTrabajo(
+                titulo=f'{azar.choice(TRABAJOS)} #{n + 1}',
+                descripcion=azar.choice(NOTAS),
+                direccion=f'{azar.choice(CALLES)} {azar.randint(100, 9999)}',
+                latitud=Decimal(f'{azar.uniform(*LATITUD):.6f}'),
+                longitud=Decimal(f'{azar.uniform(*LONGITUD):.6f}'),
+                fecha_inicio=inicio,
+                fecha_fin=inicio + timedelta(hours=azar.randint(1, 8)) if cerrada else None,
+                cliente=azar.choice(clientes),
+                tecnico=azar.choice(tecnicos) if estado.nombre != 'Pendiente' or azar.random() < 0.5 else None,
+                supervisor=azar.choice(supervisores),
+                estado=estado,
+                creado_en=creado,
+                actualizado_en=min(inicio, self.ahora),
+            )
+            ordenes.append(asignar_celda(orden))
+
+        with _fechas_manuales(OrdenTrabajo, 'creado_en', 'actualizado_en'):
+            for inicio in range(0, len(ordenes), LOTE):
+                with transaction.atomic():
+                    OrdenTrabajo.objects.bulk_create(ordenes[inicio:inicio + LOTE])
+        self.stdout.write(f'  {len(ordenes)} órdenes')
+        return ordenes
+
+    def _avances(self, ordenes):
+        azar = self.azar
+        avances = []
+        for orden in ordenes:
+            # Las pendientes casi no tienen bitácora; las cerradas, varias entradas
+            maximo = 1 if orden.estado.nombre == 'Pendiente' else 6
+            momento = orden.fecha_inicio
+            for _ in range(azar.randint(0, maximo)):
+                momento = momento + timedelta(minutes=azar.randint(10, 600))
+                if momento > self.ahora:
+                    break
+                avances.append(Avance(orden=orden, contenido=azar.choice(NOTAS), creado_en=momento, actualizado_en=momento))
+
+        with _fechas_manuales(Avance, 'creado_en', 'actualizado_en'):
+            for inicio in range(0, len(avances), LOTE):
+                with transaction.atomic():
+                    Avance.objects.bulk_create(avances[inicio:inicio + LOTE])
+        self.stdout.write(f'  {len(avances)} avances')
+        return avances
+
+    def _foto_base(self):
+        """Una sola imagen (y sus variantes) compartida por todas las fotos sintéticas."""
+        ruta = 'avances/sintetica.jpg'
+        if not default_storage.exists(ruta):
+            contenido = BytesIO()
+            Image.new('RGB', (1600, 1200), color=(90, 120, 160)).save(contenido, format='JPEG', quality=80)
+            ruta = default_storage.save(ruta, ContentFile(contenido.getvalue()))
+        foto = FotoAvance(foto=ruta)
+        generar_variantes(foto.foto)
+        return ruta
+
+    def _fotos(self, avances):
+        ruta = self._foto_base()
+        fotos = [FotoAvance(avance=a, foto=ruta) for a in avances if self.azar.random() < 0.33]
+        for inicio in range(0, len(fotos), LOTE):
+            with transaction.atomic():
+                FotoAvance.objects.bulk_create(fotos[inicio:inicio + LOTE])
+        self.stdout.write(f'  {len(fotos)} fotos')
+        return len(fotos)
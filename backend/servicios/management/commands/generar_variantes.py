@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from servicios.imagenes import generar_variantes, tiene_variantes
+from servicios.models import Avance, FotoAvance, OrdenTrabajo
+
+# --- VARIANTES DE LAS FOTOS EXISTENTES ---
+# La API ya no genera variantes al serializar: las fotos subidas antes de que
+# existieran (o con otro esquema de nombres) se completan con este comando.
+# Solo crea las que faltan, así que se puede volver a ejecutar sin costo.
+
+ORIGENES = (
+    (OrdenTrabajo, 'foto_referencia'),
+    (Avance, 'foto'),
+    (FotoAvance, 'foto'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes redimensionadas que falten para las fotos guardadas.'
+
+    def handle(self, *args, **opciones):
+        total = 0
+        for modelo, campo in ORIGENES:
+            nombres = (
+                modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .order_by().values_list(campo, flat=True).distinct().iterator(chunk_size=500)
+            )
+            procesadas = 0
+            for nombre in nombres:
+                if not tiene_variantes(nombre):
+                    continue
+                # FieldFile suelto, sin cargar la fila completa
+                generar_variantes(getattr(modelo(**{campo: nombre}), campo))
+                procesadas += 1
+            self.stdout.write(f'  {modelo.__name__}.{campo}: {procesadas} fotos')
+            total += procesadas
+        self.stdout.write(self.style.SUCCESS(f'Variantes revisadas para {total} fotos.'))
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0007_fotoavance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['-creado_en', '-id'], name='ordentrabajo_creado_id_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0009_reportepdf'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='estado',
+            name='nombre',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='avance',
+            index=models.Index(fields=['orden', '-creado_en'], name='avance_orden_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['tecnico', 'estado', '-creado_en'], name='ordentrabajo_tec_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['supervisor', 'estado', '-creado_en'], name='ordentrabajo_sup_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['estado', '-creado_en'], name='ordentrabajo_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(condition=models.Q(('fecha_fin__isnull', True)), fields=['tecnico', 'fecha_inicio'], name='ordentrabajo_abiertas_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-18 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia congelada del geohash de servicios/geo.py (precisión 7): la migración no
+# debe depender del código vivo de la app, que puede cambiar o desaparecer.
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def celda_de(latitud, longitud, precision=7):
+    latitud, longitud = float(latitud), float(longitud)
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    resultado, bits, valor, es_lon = [], 0, 0, True
+    while len(resultado) < precision:
+        if es_lon:
+            medio = (lon_min + lon_max) / 2
+            valor = valor * 2 + (longitud >= medio)
+            lon_min, lon_max = (medio, lon_max) if longitud >= medio else (lon_min, medio)
+        else:
+            medio = (lat_min + lat_max) / 2
+            valor = valor * 2 + (latitud >= medio)
+            lat_min, lat_max = (medio, lat_max) if latitud >= medio else (lat_min, medio)
+        es_lon = not es_lon
+        bits += 1
+        if bits == 5:
+            resultado.append(_BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(resultado)
+
+
+def calcular_celdas(apps, schema_editor):
+    OrdenTrabajo = apps.get_model('servicios', 'OrdenTrabajo')
+    pendientes = OrdenTrabajo.objects.filter(latitud__isnull=False, longitud__isnull=False).only('latitud', 'longitud')
+    lote = []
+    for orden in pendientes.iterator(chunk_size=2000):
+        orden.celda_geo = celda_de(orden.latitud, orden.longitud)
+        lote.append(orden)
+        if len(lote) == 2000:
+            OrdenTrabajo.objects.bulk_update(lote, ['celda_geo'])
+            lote = []
+    if lote:
+        OrdenTrabajo.objects.bulk_update(lote, ['celda_geo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0011_indice_calendario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordentrabajo',
+            name='celda_geo',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['celda_geo'], name='ordentrabajo_celda_geo_idx'),
+        ),
+        migrations.RunPython(calcular_celdas, migrations.RunPython.noop),
+    ]
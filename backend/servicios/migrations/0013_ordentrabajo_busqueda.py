@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 12:28
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# El índice GIN y el cálculo inicial solo existen en PostgreSQL; en otros motores
+# la búsqueda usa el respaldo con icontains (ver servicios/busqueda.py)
+CREAR_INDICE = '''
+CREATE INDEX IF NOT EXISTS ordentrabajo_busqueda_gin ON servicios_ordentrabajo USING gin (busqueda);
+UPDATE servicios_ordentrabajo o SET busqueda =
+    setweight(to_tsvector('spanish', coalesce(o.titulo, '')), 'A')
+    || setweight(to_tsvector('spanish', coalesce(o.descripcion, '')), 'B')
+    || setweight(to_tsvector('spanish', coalesce(o.direccion, '')), 'C')
+    || setweight(to_tsvector('spanish', coalesce(
+        (SELECT string_agg(a.contenido, ' ' ORDER BY a.id) FROM servicios_avance a WHERE a.orden_id = o.id), ''
+    )), 'D');
+'''
+BORRAR_INDICE = 'DROP INDEX IF EXISTS ordentrabajo_busqueda_gin;'
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREAR_INDICE)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BORRAR_INDICE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0012_ordentrabajo_celda_geo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordentrabajo',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 12:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0013_ordentrabajo_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('orden', 'Orden'), ('avance', 'Avance'), ('foto', 'Foto de avance'), ('estado', 'Estado')], max_length=10)),
+                ('objeto_id', models.IntegerField()),
+                ('orden_id', models.IntegerField(blank=True, null=True)),
+                ('usuario_id', models.IntegerField(blank=True, null=True)),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='avance',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='avance',
+            name='id_cliente',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='estado',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ordentrabajo',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='avance',
+            index=models.Index(fields=['actualizado_en'], name='avance_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['actualizado_en'], name='ordentrabajo_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['tecnico', 'actualizado_en'], name='ordentrabajo_tec_act_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 13:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0014_sincronizacion_incremental'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ordentrabajo',
+            name='ordentrabajo_abiertas_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ordentrabajo',
+            index=models.Index(fields=['tecnico', 'fecha_inicio'], name='ordentrabajo_tec_inicio_idx'),
+        ),
+    ]
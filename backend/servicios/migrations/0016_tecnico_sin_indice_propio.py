@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicios', '0015_indice_agenda_tecnicos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ordentrabajo',
+            name='tecnico',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ordenes_tecnico', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
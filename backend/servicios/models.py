@@ -1,10 +1,12 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 
 class Estado(models.Model):
-    nombre = models.CharField(max_length=50)
+    nombre = models.CharField(max_length=50, db_index=True)
     color = models.CharField(max_length=7, default="#808080")
     orden = models.PositiveIntegerField(default=1)
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -17,16 +19,44 @@ class OrdenTrabajo(models.Model):
     direccion = models.CharField(max_length=255, blank=True)
     latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Geohash de (latitud, longitud); se mantiene al guardar (ver geo.py)
+    celda_geo = models.CharField(max_length=12, blank=True, default='', editable=False)
+    # Texto completo (titulo, descripcion, direccion y avances) para PostgreSQL; ver busqueda.py
+    busqueda = SearchVectorField(null=True, editable=False)
     foto_referencia = models.ImageField(upload_to='trabajos/', null=True, blank=True)
     creado_en = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    # Lo usa la sincronización incremental (bulk_update debe asignarlo a mano)
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     # RELACIONES
     cliente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ordenes_cliente')
     supervisor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ordenes_supervisor')
-    tecnico = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ordenes_tecnico')
+    # Sin índice propio: lo cubren los compuestos que empiezan por tecnico (Meta.indexes)
+    tecnico = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ordenes_tecnico',
+                                db_index=False)
     
     estado = models.ForeignKey(Estado, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Respaldo de la paginación por cursor del listado (orden estable)
+            models.Index(fields=['-creado_en', '-id'], name='ordentrabajo_creado_id_idx'),
+            # Listados por técnico / supervisor filtrados por estado y ordenados por fecha
+            models.Index(fields=['tecnico', 'estado', '-creado_en'], name='ordentrabajo_tec_est_idx'),
+            models.Index(fields=['supervisor', 'estado', '-creado_en'], name='ordentrabajo_sup_est_idx'),
+            models.Index(fields=['estado', '-creado_en'], name='ordentrabajo_estado_idx'),
+            # Ventanas del calendario (por técnico alcanzan los índices que empiezan por tecnico)
+            models.Index(fields=['fecha_inicio'], name='ordentrabajo_inicio_idx'),
+            # Búsquedas por zona / radio (rangos de prefijos de geohash)
+            models.Index(fields=['celda_geo'], name='ordentrabajo_celda_geo_idx'),
+            # Sincronización incremental: todo lo cambiado desde X (global y por técnico)
+            models.Index(fields=['actualizado_en'], name='ordentrabajo_actualizado_idx'),
+            models.Index(fields=['tecnico', 'actualizado_en'], name='ordentrabajo_tec_act_idx'),
+            # Agenda de técnicos por rango de fecha_inicio: rutas del día y solapes de la asignación
+            # (fecha_fin es también el fin planificado, no sirve como marca de "abierta")
+            models.Index(fields=['tecnico', 'fecha_inicio'], name='ordentrabajo_tec_inicio_idx'),
+        ]
+
     def __str__(self):
         return f"{self.titulo} - {self.cliente.username}"
 
@@ -36,6 +66,16 @@ class Avance(models.Model):
     contenido = models.TextField(verbose_name="Observaciones / Complicaciones")
     foto = models.ImageField(upload_to='avances/', null=True, blank=True)
     creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+    # Identificador generado en el celular: evita duplicados al reintentar una subida offline
+    id_cliente = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Bitácora de una orden, de la más reciente a la más antigua
+            models.Index(fields=['orden', '-creado_en'], name='avance_orden_creado_idx'),
+            models.Index(fields=['actualizado_en'], name='avance_actualizado_idx'),
+        ]
 
     def __str__(self):
         return f"Avance {self.id} - {self.orden.titulo}"
@@ -46,4 +86,44 @@ class FotoAvance(models.Model):
     foto = models.ImageField(upload_to='avances/')
     
     def __str__(self):
-        return f"Foto de Avance {self.avance.id}"
\ No newline at end of file
+        return f"Foto de Avance {self.avance.id}"
+
+# --- REPORTES PDF GENERADOS EN SEGUNDO PLANO ---
+class ReportePDF(models.Model):
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    orden = models.ForeignKey(OrdenTrabajo, on_delete=models.CASCADE, related_name='reportes')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reportes_solicitados')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    archivo = models.FileField(upload_to='reportes/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reporte {self.id} - Orden {self.orden_id} ({self.estado})"
+
+# --- REGISTRO DE ELIMINACIONES PARA LA SINCRONIZACIÓN (tombstones) ---
+class Eliminacion(models.Model):
+    MODELOS = [
+        ('orden', 'Orden'),
+        ('avance', 'Avance'),
+        ('foto', 'Foto de avance'),
+        ('estado', 'Estado'),
+    ]
+
+    modelo = models.CharField(max_length=10, choices=MODELOS)
+    objeto_id = models.IntegerField()
+    orden_id = models.IntegerField(null=True, blank=True)
+    # Si tiene usuario, el objeto no se borró: solo dejó de ser visible para él (p. ej. reasignación)
+    usuario_id = models.IntegerField(null=True, blank=True)
+    eliminado_en = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} eliminado el {self.eliminado_en:%Y-%m-%d %H:%M}"
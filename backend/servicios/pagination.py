@@ -0,0 +1,21 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrdenCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre (creado_en, id), respaldada por el
+    índice ordentrabajo_creado_id_idx.
+
+    Es opcional: solo se activa si el cliente envía ?cursor= o ?page_size=,
+    así las pantallas que todavía esperan la lista completa siguen funcionando.
+    """
+    ordering = ('-creado_en', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,205 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# --- MEDICIÓN DE RENDIMIENTO POR REQUEST (opcional: RENDIMIENTO_ACTIVO) ---
+# Cuenta las queries y su tiempo con un execute_wrapper instalado en cada
+# conexión, separa el tiempo de la vista y el del render (DRF renderiza la
+# respuesta después de la vista) y suma tramos con nombre (auth, pdf) marcados
+# con medir(). Todo se publica en el header Server-Timing y en el log
+# 'servicios.rendimiento'; los requests lentos se registran como WARNING.
+# La medición vive en una ContextVar: sirve igual en WSGI y ASGI (sync_to_async
+# copia el contexto al hilo donde corren las queries).
+
+_medicion = ContextVar('medicion_rendimiento', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.inicio = perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.tramos = defaultdict(float)
+        self.inicio_vista = None
+        self.fin_vista = None
+        self.fin_render = None
+
+
+@contextmanager
+def medir(nombre):
+    """Suma el tiempo del bloque al tramo `nombre` del request en curso (si se está midiendo)."""
+    medicion = _medicion.get()
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        if medicion is not None:
+            medicion.tramos[nombre] += (perf_counter() - inicio) * 1000
+
+
+def _registrar_query(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.queries += 1
+        medicion.sql_ms += (perf_counter() - inicio) * 1000
+
+
+def _instalar_wrapper(sender=None, connection=None, **kwargs):
+    # La conexión puede reabrirse o salir del pool, pero el objeto de Django es el mismo
+    if _registrar_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_query)
+
+
+def _activar(perfil):
+    # Solo puede haber un perfilador activo a la vez: si otro hilo ya mide, este request no
+    try:
+        perfil.enable()
+    except ValueError:
+        return None
+    return perfil
+
+
+def _ms(inicio, fin):
+    return (fin - inicio) * 1000 if inicio is not None and fin is not None else None
+
+
+class RendimientoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'RENDIMIENTO_ACTIVO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        connection_created.connect(_instalar_wrapper, dispatch_uid='servicios.rendimiento')
+        for conexion in connections.all(initialized_only=True):
+            _instalar_wrapper(connection=conexion)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        perfil = self._perfilador(request)
+        try:
+            if perfil:
+                perfil = _activar(perfil)
+            response = self.get_response(request)
+        finally:
+            if perfil:
+                perfil.disable()
+            _medicion.reset(token)
+        self._terminar(request, response, medicion, perfil)
+        return response
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        self._terminar(request, response, medicion, None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.inicio_vista = perf_counter()
+
+    def process_template_response(self, request, response):
+        # Se llama justo después de la vista y antes de response.render()
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.fin_vista = perf_counter()
+
+            def fin_render(response):
+                medicion.fin_render = perf_counter()
+
+            response.add_post_render_callback(fin_render)
+        return response
+
+    # --- RESULTADOS ---
+
+    def _terminar(self, request, response, medicion, perfil):
+        fin = perf_counter()
+        total = _ms(medicion.inicio, fin)
+        tramos = {
+            'db': medicion.sql_ms,
+            **medicion.tramos,
+            'view': _ms(medicion.inicio_vista, medicion.fin_vista or fin),
+            'render': _ms(medicion.fin_vista, medicion.fin_render),
+            'total': total,
+        }
+        tramos = {nombre: round(ms, 2) for nombre, ms in tramos.items() if ms is not None}
+
+        partes = []
+        for nombre, ms in tramos.items():
+            descripcion = f';desc="{medicion.queries} queries"' if nombre == 'db' else ''
+            partes.append(f'{nombre};dur={ms}{descripcion}')
+        response['Server-Timing'] = ', '.join(partes)
+        origen = request.headers.get('Origin')
+        if origen and origen in getattr(settings, 'CORS_ALLOWED_ORIGINS', ()):
+            # Sin esto el navegador oculta Server-Timing al frontend de otro origen
+            response['Timing-Allow-Origin'] = origen
+
+        lento = (
+            total > getattr(settings, 'RENDIMIENTO_UMBRAL_MS', 500)
+            or medicion.queries > getattr(settings, 'RENDIMIENTO_UMBRAL_QUERIES', 50)
+        )
+        coincidencia = getattr(request, 'resolver_match', None)
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': coincidencia.view_name if coincidencia else None,
+            'estado': response.status_code,
+            'queries': medicion.queries,
+            **{f'{nombre}_ms': ms for nombre, ms in tramos.items()},
+            'lento': lento,
+        }
+        if perfil and lento:
+            datos['perfil'] = self._guardar_perfil(perfil, request, total)
+        logger.log(logging.WARNING if lento else logging.INFO, 'rendimiento %s',
+                   json.dumps(datos, ensure_ascii=False), extra={'rendimiento': datos})
+
+    # --- PERFIL cProfile DE ENDPOINTS LENTOS ---
+
+    def _perfilador(self, request):
+        rutas = getattr(settings, 'RENDIMIENTO_PERFIL_RUTAS', ())
+        if not any(request.path.startswith(ruta) for ruta in rutas):
+            return None
+        if random.random() >= getattr(settings, 'RENDIMIENTO_PERFIL_MUESTRA', 0.1):
+            return None
+        return cProfile.Profile()
+
+    def _guardar_perfil(self, perfil, request, total):
+        directorio = getattr(settings, 'RENDIMIENTO_PERFIL_DIR', os.path.join(settings.BASE_DIR, 'perfiles'))
+        os.makedirs(directorio, exist_ok=True)
+        nombre_ruta = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'raiz'
+        archivo = os.path.join(directorio, f'{timezone.now():%Y%m%d_%H%M%S_%f}_{nombre_ruta}_{int(total)}ms.prof')
+        perfil.dump_stats(archivo)
+        return archivo
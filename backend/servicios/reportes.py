@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from .imagenes import ruta_local_variante
+from .models import FotoAvance, OrdenTrabajo, ReportePDF
+from .rendimiento import medir
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_REPORTE = 'reporte_orden.html'
+# Subir este número si cambia la forma de generar el PDF (no solo el template)
+VERSION_REPORTE = 2
+DIRECTORIO_CACHE = 'reportes/cache'
+
+
+class ErrorReporte(Exception):
+    pass
+
+
+# --- RENDERIZADO ---
+
+def renderizar_reporte(orden, al_avanzar=None):
+    """Genera el PDF de la orden y devuelve sus bytes."""
+    avisar = al_avanzar or (lambda progreso: None)
+
+    avances = list(orden.avances.all().order_by('creado_en'))
+    # El PDF usa la variante 'reporte' (reducida) en lugar de la foto original
+    for avance in avances:
+        avance.foto_reporte = ruta_local_variante(avance.foto, 'reporte')
+    context = {
+        'orden': orden,
+        'avances': avances,
+        'logo_path': os.path.join(settings.BASE_DIR, 'static', 'logo.png'),
+    }
+    with medir('pdf'):
+        html = get_template(TEMPLATE_REPORTE).render(context)
+    avisar(30)
+
+    destino = BytesIO()
+    with medir('pdf'):
+        pisa_status = pisa.CreatePDF(html, dest=destino)
+    if pisa_status.err:
+        raise ErrorReporte('Error al generar PDF')
+    avisar(90)
+    return destino.getvalue()
+
+
+# --- CACHÉ EN DISCO DIRECCIONADA POR CONTENIDO ---
+# La clave es un hash de todo lo que aparece en el PDF: la orden, sus avances,
+# las fotos y la versión del template. Si algo cambia, cambia la clave.
+
+_hash_template = None
+
+
+def _version_template():
+    global _hash_template
+    if _hash_template is None:
+        fuente = get_template(TEMPLATE_REPORTE).template.source
+        _hash_template = hashlib.sha256(f'{VERSION_REPORTE}:{fuente}'.encode('utf-8')).hexdigest()[:16]
+    return _hash_template
+
+
+def revision_reporte(orden):
+    """Hash de la revisión actual de la orden; se usa como nombre en caché y como ETag."""
+    partes = [
+        _version_template(),
+        orden.id, orden.titulo, orden.descripcion, orden.direccion,
+        orden.fecha_inicio and orden.fecha_inicio.isoformat(),
+        orden.estado.nombre if orden.estado else '',
+        orden.cliente.first_name, orden.cliente.last_name,
+        orden.tecnico.username if orden.tecnico else '',
+    ]
+    for avance in orden.avances.order_by('id').values_list('id', 'creado_en', 'contenido', 'foto'):
+        partes.extend(avance)
+    for foto in FotoAvance.objects.filter(avance__orden=orden).order_by('id').values_list('id', 'foto'):
+        partes.extend(foto)
+
+    contenido = '\x1f'.join('' if p is None else str(p) for p in partes)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _ruta_cache(orden_id, revision=''):
+    return f'{DIRECTORIO_CACHE}/{orden_id}/{revision}.pdf' if revision else f'{DIRECTORIO_CACHE}/{orden_id}'
+
+
+def pdf_en_cache(orden, revision=None, al_avanzar=None):
+    """Devuelve los bytes del PDF de la orden, renderizándolo solo si la revisión no está en disco."""
+    revision = revision or revision_reporte(orden)
+    ruta = _ruta_cache(orden.id, revision)
+
+    if default_storage.exists(ruta):
+        with default_storage.open(ruta, 'rb') as archivo:
+            return archivo.read()
+
+    contenido = renderizar_reporte(orden, al_avanzar)
+    # Las revisiones anteriores de la orden ya no sirven
+    invalidar_cache_reporte(orden.id)
+    default_storage.save(ruta, ContentFile(contenido))
+    return contenido
+
+
+def invalidar_cache_reporte(orden_id):
+    directorio = _ruta_cache(orden_id)
+    try:
+        _, archivos = default_storage.listdir(directorio)
+    except FileNotFoundError:
+        return
+    for nombre in archivos:
+        default_storage.delete(f'{directorio}/{nombre}')
+
+
+# --- COLA DE TRABAJOS ---
+# Pool de hilos local al proceso: no necesita broker externo. El estado de
+# cada trabajo vive en ReportePDF, así que cualquier worker puede consultarlo.
+
+_executor = None
+
+
+def _obtener_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'REPORTES_PDF_WORKERS', 2),
+            thread_name_prefix='reporte-pdf',
+        )
+    return _executor
+
+
+def encolar_reporte(orden, usuario=None):
+    """
+    Crea (o reutiliza, si ya hay uno en curso) el trabajo de PDF de la orden.
+    El render arranca cuando se confirma la transacción actual.
+    """
+    # Un trabajo "en curso" muy antiguo se considera perdido (p. ej. se reinició el proceso)
+    limite = timezone.now() - timedelta(minutes=10)
+    en_curso = (
+        orden.reportes.filter(estado__in=['pendiente', 'procesando'], creado_en__gte=limite)
+        .order_by('-creado_en')
+        .first()
+    )
+    if en_curso:
+        return en_curso
+
+    reporte = ReportePDF.objects.create(
+        orden=orden,
+        solicitado_por=usuario if usuario and usuario.is_authenticated else None,
+    )
+    transaction.on_commit(partial(_obtener_executor().submit, _tarea_worker, reporte.id))
+    return reporte
+
+
+def _tarea_worker(reporte_id):
+    try:
+        procesar_reporte(reporte_id)
+    finally:
+        # Cada hilo tiene su propia conexión; se libera al terminar el trabajo
+        connection.close()
+
+
+def procesar_reporte(reporte_id):
+    """Renderiza el PDF y lo guarda en ReportePDF.archivo, actualizando el progreso."""
+    try:
+        reporte = ReportePDF.objects.get(pk=reporte_id)
+        ReportePDF.objects.filter(pk=reporte_id).update(estado='procesando', progreso=10)
+
+        def al_avanzar(progreso):
+            ReportePDF.objects.filter(pk=reporte_id).update(progreso=progreso)
+
+        orden = OrdenTrabajo.objects.select_related('estado', 'cliente', 'tecnico').get(pk=reporte.orden_id)
+        contenido = pdf_en_cache(orden, al_avanzar=al_avanzar)
+
+        reporte.archivo.save(f'Reporte_Orden_{orden.id}_{reporte.id}.pdf', ContentFile(contenido), save=False)
+        ReportePDF.objects.filter(pk=reporte_id).update(
+            archivo=reporte.archivo.name, estado='listo', progreso=100, terminado_en=timezone.now(),
+        )
+    except Exception as exc:
+        logger.exception('Falló la generación del reporte %s', reporte_id)
+        ReportePDF.objects.filter(pk=reporte_id).update(
+            estado='error', error=str(exc), terminado_en=timezone.now(),
+        )
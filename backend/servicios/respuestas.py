@@ -0,0 +1,115 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.response import Response
+
+# --- GET CONDICIONAL Y CACHÉ DE RESPUESTAS ---
+# Los catálogos (estados y usuarios) cambian poco. Cada uno tiene una versión en
+# caché que las señales renuevan al guardar o borrar: la versión forma el ETag y
+# la clave del cuerpo ya serializado. La versión también vence con el TTL para
+# que, con una caché local por proceso, un cambio hecho en otro proceso se vea
+# como máximo RESPUESTAS_CACHE_TTL segundos después.
+
+CATALOGOS = ('estados', 'usuarios')
+
+
+def _ttl():
+    return getattr(settings, 'RESPUESTAS_CACHE_TTL', 300)
+
+
+def _clave_version(catalogo):
+    return f'respuestas:{catalogo}:version'
+
+
+def _nueva_version():
+    # Last-Modified viaja con precisión de segundos
+    return uuid.uuid4().hex, timezone.now().replace(microsecond=0)
+
+
+def version_catalogo(catalogo):
+    """Devuelve (version, modificado) del catálogo."""
+    clave = _clave_version(catalogo)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = _nueva_version()
+        cache.add(clave, valor, _ttl())
+        valor = cache.get(clave, valor)
+    return valor
+
+
+def invalidar_catalogo(catalogo):
+    cache.set(_clave_version(catalogo), _nueva_version(), _ttl())
+
+
+def _firma(*partes):
+    return hashlib.sha1(':'.join(str(p) for p in partes).encode()).hexdigest()[:24]
+
+
+def no_modificado(request, etag, modificado):
+    """True si la copia del cliente sigue vigente (If-None-Match tiene prioridad)."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return desde is not None and int(modificado.timestamp()) <= desde
+
+
+def datos_en_cache(clave, calcular):
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular()
+        cache.set(clave, datos, _ttl())
+    return datos
+
+
+def respuesta_condicional(request, etag, modificado, obtener_datos):
+    """304 sin cuerpo si el cliente ya lo tiene; si no, los datos de obtener_datos()."""
+    if no_modificado(request, etag, modificado):
+        response = Response(status=304)
+    else:
+        response = Response(obtener_datos())
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modificado.timestamp())
+    # El navegador guarda la copia pero revalida siempre (con el token del usuario)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class CatalogoCacheMixin:
+    """list/retrieve de un ViewSet con ETag, Last-Modified y el cuerpo serializado en caché."""
+    catalogo = None
+
+    def _respuesta_catalogo(self, request, calcular):
+        version, modificado = version_catalogo(self.catalogo)
+        firma = _firma(version, request.get_full_path())
+        clave = f'respuestas:{self.catalogo}:{firma}'
+        return respuesta_condicional(request, f'"{firma}"', modificado, lambda: datos_en_cache(clave, calcular))
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_catalogo(
+            request, lambda: super(CatalogoCacheMixin, self).list(request, *args, **kwargs).data,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_catalogo(
+            request, lambda: super(CatalogoCacheMixin, self).retrieve(request, *args, **kwargs).data,
+        )
+
+
+def respuesta_orden(request, orden, serializar):
+    """
+    Detalle de una orden. El serializer incluye datos del estado y de los
+    usuarios (nombres), así que el ETag combina actualizado_en de la orden con
+    las versiones de esos catálogos. Las URLs de las fotos son absolutas: el
+    host también forma parte de la firma.
+    """
+    versiones = [version_catalogo(catalogo) for catalogo in CATALOGOS]
+    modificado = max([orden.actualizado_en.replace(microsecond=0), *(m for _, m in versiones)])
+    firma = _firma(orden.pk, orden.actualizado_en.isoformat(), *(v for v, _ in versiones), request.get_host())
+    clave = f'respuestas:orden:{orden.pk}:{firma}'
+    return respuesta_condicional(request, f'"{firma}"', modificado, lambda: datos_en_cache(clave, serializar))
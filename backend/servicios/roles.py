@@ -0,0 +1,39 @@
+# --- RESOLUCIÓN DE ROLES ---
+# Los roles son los grupos de Django ('Tecnico', 'Supervisor'). Se resuelven una
+# sola vez por request y quedan guardados en el propio objeto usuario; si el JWT
+# ya trae el claim 'roles', RolJWTAuthentication los precarga y no hay consulta.
+
+ROL_TECNICO = 'Tecnico'
+ROL_SUPERVISOR = 'Supervisor'
+ROL_ADMINISTRADOR = 'Administrador'
+
+
+def roles_de(user):
+    """Conjunto de nombres de grupo del usuario (cacheado en el objeto)."""
+    if not getattr(user, 'is_authenticated', False):
+        return frozenset()
+    roles = getattr(user, '_roles_cache', None)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        user._roles_cache = roles
+    return roles
+
+
+def asignar_roles(user, roles):
+    user._roles_cache = frozenset(roles)
+
+
+def es_tecnico(user):
+    return ROL_TECNICO in roles_de(user)
+
+
+def es_supervisor(user):
+    return ROL_SUPERVISOR in roles_de(user)
+
+
+def rol_principal(user):
+    """Rol que ve el frontend: 'Administrador', el primer grupo o 'Usuario'."""
+    if user.is_superuser:
+        return ROL_ADMINISTRADOR
+    roles = sorted(roles_de(user))
+    return roles[0] if roles else 'Usuario'
@@ -0,0 +1,232 @@
+import time as reloj
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .estadisticas import filtro_abiertas
+from .geo import RADIO_TIERRA_KM
+from .models import OrdenTrabajo
+
+# --- RUTA DIARIA DE LOS TÉCNICOS ---
+# Vecino más cercano (respetando ventanas horarias) + mejora 2-opt sobre una
+# matriz de tiempos calculada con NumPy. Los tiempos se manejan en minutos
+# desde el inicio de la jornada.
+#
+# Nodos de la matriz: 0 = origen (o "cualquier lugar" si no se indica),
+# 1..n = paradas, n+1 = fin (distancia cero a todos: la ruta es abierta).
+
+
+class ErrorRuta(Exception):
+    pass
+
+
+def distancias_entre(lat_a, lon_a, lat_b, lon_b):
+    """Matriz haversine (km) de cada punto A a cada punto B, vectorizada."""
+    lat_a, lon_a, lat_b, lon_b = (np.radians(np.asarray(v, dtype=float)) for v in (lat_a, lon_a, lat_b, lon_b))
+    dlat = lat_a[:, None] - lat_b[None, :]
+    dlon = lon_a[:, None] - lon_b[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_a)[:, None] * np.cos(lat_b)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def matriz_distancias(latitudes, longitudes):
+    """Distancias haversine (km) entre todos los puntos."""
+    return distancias_entre(latitudes, longitudes, latitudes, longitudes)
+
+
+def _matriz_nodos(paradas, origen):
+    n = len(paradas)
+    distancias = np.zeros((n + 2, n + 2))
+    latitudes = [p['latitud'] for p in paradas]
+    longitudes = [p['longitud'] for p in paradas]
+    if origen is None:
+        distancias[1:n + 1, 1:n + 1] = matriz_distancias(latitudes, longitudes)
+    else:
+        distancias[:n + 1, :n + 1] = matriz_distancias([origen[0], *latitudes], [origen[1], *longitudes])
+    distancias[:, n + 1] = distancias[n + 1, :] = 0.0
+    return distancias
+
+
+def _evaluar(ruta, tiempos, abre, cierra, servicio):
+    """Recorre la ruta y devuelve (tardanza_total, llegadas, inicios)."""
+    actual, reloj_min, tardanza = 0, 0.0, 0.0
+    llegadas, inicios = [], []
+    for nodo in ruta:
+        llegada = reloj_min + tiempos[actual, nodo]
+        inicio = max(llegada, abre[nodo])
+        tardanza += max(0.0, inicio - cierra[nodo])
+        llegadas.append(llegada)
+        inicios.append(inicio)
+        reloj_min = inicio + servicio
+        actual = nodo
+    return tardanza, llegadas, inicios
+
+
+def _vecino_mas_cercano(tiempos, abre, cierra, servicio):
+    """Elige la parada que se puede empezar antes, prefiriendo las que llegan a tiempo."""
+    n = len(abre) - 2
+    pendientes = np.ones(n + 2, dtype=bool)
+    pendientes[0] = pendientes[n + 1] = False
+    ruta, actual, reloj_min = [], 0, 0.0
+    for _ in range(n):
+        inicio = np.maximum(reloj_min + tiempos[actual], abre)
+        tarde = inicio > cierra
+        # Orden lexicográfico: a tiempo primero, luego el inicio más temprano y el cierre más próximo
+        puntaje = np.where(pendientes, tarde * 1e9 + inicio + cierra * 1e-6, np.inf)
+        siguiente = int(np.argmin(puntaje))
+        # Mirar un paso adelante: si ir a 'siguiente' hace llegar tarde a la parada
+        # con el cierre más próximo (y hoy todavía se llega a tiempo), se va primero a esa
+        urgente = int(np.argmin(np.where(pendientes & ~tarde, cierra, np.inf)))
+        if pendientes[urgente] and urgente != siguiente and not tarde[siguiente]:
+            despues = max(inicio[siguiente] + servicio + tiempos[siguiente, urgente], abre[urgente])
+            if despues > cierra[urgente]:
+                siguiente = urgente
+        ruta.append(siguiente)
+        pendientes[siguiente] = False
+        reloj_min = inicio[siguiente] + servicio
+        actual = siguiente
+    return ruta
+
+
+def _dos_opt(ruta, distancias, tiempos, abre, cierra, servicio, limite):
+    """Invierte tramos mientras acorten la ruta sin aumentar la tardanza (hasta 'limite')."""
+    n = len(ruta)
+    camino = np.array([0, *ruta, n + 1])
+    tardanza = _evaluar(ruta, tiempos, abre, cierra, servicio)[0]
+    mejoro = True
+    while mejoro and reloj.perf_counter() < limite:
+        mejoro = False
+        for i in range(1, n):
+            if reloj.perf_counter() >= limite:
+                break
+            a, b = camino[i - 1], camino[i]
+            c, d = camino[i + 1:n + 1], camino[i + 2:n + 2]
+            # Ahorro de invertir camino[i..j] para todos los j > i a la vez
+            delta = distancias[a, c] + distancias[b, d] - distancias[a, b] - distancias[c, d]
+            for k in np.argsort(delta):
+                if delta[k] >= -1e-9 or reloj.perf_counter() >= limite:
+                    break
+                j = i + 1 + k
+                candidato = np.concatenate([camino[:i], camino[i:j + 1][::-1], camino[j + 1:]])
+                nueva_tardanza = _evaluar(candidato[1:-1], tiempos, abre, cierra, servicio)[0]
+                if nueva_tardanza <= tardanza + 1e-9:
+                    camino, tardanza, mejoro = candidato, nueva_tardanza, True
+                    break
+    return [int(nodo) for nodo in camino[1:-1]]
+
+
+def optimizar_ruta(paradas, origen=None, velocidad_kmh=None, minutos_servicio=None, presupuesto_s=None):
+    """
+    Ordena las paradas [{'abre': min, 'cierra': min, 'latitud', 'longitud', ...}]
+    (minutos desde el inicio de la jornada). Devuelve (orden de índices, tardanza
+    por parada, inicio por parada, distancias por tramo) en el orden de la ruta.
+    """
+    velocidad = velocidad_kmh or getattr(settings, 'RUTAS_VELOCIDAD_KMH', 30)
+    servicio = minutos_servicio if minutos_servicio is not None else getattr(settings, 'RUTAS_MINUTOS_SERVICIO', 45)
+    limite = reloj.perf_counter() + (presupuesto_s or getattr(settings, 'RUTAS_PRESUPUESTO_S', 2.0))
+    if not paradas:
+        return [], [], [], []
+
+    distancias = _matriz_nodos(paradas, origen)
+    tiempos = distancias / velocidad * 60
+    abre = np.array([0.0, *(p['abre'] for p in paradas), 0.0])
+    cierra = np.array([np.inf, *(p['cierra'] for p in paradas), np.inf])
+
+    ruta = _vecino_mas_cercano(tiempos, abre, cierra, servicio)
+    ruta = _dos_opt(ruta, distancias, tiempos, abre, cierra, servicio, limite)
+
+    _, _, inicios = _evaluar(ruta, tiempos, abre, cierra, servicio)
+    tramos = [float(distancias[a, b]) for a, b in zip([0, *ruta], ruta)]
+    tardanzas = [max(0.0, inicio - cierra[nodo]) for nodo, inicio in zip(ruta, inicios)]
+    return [nodo - 1 for nodo in ruta], tardanzas, inicios, tramos
+
+
+# --- DATOS DEL DÍA ---
+
+def _hora(valor, defecto):
+    try:
+        return time.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def ordenes_del_dia(fecha, tecnico_id=None):
+    """Órdenes abiertas con técnico que empiezan en `fecha` (usa ordentrabajo_tec_inicio_idx)."""
+    queryset = (
+        OrdenTrabajo.objects
+        .filter(
+            fecha_inicio__gte=timezone.make_aware(datetime.combine(fecha, time.min)),
+            fecha_inicio__lt=timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min)),
+            tecnico__isnull=False,
+        )
+        .filter(filtro_abiertas())
+        .order_by('tecnico_id', 'fecha_inicio', 'id')
+    )
+    if tecnico_id is not None:
+        queryset = queryset.filter(tecnico_id=tecnico_id)
+    return queryset
+
+
+def rutas_del_dia(fecha, tecnico_id=None, origen=None):
+    """Ruta de cada técnico (o de uno) con las órdenes abiertas que empiezan ese día."""
+    inicio_jornada = timezone.make_aware(datetime.combine(
+        fecha, _hora(getattr(settings, 'RUTAS_INICIO_JORNADA', '08:00'), time(8)),
+    ))
+    fin_jornada = timezone.make_aware(datetime.combine(
+        fecha, _hora(getattr(settings, 'RUTAS_FIN_JORNADA', '18:00'), time(18)),
+    ))
+
+    filas = list(ordenes_del_dia(fecha, tecnico_id).values(
+        'id', 'titulo', 'direccion', 'latitud', 'longitud', 'fecha_inicio', 'fecha_fin',
+        'tecnico_id', 'tecnico__username',
+    ))
+
+    por_tecnico = {}
+    for fila in filas:
+        por_tecnico.setdefault(fila['tecnico_id'], []).append(fila)
+
+    maximo = getattr(settings, 'RUTAS_MAX_PARADAS', 500)
+    if any(len(ordenes) > maximo for ordenes in por_tecnico.values()):
+        raise ErrorRuta(f'Máximo {maximo} paradas por técnico y día.')
+
+    # El presupuesto de tiempo se reparte entre los técnicos
+    presupuesto = getattr(settings, 'RUTAS_PRESUPUESTO_S', 2.0) / max(1, len(por_tecnico))
+
+    def minutos(momento):
+        return (momento - inicio_jornada).total_seconds() / 60
+
+    rutas = []
+    for tecnico, ordenes in por_tecnico.items():
+        paradas = [o for o in ordenes if o['latitud'] is not None and o['longitud'] is not None]
+        for parada in paradas:
+            # Ventana: desde fecha_inicio hasta fecha_fin (si es posterior) o el fin de la jornada
+            cierre = parada['fecha_fin'] if parada['fecha_fin'] and parada['fecha_fin'] > parada['fecha_inicio'] else fin_jornada
+            parada['abre'] = max(0.0, minutos(parada['fecha_inicio']))
+            parada['cierra'] = max(parada['abre'], minutos(cierre))
+
+        inicio_calculo = reloj.perf_counter()
+        orden, tardanzas, inicios, tramos = optimizar_ruta(paradas, origen, presupuesto_s=presupuesto)
+        rutas.append({
+            'tecnico': tecnico,
+            'tecnico_nombre': ordenes[0]['tecnico__username'],
+            'paradas': [
+                {
+                    'orden': paradas[i]['id'],
+                    'titulo': paradas[i]['titulo'],
+                    'direccion': paradas[i]['direccion'],
+                    'latitud': paradas[i]['latitud'],
+                    'longitud': paradas[i]['longitud'],
+                    'inicio_estimado': inicio_jornada + timedelta(minutes=inicio),
+                    'distancia_km': round(tramo, 3),
+                    'tardanza_min': round(tardanza, 1),
+                }
+                for i, tardanza, inicio, tramo in zip(orden, tardanzas, inicios, tramos)
+            ],
+            'distancia_total_km': round(sum(tramos), 3),
+            'tardanza_total_min': round(sum(tardanzas), 1),
+            'sin_ubicacion': [o['id'] for o in ordenes if o['latitud'] is None or o['longitud'] is None],
+            'calculo_ms': round((reloj.perf_counter() - inicio_calculo) * 1000, 1),
+        })
+    return rutas
@@ -1,7 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
-from .models import Estado, OrdenTrabajo, Avance, FotoAvance 
+from .models import Estado, OrdenTrabajo, Avance, FotoAvance, ReportePDF
+from .imagenes import VARIANTES, url_variante
+
+class VariantesImagenField(serializers.ReadOnlyField):
+    """URLs de las versiones reducidas de una imagen: {'miniatura': ..., 'reporte': ..., 'completa': ...}"""
+
+    def to_representation(self, archivo):
+        # Rutas deterministas: serializar no consulta el storage ni redimensiona
+        if not archivo:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for variante in VARIANTES:
+            url = url_variante(archivo, variante)
+            urls[variante] = request.build_absolute_uri(url) if request else url
+        return urls
 
 class ClienteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,10 +37,12 @@ class OrdenTrabajoSerializer(serializers.ModelSerializer):
     cliente_nombre = serializers.ReadOnlyField(source='cliente.username')
     tecnico_nombre = serializers.ReadOnlyField(source='tecnico.username')
     supervisor_nombre = serializers.ReadOnlyField(source='supervisor.username')
+    foto_referencia_variantes = VariantesImagenField(source='foto_referencia')
     
     class Meta:
         model = OrdenTrabajo
-        fields = '__all__'
+        # 'busqueda' es el tsvector interno de la búsqueda de texto completo
+        exclude = ['busqueda']
 
 # --- SERIALIZER PARA CREAR USUARIOS (STAFF) ---
 class RegistroUsuarioSerializer(serializers.ModelSerializer):
@@ -55,14 +72,33 @@ class RegistroUsuarioSerializer(serializers.ModelSerializer):
 # --- NUEVOS SERIALIZERS PARA BITÁCORA CON FOTOS ---
 
 class FotoAvanceSerializer(serializers.ModelSerializer):
+    variantes = VariantesImagenField(source='foto')
+
     class Meta:
         model = FotoAvance
-        fields = ['id', 'foto']
+        fields = ['id', 'foto', 'variantes']
 
 class AvanceSerializer(serializers.ModelSerializer):
     # 'imagenes' hace match con el related_name='imagenes' definido en models.py
     imagenes = FotoAvanceSerializer(many=True, read_only=True)
+    foto_variantes = VariantesImagenField(source='foto')
 
     class Meta:
         model = Avance
-        fields = ['id', 'orden', 'contenido', 'foto', 'creado_en', 'imagenes']
\ No newline at end of file
+        fields = ['id', 'orden', 'contenido', 'foto', 'foto_variantes', 'creado_en', 'actualizado_en', 'id_cliente', 'imagenes']
+
+# --- SERIALIZER DE TRABAJOS DE REPORTE PDF ---
+
+class ReportePDFSerializer(serializers.ModelSerializer):
+    descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportePDF
+        fields = ['id', 'orden', 'estado', 'progreso', 'error', 'creado_en', 'terminado_en', 'descarga']
+
+    def get_descarga(self, obj):
+        if obj.estado != 'listo':
+            return None
+        url = f'/api/reportes/{obj.id}/descargar/'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
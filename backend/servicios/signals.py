@@ -0,0 +1,202 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import olvidar_estado_usuario
+from .busqueda import actualizar_indice_busqueda
+from .estadisticas import invalidar_estadisticas
+from .eventos import hay_suscriptores, publicar_avance, publicar_orden
+from .geo import asignar_celda
+from .imagenes import generar_variantes
+from .models import Avance, Estado, FotoAvance, OrdenTrabajo
+from .reportes import invalidar_cache_reporte
+from .respuestas import invalidar_catalogo
+from .sincronizacion import registrar_eliminacion, registrar_salidas
+
+
+# --- INVALIDACIÓN DE CACHÉ ---
+
+@receiver([post_save, post_delete], sender=OrdenTrabajo)
+@receiver([post_save, post_delete], sender=Avance)
+@receiver([post_save, post_delete], sender=Estado)
+def invalidar_dashboard(sender, **kwargs):
+    invalidar_estadisticas()
+
+
+@receiver([post_save, post_delete], sender=OrdenTrabajo)
+def invalidar_reporte_orden(sender, instance, **kwargs):
+    invalidar_cache_reporte(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Avance)
+def invalidar_reporte_avance(sender, instance, **kwargs):
+    invalidar_cache_reporte(instance.orden_id)
+
+
+@receiver([post_save, post_delete], sender=FotoAvance)
+def invalidar_reporte_foto(sender, instance, **kwargs):
+    orden_id = Avance.objects.filter(pk=instance.avance_id).values_list('orden_id', flat=True).first()
+    if orden_id:
+        invalidar_cache_reporte(orden_id)
+
+
+# Catálogos con GET condicional (estados, clientes, técnicos y supervisores)
+
+@receiver([post_save, post_delete], sender=Estado)
+def invalidar_catalogo_estados(sender, **kwargs):
+    invalidar_catalogo('estados')
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_catalogo_usuarios(sender, **kwargs):
+    # Cambiar de grupo mueve al usuario entre clientes, técnicos y supervisores
+    invalidar_catalogo('usuarios')
+
+
+# --- VARIANTES DE IMÁGENES ---
+# Se generan al confirmar la transacción; las que falten (fotos antiguas o un
+# error al generarlas) se completan con manage.py generar_variantes.
+
+@receiver(post_save, sender=OrdenTrabajo)
+def variantes_foto_referencia(sender, instance, **kwargs):
+    if instance.foto_referencia:
+        transaction.on_commit(lambda: generar_variantes(instance.foto_referencia))
+
+
+@receiver(post_save, sender=Avance)
+@receiver(post_save, sender=FotoAvance)
+def variantes_foto_avance(sender, instance, **kwargs):
+    if instance.foto:
+        transaction.on_commit(lambda: generar_variantes(instance.foto))
+
+
+# --- CELDA GEOGRÁFICA (geohash) DE LA ORDEN ---
+# bulk_create / bulk_update no pasan por aquí: importacion.py la asigna a mano.
+
+@receiver(pre_save, sender=OrdenTrabajo)
+def actualizar_celda_geo(sender, instance, **kwargs):
+    asignar_celda(instance)
+
+
+# --- ÍNDICE DE TEXTO COMPLETO (solo PostgreSQL) ---
+# Se recalcula solo si cambió algún texto indexado (comparando con los valores
+# leídos de la base) y al confirmar la transacción: cambiar el estado, el
+# técnico o las fechas no vuelve a agregar la bitácora de la orden.
+
+CAMPOS_INDEXADOS = {
+    OrdenTrabajo: ('titulo', 'descripcion', 'direccion'),
+    Avance: ('contenido', 'orden_id'),
+}
+
+
+def _textos(instance):
+    # __dict__ para no disparar la carga de campos diferidos con only()/defer()
+    return {c: instance.__dict__[c] for c in CAMPOS_INDEXADOS[type(instance)] if c in instance.__dict__}
+
+
+@receiver(post_init, sender=OrdenTrabajo)
+@receiver(post_init, sender=Avance)
+def recordar_textos(sender, instance, **kwargs):
+    instance._textos_originales = _textos(instance)
+
+
+def _textos_cambiados(instance, created, update_fields):
+    """Devuelve los textos anteriores si hay que reindexar (None si no) y renueva la copia."""
+    anteriores = instance._textos_originales
+    actuales = _textos(instance)
+    instance._textos_originales = actuales
+    if update_fields is not None and not {c.removesuffix('_id') for c in actuales} & {
+        c.removesuffix('_id') for c in update_fields
+    }:
+        return None
+    if created or any(anteriores.get(c, valor) != valor for c, valor in actuales.items()):
+        return anteriores
+    return None
+
+
+@receiver(post_save, sender=OrdenTrabajo)
+def indexar_orden(sender, instance, created, update_fields, **kwargs):
+    if _textos_cambiados(instance, created, update_fields) is not None:
+        transaction.on_commit(lambda: actualizar_indice_busqueda([instance.pk]))
+
+
+@receiver(post_save, sender=Avance)
+def indexar_avance(sender, instance, created, update_fields, **kwargs):
+    anteriores = _textos_cambiados(instance, created, update_fields)
+    if anteriores is not None:
+        # Si el avance pasó a otra orden, también se reindexa la anterior
+        orden_ids = {instance.orden_id, anteriores.get('orden_id', instance.orden_id)}
+        transaction.on_commit(lambda: actualizar_indice_busqueda(list(orden_ids)))
+
+
+@receiver(post_delete, sender=Avance)
+def desindexar_avance(sender, instance, **kwargs):
+    transaction.on_commit(lambda: actualizar_indice_busqueda([instance.orden_id]))
+
+
+# --- EVENTOS EN TIEMPO REAL (se publican al confirmar la transacción) ---
+
+@receiver(post_save, sender=OrdenTrabajo)
+def evento_orden(sender, instance, **kwargs):
+    if hay_suscriptores():
+        transaction.on_commit(lambda: publicar_orden(instance.pk))
+
+
+@receiver(post_delete, sender=OrdenTrabajo)
+def evento_orden_eliminada(sender, instance, **kwargs):
+    if hay_suscriptores():
+        participantes = (instance.cliente_id, instance.tecnico_id, instance.supervisor_id)
+        transaction.on_commit(lambda: publicar_orden(instance.pk, eliminada=True, participantes=participantes))
+
+
+@receiver(post_save, sender=Avance)
+def evento_avance(sender, instance, created, **kwargs):
+    # Las fotos se crean después del avance en la misma transacción: al confirmar ya están
+    if created and hay_suscriptores():
+        transaction.on_commit(lambda: publicar_avance(instance.pk))
+
+
+# --- SINCRONIZACIÓN INCREMENTAL (tombstones) ---
+
+@receiver(post_init, sender=OrdenTrabajo)
+def recordar_participantes(sender, instance, **kwargs):
+    # __dict__ para no disparar la carga de campos diferidos con only()/defer()
+    instance._participantes_originales = (instance.__dict__.get('tecnico_id'), instance.__dict__.get('supervisor_id'))
+
+
+@receiver(post_save, sender=OrdenTrabajo)
+def registrar_reasignacion(sender, instance, created, **kwargs):
+    if not created:
+        registrar_salidas([instance])
+
+
+@receiver(post_delete, sender=OrdenTrabajo)
+def tombstone_orden(sender, instance, **kwargs):
+    registrar_eliminacion('orden', instance.pk, instance.pk)
+
+
+@receiver(post_delete, sender=Avance)
+def tombstone_avance(sender, instance, **kwargs):
+    registrar_eliminacion('avance', instance.pk, instance.orden_id)
+
+
+@receiver(post_delete, sender=FotoAvance)
+def tombstone_foto(sender, instance, **kwargs):
+    registrar_eliminacion('foto', instance.pk)
+    # El avance cambia (tiene una foto menos) y debe volver a sincronizarse
+    Avance.objects.filter(pk=instance.avance_id).update(actualizado_en=timezone.now())
+
+
+@receiver(post_delete, sender=Estado)
+def tombstone_estado(sender, instance, **kwargs):
+    registrar_eliminacion('estado', instance.pk)
+
+
+# --- ESTADO DE USUARIOS PARA EL JWT SIN CONSULTA ---
+
+@receiver([post_save, post_delete], sender=User)
+def olvidar_usuario(sender, instance, **kwargs):
+    olvidar_estado_usuario(instance.pk)
@@ -0,0 +1,127 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .filters import parse_fecha
+from .models import Avance, Eliminacion, Estado, OrdenTrabajo
+from .roles import es_supervisor, es_tecnico
+
+# --- SINCRONIZACIÓN INCREMENTAL PARA TÉCNICOS SIN CONEXIÓN ---
+# El cliente guarda el 'token' de la última respuesta y en la siguiente pide solo
+# lo que cambió desde entonces (actualizado_en) y lo que se borró (Eliminacion).
+# Se consulta con un margen hacia atrás para no perder filas de transacciones que
+# confirmaron tarde: el cliente debe aplicar los cambios por id (idempotente).
+
+SAL_TOKEN = 'servicios.sincronizacion.token'
+_ultima_purga = 0.0
+
+
+def _margen():
+    return timedelta(seconds=getattr(settings, 'SYNC_MARGEN_S', 5))
+
+
+def _retencion():
+    return timedelta(days=getattr(settings, 'SYNC_RETENCION_DIAS', 30))
+
+
+def token_sync(momento):
+    return signing.dumps(momento.isoformat(), salt=SAL_TOKEN)
+
+
+def leer_desde(params):
+    """Momento de la última sincronización (?token= firmado o ?desde= ISO 8601), o None."""
+    token = params.get('token')
+    if token:
+        try:
+            return datetime.fromisoformat(signing.loads(token, salt=SAL_TOKEN))
+        except (signing.BadSignature, ValueError, TypeError):
+            raise ValidationError({'token': "Token de sincronización inválido."})
+    return parse_fecha(params, 'desde')
+
+
+def ordenes_visibles(user):
+    """Órdenes que se sincronizan en el celular de cada rol."""
+    if es_tecnico(user):
+        return OrdenTrabajo.objects.filter(tecnico_id=user.id)
+    if es_supervisor(user):
+        return OrdenTrabajo.objects.filter(supervisor_id=user.id)
+    return OrdenTrabajo.objects.all()
+
+
+# --- TOMBSTONES ---
+
+def purgar_eliminaciones():
+    """Borra los registros más viejos que la retención (como máximo una vez por hora)."""
+    global _ultima_purga
+    if time.monotonic() - _ultima_purga < 3600:
+        return
+    _ultima_purga = time.monotonic()
+    Eliminacion.objects.filter(eliminado_en__lt=timezone.now() - _retencion()).delete()
+
+
+def registrar_eliminacion(modelo, objeto_id, orden_id=None):
+    Eliminacion.objects.create(modelo=modelo, objeto_id=objeto_id, orden_id=orden_id)
+    purgar_eliminaciones()
+
+
+def participantes_originales(orden):
+    # Se guardan en post_init sin forzar la carga de campos diferidos
+    return getattr(orden, '_participantes_originales', (None, None))
+
+
+def registrar_salidas(ordenes):
+    """
+    Si cambió el técnico o supervisor de una orden, el anterior deja de verla:
+    se le deja un tombstone personal para que la quite de su celular.
+    """
+    salidas = []
+    for orden in ordenes:
+        actuales = (orden.__dict__.get('tecnico_id'), orden.__dict__.get('supervisor_id'))
+        for anterior, actual in zip(participantes_originales(orden), actuales):
+            if anterior and anterior != actual:
+                salidas.append(Eliminacion(modelo='orden', objeto_id=orden.pk, orden_id=orden.pk, usuario_id=anterior))
+        orden._participantes_originales = actuales
+    if salidas:
+        Eliminacion.objects.bulk_create(salidas)
+
+
+# --- CAMBIOS DESDE UN MOMENTO ---
+
+def cambios_desde(user, desde, incluir_avances=True):
+    """
+    Devuelve (ahora, completo, ordenes, avances, estados, eliminados).
+    Sin 'desde', o si es más viejo que la retención de tombstones, se envía todo.
+    """
+    ahora = timezone.now()
+    completo = desde is None or desde < ahora - _retencion()
+    visibles = ordenes_visibles(user)
+
+    ordenes = visibles.select_related('estado', 'cliente', 'tecnico', 'supervisor').order_by('actualizado_en', 'id')
+    avances = Avance.objects.filter(orden__in=visibles.values('id')).prefetch_related('imagenes').order_by('actualizado_en', 'id')
+    estados = Estado.objects.order_by('orden', 'id')
+    eliminados = {'ordenes': [], 'avances': [], 'fotos': [], 'estados': []}
+
+    if not completo:
+        limite = desde - _margen()
+        ordenes = ordenes.filter(actualizado_en__gte=limite)
+        avances = avances.filter(actualizado_en__gte=limite)
+        # Los estados son pocos: si cambió alguno se envían todos
+        cambio_estados = Estado.objects.filter(actualizado_en__gte=limite).exists()
+
+        tombstones = Eliminacion.objects.filter(eliminado_en__gte=limite).filter(
+            Q(usuario_id__isnull=True) | Q(usuario_id=user.id)
+        ).values_list('modelo', 'objeto_id')
+        clave = {'orden': 'ordenes', 'avance': 'avances', 'foto': 'fotos', 'estado': 'estados'}
+        for modelo, objeto_id in tombstones:
+            eliminados[clave[modelo]].append(objeto_id)
+        if not cambio_estados and not eliminados['estados']:
+            estados = Estado.objects.none()
+
+    if not incluir_avances:
+        avances = Avance.objects.none()
+    return ahora, completo, ordenes, avances, estados, eliminados
@@ -1,3 +1,1559 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import warnings
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .asignacion import ordenes_para_asignar, proponer_asignaciones
+from .authentication import RolJWTAuthentication, UsuarioToken, olvidar_estado_usuario
+from .eventos import PREFIJO_TICKET, BrokerLocal, canal_usuario, flujo_sse
+from .fotos import crear_avance_con_fotos
+from .geo import filtrar_caja, geohash
+from .imagenes import ruta_variante
+from .importacion import crear_ordenes
+from .models import Avance, Eliminacion, Estado, FotoAvance, OrdenTrabajo, ReportePDF
+from .reportes import procesar_reporte
+from .rutas import optimizar_ruta, ordenes_del_dia
+from .vistas_async import avances_lista, dashboard_stats, ordenes_lista
+
+
+class OrdenesApiTestCase(TestCase):
+    """Datos mínimos compartidos por las pruebas de la API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupo_tecnico = Group.objects.create(name='Tecnico')
+        cls.grupo_supervisor = Group.objects.create(name='Supervisor')
+
+        cls.admin = User.objects.create_superuser('admin', 'admin@test.com', 'admin123')
+        cls.cliente = User.objects.create_user('cliente', password='cliente123')
+        cls.tecnico = User.objects.create_user('tecnico', password='tecnico123')
+        cls.tecnico.groups.add(cls.grupo_tecnico)
+        cls.supervisor = User.objects.create_user('supervisor', password='supervisor123')
+        cls.supervisor.groups.add(cls.grupo_supervisor)
+
+        cls.pendiente = Estado.objects.create(nombre='Pendiente', color='#FFC107', orden=1)
+        cls.progreso = Estado.objects.create(nombre='En Progreso', color='#2196F3', orden=2)
+        cls.finalizado = Estado.objects.create(nombre='Finalizado', color='#4CAF50', orden=4)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def crear_orden(self, **kwargs):
+        datos = {'titulo': 'Orden', 'cliente': self.cliente, 'estado': self.pendiente}
+        datos.update(kwargs)
+        return OrdenTrabajo.objects.create(**datos)
+
+    def login(self, username, password):
+        response = self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def contar_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueriesConstantes(self, url, crear_filas, esperadas, params=None):
+        """
+        Verifica que `url` ejecute exactamente `esperadas` queries sin importar
+        cuántas filas existan. `crear_filas(n)` agrega n filas más al escenario.
+        """
+        crear_filas(1)
+        con_pocas = self.contar_queries(url, params)
+        crear_filas(10)
+        con_muchas = self.contar_queries(url, params)
+        self.assertEqual(con_pocas, con_muchas, "El número de queries crece con las filas (N+1).")
+        self.assertEqual(con_muchas, esperadas)
+
+
+class MediaTemporalMixin:
+    """Redirige MEDIA_ROOT a un directorio temporal durante cada prueba."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def foto_de_prueba(self, nombre='foto.jpg', tamano=(2400, 1800)):
+        contenido = BytesIO()
+        Image.new('RGB', tamano, color=(200, 30, 30)).save(contenido, format='JPEG')
+        return SimpleUploadedFile(nombre, contenido.getvalue(), content_type='image/jpeg')
+
+
+class OrdenFiltrosTests(OrdenesApiTestCase):
+
+    def test_listado_sin_paginar_devuelve_lista(self):
+        self.crear_orden()
+        self.crear_orden()
+        response = self.client.get('/api/ordenes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 2)
+
+    def test_filtros_por_tecnico_estado_y_texto(self):
+        propia = self.crear_orden(titulo='Cableado oficina', tecnico=self.tecnico, estado=self.progreso)
+        self.crear_orden(titulo='Cableado bodega', estado=self.progreso)
+        self.crear_orden(titulo='Cámaras', tecnico=self.tecnico)
+
+        response = self.client.get('/api/ordenes/', {
+            'tecnico': self.tecnico.id, 'estado': 'En Progreso', 'search': 'cableado',
+        })
+        self.assertEqual([o['id'] for o in response.data], [propia.id])
+
+    def test_rango_de_fechas(self):
+        antigua = self.crear_orden()
+        OrdenTrabajo.objects.filter(pk=antigua.pk).update(creado_en=timezone.now() - timedelta(days=10))
+        reciente = self.crear_orden()
+
+        desde = (timezone.localdate() - timedelta(days=1)).isoformat()
+        response = self.client.get('/api/ordenes/', {'desde': desde})
+        self.assertEqual([o['id'] for o in response.data], [reciente.id])
+
+    def test_parametro_invalido(self):
+        response = self.client.get('/api/ordenes/', {'tecnico': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_paginacion_por_cursor_recorre_todo_sin_repetir(self):
+        ids = {self.crear_orden(titulo=f'Orden {i}').id for i in range(7)}
+
+        vistos = []
+        response = self.client.get('/api/ordenes/', {'page_size': 3})
+        while True:
+            vistos += [o['id'] for o in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(vistos), len(ids))
+        self.assertEqual(set(vistos), ids)
+
+
+class ConsultasNMasUnoTests(MediaTemporalMixin, OrdenesApiTestCase):
+    """Regresión: los listados deben costar un número fijo de queries."""
+
+    def crear_ordenes(self, n):
+        for _ in range(n):
+            self.crear_orden(tecnico=self.tecnico, supervisor=self.supervisor)
+
+    def crear_avances(self, n):
+        orden = OrdenTrabajo.objects.first() or self.crear_orden()
+        for i in range(n):
+            avance = Avance.objects.create(orden=orden, contenido=f'Avance {i}')
+            FotoAvance.objects.create(avance=avance, foto=self.foto_de_prueba(tamano=(40, 30)))
+
+    def test_listado_de_ordenes(self):
+        self.assertQueriesConstantes('/api/ordenes/', self.crear_ordenes, esperadas=1)
+
+    def test_listado_de_ordenes_paginado(self):
+        self.assertQueriesConstantes('/api/ordenes/', self.crear_ordenes, esperadas=1, params={'page_size': 50})
+
+    def test_detalle_de_orden(self):
+        orden = self.crear_orden(tecnico=self.tecnico, supervisor=self.supervisor)
+        self.assertEqual(self.contar_queries(f'/api/ordenes/{orden.id}/'), 1)
+
+    def test_listado_de_avances(self):
+        self.assertQueriesConstantes('/api/avances/', self.crear_avances, esperadas=2)
+
+
+class DashboardStatsTests(OrdenesApiTestCase):
+
+    def test_conteos_por_estado_y_carga(self):
+        revision = Estado.objects.create(nombre='En Revisión', color='#9C27B0', orden=3)
+        self.crear_orden(tecnico=self.tecnico)
+        self.crear_orden(tecnico=self.tecnico, estado=self.progreso)
+        self.crear_orden(estado=revision, supervisor=self.supervisor)
+        self.crear_orden(tecnico=self.tecnico, estado=self.finalizado, fecha_fin=timezone.now())
+
+        response = self.client.get('/api/dashboard-stats/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['pendientes'], 1)
+        self.assertEqual(data['en_progreso'], 1)
+        self.assertEqual(data['en_revision'], 1)
+        self.assertEqual(data['finalizados'], 1)
+        self.assertEqual(data['cancelados'], 0)
+        self.assertEqual(len(data['por_estado']), 4)
+
+        tecnico = data['por_tecnico'][0]
+        self.assertEqual((tecnico['total'], tecnico['abiertas'], tecnico['finalizadas']), (3, 2, 1))
+        self.assertEqual(data['por_supervisor'][0]['id'], self.supervisor.id)
+
+        hoy = data['histograma']['diario'][-1]
+        self.assertEqual((hoy['creadas'], hoy['finalizadas']), (4, 1))
+        self.assertEqual(data['histograma']['semanal'][-1]['creadas'], 4)
+
+    def test_abiertas_por_tecnico_igual_que_el_filtro(self):
+        cancelado = Estado.objects.create(nombre='Cancelado', color='#9E9E9E', orden=5)
+        self.crear_orden(tecnico=self.tecnico, estado=None)
+        self.crear_orden(tecnico=self.tecnico, estado=cancelado)
+        self.crear_orden(tecnico=self.tecnico, estado=self.progreso, fecha_fin=timezone.now())
+        abiertas = self.client.get('/api/ordenes/', {'abiertas': '1', 'tecnico': self.tecnico.id}).data
+        tecnico = self.client.get('/api/dashboard-stats/').data['por_tecnico'][0]
+        self.assertEqual(tecnico['abiertas'], len(abiertas))
+        self.assertEqual(tecnico['abiertas'], 2)
+
+    def test_filtrado_por_supervisor(self):
+        self.crear_orden(supervisor=self.supervisor)
+        self.crear_orden()
+        response = self.client.get('/api/dashboard-stats/', {'supervisor': self.supervisor.id})
+        self.assertEqual(response.data['total'], 1)
+
+    def crear_ordenes(self, n):
+        for _ in range(n):
+            self.crear_orden(tecnico=self.tecnico, supervisor=self.supervisor)
+
+    def test_queries_constantes(self):
+        self.assertQueriesConstantes('/api/dashboard-stats/', self.crear_ordenes, esperadas=6)
+
+    def test_cache_y_invalidacion_por_senales(self):
+        orden = self.crear_orden()
+        self.assertEqual(self.client.get('/api/dashboard-stats/').data['total'], 1)
+
+        # La segunda lectura sale de la caché sin tocar la base de datos
+        self.assertEqual(self.contar_queries('/api/dashboard-stats/'), 0)
+
+        self.crear_orden()
+        self.assertEqual(self.client.get('/api/dashboard-stats/').data['total'], 2)
+
+        Avance.objects.create(orden=orden, contenido='Visita')
+        self.assertGreater(self.contar_queries('/api/dashboard-stats/'), 0)
+
+        orden.delete()
+        self.assertEqual(self.client.get('/api/dashboard-stats/').data['total'], 1)
+
+
+class ReportePDFTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orden = self.crear_orden(titulo='Instalación de red', tecnico=self.tecnico)
+        Avance.objects.create(orden=self.orden, contenido='Se tendió el cableado')
+
+    def test_descarga_inmediata(self):
+        response = self.client.get(f'/api/ordenes/{self.orden.id}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_trabajo_en_segundo_plano(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(f'/api/ordenes/{self.orden.id}/pdf/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['estado'], 'pendiente')
+        self.assertIsNone(response.data['descarga'])
+        self.assertEqual(len(callbacks), 1)
+
+        # Mientras sigue pendiente, otro POST reutiliza el mismo trabajo
+        repetido = self.client.post(f'/api/ordenes/{self.orden.id}/pdf/')
+        self.assertEqual(repetido.data['id'], response.data['id'])
+
+        reporte_id = response.data['id']
+        self.assertEqual(self.client.get(f'/api/reportes/{reporte_id}/descargar/').status_code, 409)
+
+        procesar_reporte(reporte_id)
+
+        estado = self.client.get(f'/api/reportes/{reporte_id}/')
+        self.assertEqual((estado.data['estado'], estado.data['progreso']), ('listo', 100))
+        self.assertIsNotNone(estado.data['descarga'])
+
+        descarga = self.client.get(f'/api/reportes/{reporte_id}/descargar/')
+        self.assertEqual(descarga.status_code, 200)
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'%PDF'))
+
+    def test_cache_y_etag(self):
+        url = f'/api/ordenes/{self.orden.id}/pdf/'
+        primera = self.client.get(url)
+        etag = primera['ETag']
+
+        no_modificado = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado['ETag'], etag)
+
+        # Sin If-None-Match se sirve el archivo en disco sin volver a renderizar
+        with mock.patch('servicios.reportes.pisa.CreatePDF') as create_pdf:
+            segunda = self.client.get(url)
+        create_pdf.assert_not_called()
+        self.assertEqual(segunda.content, primera.content)
+
+        # Un avance nuevo cambia la revisión e invalida la caché
+        Avance.objects.create(orden=self.orden, contenido='Pruebas de conectividad')
+        tercera = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(tercera.status_code, 200)
+        self.assertNotEqual(tercera['ETag'], etag)
+
+    def test_error_queda_registrado(self):
+        reporte = ReportePDF.objects.create(orden=self.orden)
+        with mock.patch('servicios.reportes.pisa.CreatePDF', return_value=mock.Mock(err=1)):
+            with self.assertLogs('servicios.reportes', level='ERROR'):
+                procesar_reporte(reporte.id)
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.estado, 'error')
+        self.assertEqual(reporte.error, 'Error al generar PDF')
+
+
+class VariantesImagenTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def test_variantes_al_guardar(self):
+        orden = self.crear_orden()
+        with self.captureOnCommitCallbacks(execute=True):
+            avance = Avance.objects.create(orden=orden, contenido='Con foto', foto=self.foto_de_prueba())
+
+        for variante, lado in (('miniatura', 320), ('reporte', 600), ('completa', 1600)):
+            ruta = ruta_variante(avance.foto.name, variante)
+            self.assertTrue(default_storage.exists(ruta))
+            with default_storage.open(ruta) as archivo:
+                self.assertEqual(max(Image.open(archivo).size), lado)
+
+        self.assertTrue(ruta_variante(avance.foto.name, 'miniatura').endswith('.webp'))
+
+    def test_api_no_toca_el_storage(self):
+        orden = self.crear_orden()
+        avance = Avance.objects.create(orden=orden, contenido='Sin variantes aún')
+        foto = FotoAvance.objects.create(avance=avance, foto=self.foto_de_prueba('extra.jpg'))
+
+        with mock.patch('servicios.imagenes.default_storage.exists') as exists, \
+                mock.patch('servicios.imagenes.Image.open') as abrir:
+            response = self.client.get('/api/avances/', {'orden': orden.id})
+        exists.assert_not_called()
+        abrir.assert_not_called()
+        variantes = response.data[0]['imagenes'][0]['variantes']
+        self.assertEqual(set(variantes), {'miniatura', 'reporte', 'completa'})
+        self.assertTrue(variantes['miniatura'].endswith(ruta_variante(foto.foto.name, 'miniatura')))
+        self.assertIsNone(response.data[0]['foto_variantes'])
+
+    def test_comando_completa_las_variantes_faltantes(self):
+        orden = self.crear_orden()
+        foto = FotoAvance.objects.create(
+            avance=Avance.objects.create(orden=orden, contenido='Antigua'), foto=self.foto_de_prueba('vieja.jpg'),
+        )
+        self.assertFalse(default_storage.exists(ruta_variante(foto.foto.name, 'reporte')))
+        call_command('generar_variantes', stdout=StringIO())
+        for variante in ('miniatura', 'reporte', 'completa'):
+            self.assertTrue(default_storage.exists(ruta_variante(foto.foto.name, variante)))
+
+    def test_variante_conserva_la_extension(self):
+        self.assertNotEqual(ruta_variante('avances/foto.jpg', 'reporte'), ruta_variante('avances/foto.png', 'reporte'))
+
+
+class SubidaFotosAvanceTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orden = self.crear_orden(estado=self.progreso, tecnico=self.tecnico)
+
+    def test_varias_fotos_en_una_transaccion(self):
+        fotos = [self.foto_de_prueba(f'foto{i}.jpg', tamano=(800, 600)) for i in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/avances/', {
+                'orden': self.orden.id, 'contenido': 'Instalación terminada', 'fotos': fotos,
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['imagenes']), 5)
+        self.assertEqual(FotoAvance.objects.filter(avance_id=response.data['id']).count(), 5)
+        # Un solo INSERT para todas las fotos y ninguna consulta extra de 'imagenes'
+        inserts = [q for q in ctx.captured_queries if 'INSERT INTO "servicios_fotoavance"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'servicios_fotoavance' in q['sql']])
+
+        for foto in response.data['imagenes']:
+            self.assertTrue(foto['variantes']['miniatura'].endswith('.webp'))
+
+    @override_settings(FOTO_MAX_BYTES=1024)
+    def test_foto_demasiado_grande(self):
+        response = self.client.post('/api/avances/', {
+            'orden': self.orden.id, 'contenido': 'Foto pesada', 'fotos': [self.foto_de_prueba('grande.jpg')],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('grande.jpg', response.data['fotos'][0])
+        self.assertIn('1.0 KB', response.data['fotos'][0])
+        self.assertFalse(Avance.objects.exists())
+
+    @override_settings(AVANCE_MAX_FOTOS=2)
+    def test_demasiadas_fotos(self):
+        fotos = [self.foto_de_prueba(f'foto{i}.jpg', tamano=(40, 30)) for i in range(3)]
+        response = self.client.post('/api/avances/', {
+            'orden': self.orden.id, 'contenido': 'Muchas fotos', 'fotos': fotos,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(FOTO_MAX_BYTES=1024)
+    def test_foto_referencia_demasiado_grande(self):
+        response = self.client.post('/api/ordenes/', {
+            'titulo': 'Con plano', 'cliente': self.cliente.id, 'foto_referencia': self.foto_de_prueba('plano.jpg'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('plano.jpg', response.data['foto_referencia'][0])
+        self.assertFalse(OrdenTrabajo.objects.filter(titulo='Con plano').exists())
+
+        response = self.client.patch(f'/api/ordenes/{self.orden.id}/', {
+            'titulo': 'Renombrada', 'foto_referencia': self.foto_de_prueba('plano.jpg'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.orden.refresh_from_db()
+        self.assertNotEqual(self.orden.titulo, 'Renombrada')
+
+
+class CargaMasivaOrdenesTests(OrdenesApiTestCase):
+
+    def test_crear_lote_json_con_consultas_fijas(self):
+        filas = [
+            {'titulo': f'Orden {i}', 'cliente': 'cliente', 'tecnico': self.tecnico.id, 'estado': 'Pendiente'}
+            for i in range(50)
+        ]
+        # Roles del usuario + usuarios + estados + INSERT con su SAVEPOINT/RELEASE
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/ordenes/bulk/', filas, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['creadas'], 50)
+        self.assertEqual(OrdenTrabajo.objects.filter(tecnico=self.tecnico, estado=self.pendiente).count(), 50)
+
+    def test_crear_lote_csv(self):
+        csv_texto = (
+            'titulo,cliente,tecnico,estado,fecha_inicio,latitud,longitud\n'
+            'Revisión UPS,cliente,tecnico,En Progreso,2026-01-10T09:00:00,-2.170998,-79.922359\n'
+            'Mantenimiento,cliente,,,,,\n'
+        )
+        response = self.client.post('/api/ordenes/bulk/', csv_texto, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        ups, mantenimiento = OrdenTrabajo.objects.order_by('id')
+        self.assertEqual(ups.estado, self.progreso)
+        self.assertIsNone(mantenimiento.tecnico)
+
+    @override_settings(FOTO_MAX_BYTES=64)
+    def test_archivo_csv_no_usa_el_limite_de_fotos(self):
+        contenido = 'titulo,cliente\n' + ''.join(f'Orden larga número {i},cliente\n' for i in range(10))
+        archivo = SimpleUploadedFile('ordenes.csv', contenido.encode(), content_type='text/csv')
+        response = self.client.post('/api/ordenes/bulk/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['creadas'], 10)
+
+    def test_csv_de_excel_con_bom(self):
+        contenido = '\ufefftitulo,cliente\nRevisión de bodega,cliente\n'.encode()
+        archivo = SimpleUploadedFile('ordenes.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/ordenes/bulk/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.client.post('/api/ordenes/bulk/', contenido, content_type='text/csv')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(OrdenTrabajo.objects.filter(titulo='Revisión de bodega').count(), 2)
+
+    def test_csv_en_otra_codificacion_es_400(self):
+        contenido = 'titulo,cliente\nRevisión de bodega,cliente\n'.encode('cp1252')
+        archivo = SimpleUploadedFile('ordenes.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/ordenes/bulk/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['detail'])
+        response = self.client.post('/api/ordenes/bulk/', contenido, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_errores_por_fila_sin_crear_nada(self):
+        filas = [
+            {'titulo': 'Correcta', 'cliente': 'cliente'},
+            {'titulo': 'Sin cliente'},
+            {'titulo': 'Técnico inválido', 'cliente': 'cliente', 'tecnico': 'supervisor'},
+            {'cliente': 'cliente', 'estado': 'Inexistente'},
+        ]
+        response = self.client.post('/api/ordenes/bulk/', filas, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['fila'] for e in response.data['errores']], [2, 3, 4])
+        self.assertIn('cliente', response.data['errores'][0]['errores'])
+        self.assertIn('tecnico', response.data['errores'][1]['errores'])
+        self.assertIn('titulo', response.data['errores'][2]['errores'])
+        self.assertFalse(OrdenTrabajo.objects.exists())
+
+    def test_supervisor_queda_asignado_y_tecnico_no_puede_crear(self):
+        self.client.force_authenticate(self.supervisor)
+        response = self.client.post('/api/ordenes/bulk/', [{'titulo': 'A', 'cliente': 'cliente'}], format='json')
+        self.assertEqual(OrdenTrabajo.objects.get(pk=response.data['ids'][0]).supervisor, self.supervisor)
+
+        self.client.force_authenticate(self.tecnico)
+        response = self.client.post('/api/ordenes/bulk/', [{'titulo': 'B', 'cliente': 'cliente'}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_actualizar_lote(self):
+        a, b = self.crear_orden(), self.crear_orden()
+        response = self.client.patch('/api/ordenes/bulk/', [
+            {'id': a.id, 'estado': 'En Progreso', 'tecnico': 'tecnico'},
+            {'id': b.id, 'titulo': 'Renombrada'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.estado, a.tecnico), (self.progreso, self.tecnico))
+        self.assertEqual(b.titulo, 'Renombrada')
+
+    def test_actualizar_respeta_supervisor_asignado(self):
+        otro = User.objects.create_user('otro_supervisor')
+        otro.groups.add(self.grupo_supervisor)
+        ajena = self.crear_orden(supervisor=otro)
+
+        self.client.force_authenticate(self.supervisor)
+        response = self.client.patch('/api/ordenes/bulk/', [{'id': ajena.id, 'titulo': 'X'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errores'][0]['fila'], 1)
+
+
+class RolesTokenTests(OrdenesApiTestCase):
+
+    def test_token_incluye_roles(self):
+        data = self.login('supervisor', 'supervisor123')
+        self.assertEqual(data['rol'], 'Supervisor')
+        token = AccessToken(data['access'])
+        self.assertEqual(token['roles'], ['Supervisor'])
+        self.assertEqual(token['rol'], 'Supervisor')
+        self.assertEqual(self.login('admin', 'admin123')['rol'], 'Administrador')
+
+    def test_validacion_de_roles_sin_consultas_a_grupos(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('supervisor', 'supervisor123')['access']}")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post('/api/ordenes/', {'titulo': 'Nueva', 'cliente': self.cliente.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['supervisor'], self.supervisor.id)
+        self.assertFalse([q for q in ctx.captured_queries if 'auth_group' in q['sql']])
+
+    def test_tecnico_con_token_no_puede_crear(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('tecnico', 'tecnico123')['access']}")
+        response = client.post('/api/ordenes/', {'titulo': 'Nueva', 'cliente': self.cliente.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class UsuarioDesdeTokenTests(OrdenesApiTestCase):
+
+    def cliente_con_token(self, username, password):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login(username, password)['access']}")
+        return client
+
+    def consultas_a_usuarios(self, client, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'auth_user' in q['sql']]
+
+    def test_lectura_sin_consultar_auth_user(self):
+        client = self.cliente_con_token('tecnico', 'tecnico123')
+        self.consultas_a_usuarios(client, '/api/estados/')
+        # Con el estado del usuario en caché no se lee auth_user
+        self.assertEqual(self.consultas_a_usuarios(client, '/api/estados/'), [])
+
+    def test_usuario_desactivado_pierde_acceso(self):
+        client = self.cliente_con_token('tecnico', 'tecnico123')
+        self.assertEqual(client.get('/api/estados/').status_code, 200)
+
+        self.tecnico.is_active = False
+        self.tecnico.save()
+        # La caché de estado es del proceso y sobrevive al rollback de la prueba
+        self.addCleanup(olvidar_estado_usuario, self.tecnico.id)
+        self.assertEqual(client.get('/api/estados/').status_code, 401)
+
+    def test_permisos_y_grupos_iguales_al_user(self):
+        self.grupo_tecnico.permissions.add(Permission.objects.get(codename='change_ordentrabajo'))
+        self.tecnico.user_permissions.add(Permission.objects.get(codename='view_avance'))
+        token = AccessToken(self.login('tecnico', 'tecnico123')['access'])
+        # is_staff cambia después de emitir el token: manda la base, no el claim
+        User.objects.filter(pk=self.tecnico.pk).update(is_staff=True)
+        olvidar_estado_usuario(self.tecnico.id)
+        self.addCleanup(olvidar_estado_usuario, self.tecnico.id)
+
+        user = RolJWTAuthentication().get_user(token)
+        real = User.objects.get(pk=self.tecnico.pk)
+        self.assertIsInstance(user, UsuarioToken)
+        for permiso in ('servicios.change_ordentrabajo', 'servicios.view_avance', 'servicios.delete_ordentrabajo'):
+            self.assertEqual(user.has_perm(permiso), real.has_perm(permiso))
+        self.assertTrue(user.has_perms(['servicios.change_ordentrabajo', 'servicios.view_avance']))
+        self.assertTrue(user.has_module_perms('servicios'))
+        self.assertEqual(list(user.groups.values_list('name', flat=True)), ['Tecnico'])
+        self.assertTrue(user.is_staff)
+
+    @override_settings(JWT_USUARIO_DESDE_TOKEN=False)
+    def test_modo_con_usuario_completo(self):
+        client = self.cliente_con_token('tecnico', 'tecnico123')
+        self.assertEqual(len(self.consultas_a_usuarios(client, '/api/estados/')), 1)
+
+
+class IndicesConsultasTests(OrdenesApiTestCase):
+    """Comprueba con EXPLAIN que el planificador usa los índices de las consultas frecuentes."""
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Con tablas de prueba tan pequeñas PostgreSQL preferiría un Seq Scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_ordenes_por_tecnico_y_estado(self):
+        plan = self.plan(
+            OrdenTrabajo.objects.filter(tecnico=self.tecnico, estado=self.progreso).order_by('-creado_en')
+        )
+        self.assertIn('ordentrabajo_tec_est_idx', plan)
+
+    def test_ordenes_por_supervisor_y_estado(self):
+        plan = self.plan(
+            OrdenTrabajo.objects.filter(supervisor=self.supervisor, estado=self.progreso).order_by('-creado_en')
+        )
+        self.assertIn('ordentrabajo_sup_est_idx', plan)
+
+    def test_ruta_del_dia_de_un_tecnico(self):
+        plan = self.plan(ordenes_del_dia(timezone.localdate(), self.tecnico.id))
+        self.assertIn('ordentrabajo_tec_inicio_idx', plan)
+
+    def test_bitacora_de_una_orden(self):
+        orden = self.crear_orden()
+        plan = self.plan(Avance.objects.filter(orden=orden).order_by('-creado_en'))
+        self.assertIn('avance_orden_creado_idx', plan)
+
+    def test_estado_por_nombre(self):
+        plan = self.plan(Estado.objects.filter(nombre='Pendiente'))
+        self.assertIn('servicios_estado_nombre', plan)
+
+    def test_ventana_del_calendario(self):
+        inicio = timezone.now()
+        plan = self.plan(OrdenTrabajo.objects.filter(fecha_inicio__gte=inicio, fecha_inicio__lt=inicio + timedelta(days=30)))
+        self.assertIn('ordentrabajo_inicio_idx', plan)
+
+
+class CalendarioTests(OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lunes = timezone.make_aware(timezone.datetime(2026, 3, 2, 9, 0))
+        self.dentro = self.crear_orden(titulo='Visita, sede; norte', tecnico=self.tecnico, fecha_inicio=self.lunes,
+                                       direccion='Av. 9 de Octubre')
+        self.otro_tecnico = self.crear_orden(fecha_inicio=self.lunes + timedelta(days=1))
+        self.fuera = self.crear_orden(tecnico=self.tecnico, fecha_inicio=self.lunes + timedelta(days=40))
+        self.sin_fecha = self.crear_orden(tecnico=self.tecnico)
+
+    def test_eventos_de_la_ventana(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/calendario/', {'inicio': '2026-03-01', 'fin': '2026-03-31'})
+        self.assertEqual([e['id'] for e in response.data], [self.dentro.id, self.otro_tecnico.id])
+        evento = response.data[0]
+        self.assertEqual(set(evento), {'id', 'titulo', 'fecha_inicio', 'fecha_fin', 'estado', 'color', 'tecnico', 'tecnico_nombre'})
+        self.assertEqual(evento['color'], self.pendiente.color)
+
+        response = self.client.get('/api/calendario/', {'inicio': '2026-03-01', 'fin': '2026-03-31', 'tecnico': self.tecnico.id})
+        self.assertEqual([e['id'] for e in response.data], [self.dentro.id])
+
+    def test_ventana_obligatoria(self):
+        self.assertEqual(self.client.get('/api/calendario/', {'inicio': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/calendario/', {'inicio': '2026-03-01', 'fin': '2028-03-01'}).status_code, 400)
+
+    def test_suscripcion_ics(self):
+        self.client.force_authenticate(self.tecnico)
+        url = self.client.get('/api/calendario/suscripcion/').data['url']
+        self.assertEqual(self.client.get('/api/calendario/suscripcion/', {'tecnico': self.admin.id}).status_code, 403)
+
+        with mock.patch('servicios.calendario.timezone.now', return_value=self.lunes):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        ics = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(ics.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(ics.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:orden-{self.dentro.id}@systma', ics)
+        self.assertIn('SUMMARY:Visita\\, sede\; norte', ics)
+        self.assertIn('DTSTART:20260302T140000Z', ics)
+
+    def test_ics_con_token_ajeno(self):
+        self.client.force_authenticate(self.tecnico)
+        url = self.client.get('/api/calendario/suscripcion/').data['url']
+        ajena = url.replace(f'/tecnicos/{self.tecnico.id}.ics', f'/tecnicos/{self.admin.id}.ics')
+        self.assertEqual(APIClient().get(ajena).status_code, 403)
+
+    def test_ics_vence_y_se_revoca(self):
+        self.client.force_authenticate(self.tecnico)
+        url = self.client.get('/api/calendario/suscripcion/').data['url']
+        self.assertEqual(APIClient().get(url).status_code, 200)
+
+        dentro_de_91_dias = time.time() + 91 * 24 * 3600
+        with mock.patch('django.core.signing.time.time', return_value=dentro_de_91_dias):
+            self.assertEqual(APIClient().get(url).status_code, 403)
+
+        self.tecnico.set_password('otra-clave')
+        self.tecnico.save()
+        self.assertEqual(APIClient().get(url).status_code, 403)
+
+        url = self.client.get('/api/calendario/suscripcion/').data['url']
+        self.assertEqual(APIClient().get(url).status_code, 200)
+        User.objects.filter(pk=self.tecnico.pk).update(is_active=False)
+        self.assertEqual(APIClient().get(url).status_code, 403)
+
+
+class BusquedaGeograficaTests(OrdenesApiTestCase):
+    # Quito (centro) y puntos a ~1 km, ~4 km y ~40 km
+    CENTRO = (-0.180653, -78.467834)
+
+    def setUp(self):
+        super().setUp()
+        self.cerca = self.crear_orden(titulo='Cerca', latitud='-0.189000', longitud='-78.467834')
+        self.media = self.crear_orden(titulo='Media', latitud='-0.180653', longitud='-78.431900', tecnico=self.tecnico)
+        self.lejos = self.crear_orden(titulo='Lejos', latitud='-0.540000', longitud='-78.467834')
+        self.sin_ubicacion = self.crear_orden(titulo='Sin ubicación')
+        self.client.force_authenticate(self.admin)
+
+    def test_geohash_conocido(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_celda_se_mantiene_al_guardar(self):
+        self.assertEqual(self.cerca.celda_geo, geohash(-0.189, -78.467834))
+        self.assertEqual(self.sin_ubicacion.celda_geo, '')
+        self.cerca.latitud, self.cerca.longitud = None, None
+        self.cerca.save()
+        self.cerca.refresh_from_db()
+        self.assertEqual(self.cerca.celda_geo, '')
+
+    def test_cercanas_ordenadas_por_distancia(self):
+        response = self.client.get('/api/ordenes/cercanas/', {
+            'lat': self.CENTRO[0], 'lon': self.CENTRO[1], 'radio_km': 5,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['titulo'] for f in response.data], ['Cerca', 'Media'])
+        self.assertAlmostEqual(response.data[0]['distancia_km'], 0.93, places=1)
+
+    def test_cercanas_respeta_filtros_del_listado(self):
+        response = self.client.get('/api/ordenes/cercanas/', {
+            'lat': self.CENTRO[0], 'lon': self.CENTRO[1], 'radio_km': 50, 'tecnico': self.tecnico.id,
+        })
+        self.assertEqual([f['titulo'] for f in response.data], ['Media'])
+
+    def test_en_area(self):
+        response = self.client.get('/api/ordenes/en-area/', {
+            'sur': -0.2, 'oeste': -78.5, 'norte': -0.1, 'este': -78.4,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({f['titulo'] for f in response.data}, {'Cerca', 'Media'})
+
+    def test_parametros_invalidos(self):
+        response = self.client.get('/api/ordenes/cercanas/', {'lat': 95, 'lon': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('lat', response.data)
+        response = self.client.get('/api/ordenes/en-area/', {'sur': 1, 'oeste': 0, 'norte': 0, 'este': 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_carga_masiva_asigna_celda(self):
+        creadas = crear_ordenes([{
+            'titulo': 'Importada', 'cliente': 'cliente', 'latitud': '-0.189000', 'longitud': '-78.467834',
+        }])
+        self.assertEqual(OrdenTrabajo.objects.get(pk=creadas[0].pk).celda_geo, self.cerca.celda_geo)
+
+    def test_consulta_usa_indice_de_celdas(self):
+        queryset = filtrar_caja(OrdenTrabajo.objects.all(), -0.2, -78.5, -0.1, -78.4)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('ordentrabajo_celda_geo_idx', queryset.explain())
+
+
+class RutasTests(OrdenesApiTestCase):
+
+    def parada(self, latitud, longitud, abre=0, cierra=600):
+        return {'latitud': latitud, 'longitud': longitud, 'abre': abre, 'cierra': cierra}
+
+    def test_puntos_en_linea_se_visitan_en_orden(self):
+        paradas = [self.parada(0, lon) for lon in (0.05, 0.01, 0.04, 0.02, 0.03)]
+        orden, tardanzas, _, tramos = optimizar_ruta(paradas, origen=(0, 0), minutos_servicio=0)
+        self.assertEqual(orden, [1, 3, 4, 2, 0])
+        self.assertAlmostEqual(sum(tramos), 5.56, places=1)
+        self.assertEqual(sum(tardanzas), 0)
+
+    def test_respeta_ventanas_horarias(self):
+        # La parada lejana cierra temprano: se atiende primero aunque alargue la ruta
+        paradas = [self.parada(0, 0.01), self.parada(0, 0.02), self.parada(0, 0.2, cierra=30)]
+        orden, tardanzas, _, _ = optimizar_ruta(paradas, origen=(0, 0), velocidad_kmh=60, minutos_servicio=10)
+        self.assertEqual(orden[0], 2)
+        self.assertEqual(sum(tardanzas), 0)
+
+    def test_cientos_de_paradas_dentro_del_presupuesto(self):
+        aleatorio = random.Random(7)
+        paradas = [self.parada(aleatorio.uniform(-0.3, 0), aleatorio.uniform(-78.6, -78.4)) for _ in range(300)]
+        inicio = timezone.now()
+        orden, _, _, tramos = optimizar_ruta(paradas, presupuesto_s=1.0, minutos_servicio=0)
+        self.assertLess((timezone.now() - inicio).total_seconds(), 3)
+        self.assertEqual(sorted(orden), list(range(300)))
+        # 2-opt no puede empeorar el recorrido inicial del vecino más cercano
+        base = optimizar_ruta(paradas, presupuesto_s=1e-9, minutos_servicio=0)[3]
+        self.assertLessEqual(sum(tramos), sum(base) + 1e-6)
+
+    def test_endpoint_ruta_del_tecnico(self):
+        dia = timezone.localtime().replace(hour=9, minute=0, second=0, microsecond=0)
+        lejos = self.crear_orden(titulo='Lejos', tecnico=self.tecnico, fecha_inicio=dia, latitud='-0.100000', longitud='-78.400000')
+        cerca = self.crear_orden(titulo='Cerca', tecnico=self.tecnico, fecha_inicio=dia, latitud='-0.180000', longitud='-78.460000')
+        sin_ubicacion = self.crear_orden(tecnico=self.tecnico, fecha_inicio=dia)
+        self.crear_orden(tecnico=self.tecnico, fecha_inicio=dia, estado=self.finalizado, latitud='0', longitud='0')
+
+        self.client.force_authenticate(self.tecnico)
+        response = self.client.get('/api/rutas/', {
+            'fecha': dia.date().isoformat(), 'lat': '-0.180653', 'lon': '-78.467834',
+        })
+        self.assertEqual(response.status_code, 200)
+        ruta, = response.data['rutas']
+        self.assertEqual([p['orden'] for p in ruta['paradas']], [cerca.id, lejos.id])
+        self.assertEqual(ruta['sin_ubicacion'], [sin_ubicacion.id])
+
+        response = self.client.get('/api/rutas/', {'tecnico': self.admin.id})
+        self.assertEqual(response.status_code, 403)
+
+
+class AsignacionAutomaticaTests(OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tecnico2 = User.objects.create_user('tecnico2', password='tecnico123')
+        self.tecnico2.groups.add(self.grupo_tecnico)
+        self.client.force_authenticate(self.admin)
+
+    def test_sugerencia_pondera_carga_y_distancia(self):
+        # 'tecnico' trabaja en el norte con dos órdenes; 'tecnico2' en el sur con una
+        for _ in range(2):
+            self.crear_orden(tecnico=self.tecnico, latitud='-0.100000', longitud='-78.480000')
+        self.crear_orden(tecnico=self.tecnico2, latitud='-0.300000', longitud='-78.540000')
+        self.crear_orden(tecnico=self.tecnico2, estado=self.finalizado, latitud='-0.100000', longitud='-78.480000')
+        orden = self.crear_orden(latitud='-0.290000', longitud='-78.540000')
+
+        response = self.client.get(f'/api/ordenes/{orden.id}/sugerir-tecnico/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['tecnico'] for c in response.data], [self.tecnico2.id, self.tecnico.id])
+        self.assertEqual(response.data[0]['carga'], 1)
+        self.assertAlmostEqual(response.data[0]['distancia_km'], 1.11, places=1)
+
+    def test_evita_choques_de_agenda(self):
+        diez = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.crear_orden(tecnico=self.tecnico, fecha_inicio=diez)
+        self.crear_orden(tecnico=self.tecnico2, fecha_inicio=diez - timedelta(days=2))
+        self.crear_orden(tecnico=self.tecnico2, fecha_inicio=diez - timedelta(days=2))
+        orden = self.crear_orden(fecha_inicio=diez + timedelta(minutes=30))
+
+        propuesta, = proponer_asignaciones(ordenes_para_asignar([orden.id]))
+        self.assertEqual(propuesta['tecnico'], self.tecnico2.id)
+
+    def test_lote_reparte_la_carga(self):
+        OrdenTrabajo.objects.bulk_create(
+            OrdenTrabajo(titulo=f'Orden {i}', cliente=self.cliente, estado=self.pendiente) for i in range(6)
+        )
+        response = self.client.post('/api/ordenes/asignar-automatico/', {'aplicar': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['asignaciones']), 6)
+        self.assertEqual(OrdenTrabajo.objects.filter(tecnico=self.tecnico).count(), 3)
+        self.assertEqual(OrdenTrabajo.objects.filter(tecnico=self.tecnico2).count(), 3)
+
+    def test_lote_grande_con_consultas_fijas(self):
+        inicio = timezone.now()
+        OrdenTrabajo.objects.bulk_create(
+            OrdenTrabajo(
+                titulo=f'Orden {i}', cliente=self.cliente, estado=self.pendiente,
+                latitud=f'{-0.3 + (i % 50) / 200:.6f}', longitud=f'{-78.6 + (i // 50) / 100:.6f}',
+                fecha_inicio=inicio + timedelta(hours=i % 40),
+            )
+            for i in range(1000)
+        )
+        ordenes = ordenes_para_asignar()
+        with self.assertNumQueries(2):
+            propuestas = proponer_asignaciones(ordenes)
+        self.assertEqual(len(propuestas), 1000)
+        self.assertLess((timezone.now() - inicio).total_seconds(), 10)
+
+    def test_lote_explicito_omite_ordenes_cerradas(self):
+        abierta = self.crear_orden()
+        cerrada = self.crear_orden(estado=self.finalizado, tecnico=self.tecnico)
+        response = self.client.post('/api/ordenes/asignar-automatico/', {
+            'ordenes': [abierta.id, cerrada.id, 999999], 'aplicar': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['orden'] for a in response.data['asignaciones']], [abierta.id])
+        self.assertEqual(response.data['omitidas'], [cerrada.id, 999999])
+        cerrada.refresh_from_db()
+        self.assertEqual(cerrada.tecnico, self.tecnico)
+        self.assertFalse(Eliminacion.objects.filter(objeto_id=cerrada.id).exists())
+
+    def test_tecnico_no_puede_asignar(self):
+        self.client.force_authenticate(self.tecnico)
+        response = self.client.post('/api/ordenes/asignar-automatico/', {}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BusquedaTextoTests(OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # El índice (PostgreSQL) se recalcula al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fuga = self.crear_orden(titulo='Fuga de agua en cocina', descripcion='Tubería rota bajo el lavabo')
+            self.techo = self.crear_orden(titulo='Revisión de techo', descripcion='Goteras en la sala <b>urgente</b>')
+            Avance.objects.create(orden=self.techo, contenido='Se detectó una fuga en la bajante del techo')
+            self.crear_orden(titulo='Pintura de fachada')
+        self.client.force_authenticate(self.admin)
+
+    def reindexadas(self, accion):
+        with mock.patch('servicios.signals.actualizar_indice_busqueda') as actualizar:
+            with self.captureOnCommitCallbacks(execute=True):
+                accion()
+        return sorted(i for llamada in actualizar.call_args_list for i in llamada.args[0])
+
+    def test_reindexa_solo_si_cambia_el_texto(self):
+        orden = OrdenTrabajo.objects.get(pk=self.fuga.pk)
+
+        def cambiar_estado():
+            orden.estado = self.progreso
+            orden.save()
+        self.assertEqual(self.reindexadas(cambiar_estado), [])
+
+        def cambiar_titulo():
+            orden.titulo = 'Fuga de gas'
+            orden.save()
+        self.assertEqual(self.reindexadas(cambiar_titulo), [self.fuga.id])
+        self.assertEqual(self.reindexadas(lambda: orden.save(update_fields=['estado'])), [])
+
+        avance = Avance.objects.get(orden=self.techo)
+        self.assertEqual(self.reindexadas(avance.save), [])
+        avance.contenido = 'Bajante reparada'
+        self.assertEqual(self.reindexadas(avance.save), [self.techo.id])
+        self.assertEqual(self.reindexadas(avance.delete), [self.techo.id])
+
+    def test_busca_en_ordenes_y_bitacora_ordenado_por_relevancia(self):
+        response = self.client.get('/api/ordenes/buscar/', {'q': 'fuga'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data], [self.fuga.id, self.techo.id])
+        self.assertEqual(response.data[0]['resaltado']['titulo'], '<mark>Fuga</mark> de agua en cocina')
+        self.assertIn('una <mark>fuga</mark> en la bajante', response.data[1]['resaltado']['avance'])
+        self.assertNotIn('titulo', response.data[1]['resaltado'])
+
+    def test_todos_los_terminos_y_html_escapado(self):
+        response = self.client.get('/api/ordenes/buscar/', {'q': 'goteras urgente'})
+        resultado, = response.data
+        self.assertEqual(resultado['id'], self.techo.id)
+        self.assertIn('&lt;b&gt;<mark>urgente</mark>&lt;/b&gt;', resultado['resaltado']['descripcion'])
+
+    def test_respeta_filtros_y_requiere_texto(self):
+        response = self.client.get('/api/ordenes/buscar/', {'q': 'fuga', 'tecnico': self.tecnico.id})
+        self.assertEqual(response.data, [])
+        response = self.client.get('/api/ordenes/buscar/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_listado_no_expone_el_vector(self):
+        response = self.client.get(f'/api/ordenes/{self.fuga.id}/')
+        self.assertNotIn('busqueda', response.data)
+
+
+class EventosEnVivoTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orden = self.crear_orden(estado=self.pendiente, tecnico=self.tecnico, supervisor=self.supervisor)
+        broker = BrokerLocal()
+        parche = mock.patch('servicios.eventos._broker', broker)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.broker = broker
+
+    def publicados(self):
+        return mock.patch.object(self.broker, 'publicar')
+
+    def test_cambio_de_estado_llega_a_los_participantes(self):
+        self.client.force_authenticate(self.tecnico)
+        with mock.patch.object(self.broker, 'tiene_suscriptores', return_value=True), self.publicados() as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/ordenes/{self.orden.id}/', {'estado': self.progreso.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        canales, evento = publicar.call_args.args
+        self.assertEqual(evento['tipo'], 'orden.actualizada')
+        self.assertEqual(evento['datos']['estado_nombre'], 'En Progreso')
+        self.assertEqual(
+            set(canales),
+            {canal_usuario(self.cliente.id), canal_usuario(self.tecnico.id), canal_usuario(self.supervisor.id), 'staff'},
+        )
+
+    def test_nuevo_avance_con_miniaturas(self):
+        OrdenTrabajo.objects.filter(pk=self.orden.pk).update(estado=self.progreso)
+        self.client.force_authenticate(self.tecnico)
+        fotos = [self.foto_de_prueba(f'foto{i}.jpg', tamano=(800, 600)) for i in range(2)]
+        with mock.patch.object(self.broker, 'tiene_suscriptores', return_value=True), self.publicados() as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/avances/', {
+                    'orden': self.orden.id, 'contenido': 'Cableado listo', 'fotos': fotos,
+                }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        evento = next(c.args[1] for c in publicar.call_args_list if c.args[1]['tipo'] == 'avance.creado')
+        self.assertEqual(evento['datos']['orden'], self.orden.id)
+        self.assertEqual(len(evento['datos']['miniaturas']), 2)
+        self.assertTrue(all(url.endswith('.webp') for url in evento['datos']['miniaturas']))
+
+    def test_sin_conexiones_no_se_publica(self):
+        with self.publicados() as publicar, self.captureOnCommitCallbacks(execute=True):
+            self.crear_orden()
+        publicar.assert_not_called()
+
+    async def test_stream_entrega_solo_los_canales_del_usuario(self):
+        flujo = flujo_sse([canal_usuario(self.tecnico.id)])
+        self.assertEqual(await anext(flujo), 'retry: 5000\n\n')
+        self.broker.publicar([canal_usuario(self.cliente.id)], {'id': 1, 'tipo': 'orden.actualizada', 'datos': {'id': 1}})
+        self.broker.publicar([canal_usuario(self.tecnico.id)], {'id': 2, 'tipo': 'orden.actualizada', 'datos': {'id': 2}})
+        self.assertEqual(await anext(flujo), 'id: 2\nevent: orden.actualizada\ndata: {"id":2}\n\n')
+        await flujo.aclose()
+        self.assertFalse(self.broker.tiene_suscriptores())
+
+    async def test_endpoint_requiere_ticket_y_asgi(self):
+        response = await AsyncClient().get('/api/eventos/')
+        self.assertEqual(response.status_code, 401)
+        # El JWT en la URL ya no abre el stream
+        response = await AsyncClient().get('/api/eventos/', {'token': str(AccessToken.for_user(self.tecnico))})
+        self.assertEqual(response.status_code, 401)
+
+        ticket = await sync_to_async(self.pedir_ticket)(self.tecnico)
+        response = await AsyncClient().get('/api/eventos/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = aiter(response.streaming_content)
+        self.assertEqual(await anext(contenido), b'retry: 5000\n\n')
+        await contenido.aclose()
+        # Un solo uso
+        response = await AsyncClient().get('/api/eventos/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+
+    def pedir_ticket(self, user):
+        token = AccessToken.for_user(user)
+        response = APIClient().post('/api/eventos/ticket/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 201)
+        return response.data['ticket']
+
+    def test_ticket_requiere_jwt_y_vence(self):
+        self.assertEqual(APIClient().post('/api/eventos/ticket/').status_code, 401)
+        ticket = self.pedir_ticket(self.supervisor)
+        datos = cache.get(f'{PREFIJO_TICKET}{ticket}')
+        self.assertEqual(datos['canales'], [canal_usuario(self.supervisor.id)])
+        self.assertGreater(datos['vence'], time.time())
+
+    async def test_stream_se_corta_al_vencer_el_token(self):
+        flujo = flujo_sse([canal_usuario(self.tecnico.id)], vence=time.time() + 0.2)
+        self.assertEqual(await anext(flujo), 'retry: 5000\n\n')
+        self.assertIn('event: expirado', await anext(flujo))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(flujo)
+        self.assertFalse(self.broker.tiene_suscriptores())
+
+    def test_endpoint_bajo_wsgi(self):
+        response = self.client.get('/api/eventos/')
+        self.assertEqual(response.status_code, 503)
+
+
+class SincronizacionTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orden = self.crear_orden(titulo='Mía', estado=self.progreso, tecnico=self.tecnico)
+        self.ajena = self.crear_orden(titulo='Ajena', estado=self.progreso)
+        self.client.force_authenticate(self.tecnico)
+
+    def sincronizar(self, token=None, **params):
+        if token:
+            params['token'] = token
+        response = self.client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_primera_sincronizacion_completa_y_solo_sus_ordenes(self):
+        data = self.sincronizar()
+        self.assertTrue(data['completo'])
+        self.assertEqual([o['id'] for o in data['ordenes']], [self.orden.id])
+        self.assertEqual(len(data['estados']), 3)
+
+    def test_solo_cambios_y_tombstones(self):
+        avance = Avance.objects.create(orden=self.orden, contenido='Primero')
+        token = self.sincronizar()['token']
+        hace_rato = timezone.now() - timedelta(minutes=5)
+        OrdenTrabajo.objects.update(actualizado_en=hace_rato)
+        Avance.objects.update(actualizado_en=hace_rato)
+        Estado.objects.update(actualizado_en=hace_rato)
+        Eliminacion.objects.all().delete()
+
+        data = self.sincronizar(token)
+        self.assertFalse(data['completo'])
+        self.assertEqual((data['ordenes'], data['avances'], data['estados']), ([], [], []))
+
+        self.orden.descripcion = 'Cambio'
+        self.orden.save()
+        avance_id = avance.id
+        avance.delete()
+        data = self.sincronizar(token)
+        self.assertEqual([o['id'] for o in data['ordenes']], [self.orden.id])
+        self.assertEqual(data['eliminados']['avances'], [avance_id])
+
+    def test_reasignacion_deja_tombstone_al_tecnico_anterior(self):
+        token = self.sincronizar()['token']
+        otro = User.objects.create_user('otro_tecnico', password='x')
+        self.orden.tecnico = otro
+        self.orden.save()
+        data = self.sincronizar(token)
+        self.assertEqual(data['eliminados']['ordenes'], [self.orden.id])
+        self.assertEqual(data['ordenes'], [])
+
+    def test_carga_masiva_actualiza_la_marca(self):
+        antes = timezone.now() - timedelta(minutes=5)
+        OrdenTrabajo.objects.update(actualizado_en=antes)
+        self.client.force_authenticate(self.admin)
+        self.client.patch('/api/ordenes/bulk/', [{'id': self.orden.id, 'titulo': 'Nuevo'}], format='json')
+        self.orden.refresh_from_db()
+        self.assertGreater(self.orden.actualizado_en, antes)
+
+    def test_token_invalido(self):
+        response = self.client.get('/api/sync/', {'token': 'basura'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_subida_offline_en_lote_idempotente(self):
+        lote = [
+            {'id_cliente': 'cel-1', 'orden': self.orden.id, 'contenido': 'Sin señal'},
+            {'id_cliente': 'cel-2', 'orden': self.ajena.id, 'contenido': 'No es mía'},
+        ]
+        datos = {'avances': json.dumps(lote), 'fotos_cel-1': [self.foto_de_prueba('a.jpg', (640, 480))]}
+        response = self.client.post('/api/sync/avances/', datos, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        creado, rechazado = response.data['resultados']
+        self.assertEqual(creado['estado'], 'creado')
+        self.assertEqual(rechazado['estado'], 'error')
+        self.assertEqual(FotoAvance.objects.filter(avance_id=creado['id']).count(), 1)
+
+        # Reintento tras perder la respuesta: no se duplica
+        response = self.client.post('/api/sync/avances/', {'avances': json.dumps(lote[:1])}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultados'][0], {'id_cliente': 'cel-1', 'id': creado['id'], 'estado': 'duplicado'})
+        self.assertEqual(Avance.objects.filter(orden=self.orden).count(), 1)
+
+    def test_subida_concurrente_del_mismo_avance(self):
+        lote = [{'id_cliente': 'cel-1', 'orden': self.orden.id, 'contenido': 'Sin señal'}]
+        otro = {}
+
+        def gana_el_otro_request(serializer, archivos):
+            # El reintento paralelo inserta la fila entre la lectura de existentes y el INSERT
+            otro['avance'] = Avance.objects.create(orden=self.orden, contenido='Sin señal', id_cliente='cel-1')
+            return crear_avance_con_fotos(serializer, archivos)
+
+        with mock.patch('servicios.views.crear_avance_con_fotos', side_effect=gana_el_otro_request):
+            response = self.client.post('/api/sync/avances/', {'avances': json.dumps(lote)}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultados'], [{'id_cliente': 'cel-1', 'id': otro['avance'].id, 'estado': 'duplicado'}])
+        self.assertEqual(Avance.objects.filter(orden=self.orden).count(), 1)
+
+
+class RespuestasCondicionalesTests(OrdenesApiTestCase):
+
+    def test_catalogo_responde_304_con_etag_vigente(self):
+        response = self.client.get('/api/estados/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get('/api/estados/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get('/api/estados/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cuerpo_en_cache_sin_queries(self):
+        self.client.get('/api/tecnicos/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tecnicos/')
+        self.assertEqual([t['username'] for t in response.data], ['tecnico'])
+
+    def test_senales_invalidan_el_catalogo(self):
+        etag = self.client.get('/api/estados/')['ETag']
+        Estado.objects.create(nombre='Cancelado', color='#000000', orden=5)
+        response = self.client.get('/api/estados/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+
+        etag = self.client.get('/api/tecnicos/')['ETag']
+        nuevo = User.objects.create_user('tecnico2', password='x')
+        self.client.get('/api/tecnicos/')
+        nuevo.groups.add(self.grupo_tecnico)
+        response = self.client.get('/api/tecnicos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_detalle_de_orden(self):
+        orden = self.crear_orden()
+        url = f'/api/ordenes/{orden.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        orden.titulo = 'Cambiada'
+        orden.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['titulo'], 'Cambiada')
+
+        # El detalle incluye el estado embebido: cambiarlo cambia el ETag
+        etag = response['ETag']
+        self.pendiente.color = '#FFFFFF'
+        self.pendiente.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado_data']['color'], '#FFFFFF')
+
+
+class TransicionesEstadoTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.revision = Estado.objects.create(nombre='En Revisión', color='#ED6C02', orden=3)
+        self.orden = self.crear_orden(tecnico=self.tecnico, supervisor=self.supervisor)
+
+    def transicion(self, user, estado, **datos):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/ordenes/{self.orden.id}/transicion/', {'estado': estado.id, **datos}, format='multipart')
+
+    def test_inicio_cambia_estado_y_registra_avance_con_fotos(self):
+        response = self.transicion(self.tecnico, self.progreso, fotos=[self.foto_de_prueba('a.jpg', (640, 480))])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['orden']['estado_data']['nombre'], 'En Progreso')
+        self.assertEqual(len(response.data['avance']['imagenes']), 1)
+        avance = Avance.objects.get(orden=self.orden)
+        self.assertIn('INICIADO', avance.contenido)
+
+    def test_flujo_completo_hasta_finalizar(self):
+        self.transicion(self.tecnico, self.progreso)
+        self.transicion(self.tecnico, self.revision)
+        response = self.transicion(self.supervisor, self.finalizado)
+        self.assertEqual(response.status_code, 200)
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.estado, self.finalizado)
+        self.assertIsNotNone(self.orden.fecha_fin)
+        self.assertEqual(Avance.objects.filter(orden=self.orden).count(), 3)
+
+    def test_transicion_no_declarada_o_sin_permiso(self):
+        self.assertEqual(self.transicion(self.tecnico, self.finalizado).status_code, 400)
+        self.orden.estado = self.revision
+        self.orden.save()
+        self.assertEqual(self.transicion(self.tecnico, self.finalizado).status_code, 403)
+        self.assertFalse(Avance.objects.exists())
+
+    def test_rechazo_requiere_motivo(self):
+        self.orden.estado = self.revision
+        self.orden.save()
+        self.assertEqual(self.transicion(self.supervisor, self.progreso).status_code, 400)
+        response = self.transicion(self.supervisor, self.progreso, contenido='Falta la foto del medidor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['avance']['contenido'], '❌ RECHAZADO: Falta la foto del medidor')
+
+    def test_falla_al_guardar_no_deja_cambios_a_medias(self):
+        with mock.patch('servicios.fotos.FotoAvance.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.transicion(self.tecnico, self.progreso, fotos=[self.foto_de_prueba('a.jpg', (640, 480))])
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.estado, self.pendiente)
+        self.assertFalse(Avance.objects.exists())
+
+    def test_lista_transiciones_permitidas(self):
+        self.client.force_authenticate(self.tecnico)
+        response = self.client.get(f'/api/ordenes/{self.orden.id}/transicion/')
+        self.assertEqual([t['nombre'] for t in response.data], ['En Progreso'])
+        self.client.force_authenticate(self.supervisor)
+        response = self.client.get(f'/api/ordenes/{self.orden.id}/transicion/')
+        self.assertEqual(response.data, [])
+
+    def test_orden_asignada_solo_su_supervisor(self):
+        self.orden.estado = self.revision
+        self.orden.save()
+        otro = User.objects.create_user('otro_supervisor', password='x')
+        otro.groups.add(self.grupo_supervisor)
+        self.assertEqual(self.transicion(otro, self.finalizado).status_code, 403)
+        self.assertEqual(self.transicion(self.supervisor, self.finalizado).status_code, 200)
+
+    def test_orden_sin_supervisor_la_resuelve_cualquier_supervisor(self):
+        OrdenTrabajo.objects.filter(pk=self.orden.id).update(supervisor=None, estado=self.revision)
+        otro = User.objects.create_user('otro_supervisor', password='x')
+        otro.groups.add(self.grupo_supervisor)
+        self.assertEqual(self.transicion(self.tecnico, self.finalizado).status_code, 403)
+        self.assertEqual(self.transicion(otro, self.finalizado).status_code, 200)
+
+    def test_cancelada_no_figura_como_abierta(self):
+        cancelado = Estado.objects.create(nombre='Cancelado', color='#9E9E9E', orden=5)
+        self.assertEqual(self.transicion(self.supervisor, cancelado, contenido='Cliente desistió').status_code, 200)
+        self.orden.refresh_from_db()
+        self.assertIsNone(self.orden.fecha_fin)
+        abierta = self.crear_orden(titulo='Sigue abierta')
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/ordenes/', {'abiertas': '1'})
+        self.assertEqual([o['id'] for o in response.data], [abierta.id])
+
+
+class ExportacionTests(OrdenesApiTestCase):
+
+    def descargar(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_de_ordenes_con_filtros_del_listado(self):
+        self.crear_orden(titulo='Bomba, "norte"', tecnico=self.tecnico, latitud=-33.45, longitud=-70.66)
+        self.crear_orden(titulo='Otra', estado=self.finalizado)
+        contenido = self.descargar('/api/ordenes/exportar/', {'estado': 'Pendiente'}).decode('utf-8-sig')
+        filas = list(csv.DictReader(StringIO(contenido)))
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0]['titulo'], 'Bomba, "norte"')
+        self.assertEqual((filas[0]['estado'], filas[0]['tecnico'], filas[0]['supervisor']), ('Pendiente', 'tecnico', ''))
+
+    def test_exportacion_no_crece_en_queries(self):
+        def contar():
+            with CaptureQueriesContext(connection) as ctx:
+                self.descargar('/api/ordenes/exportar/', {})
+            return len(ctx.captured_queries)
+
+        self.crear_orden()
+        pocas = contar()
+        for _ in range(20):
+            self.crear_orden(tecnico=self.tecnico, supervisor=self.supervisor)
+        self.assertEqual(contar(), pocas)
+
+    def test_xlsx_valido(self):
+        self.crear_orden(titulo='Con <tags> & control\x01')
+        contenido = self.descargar('/api/ordenes/exportar/', {'formato': 'xlsx'})
+        with zipfile.ZipFile(BytesIO(contenido)) as libro:
+            self.assertIn('xl/workbook.xml', libro.namelist())
+            hoja = libro.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('Con &lt;tags&gt; &amp; control', hoja)
+        self.assertEqual(hoja.count('<row>'), 2)
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/ordenes/exportar/', {'formato': 'pdf'}).status_code, 400)
+
+    def test_csv_con_bom_y_sin_formulas(self):
+        self.crear_orden(titulo='=HYPERLINK("http://x","y")', descripcion='-2+3', direccion='@SUM(A1)', latitud=-33.45)
+        contenido = self.descargar('/api/ordenes/exportar/', {})
+        self.assertTrue(contenido.startswith(b'\xef\xbb\xbfid,'))
+        fila = next(csv.DictReader(StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual(fila['titulo'], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual((fila['descripcion'], fila['direccion']), ("'-2+3", "'@SUM(A1)"))
+        # Los números negativos no son texto y quedan tal cual
+        self.assertEqual(float(fila['latitud']), -33.45)
+
+    def test_csv_exportado_vuelve_igual_en_la_carga_masiva(self):
+        orden = self.crear_orden(titulo='+Urgente', descripcion='-2 cables sueltos', direccion='=Av. 9 de Octubre')
+        contenido = self.descargar('/api/ordenes/exportar/', {})
+        archivo = SimpleUploadedFile('ordenes.csv', contenido, content_type='text/csv')
+        response = self.client.patch('/api/ordenes/bulk/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        orden.refresh_from_db()
+        self.assertEqual(
+            (orden.titulo, orden.descripcion, orden.direccion), ('+Urgente', '-2 cables sueltos', '=Av. 9 de Octubre'),
+        )
+
+    async def test_streaming_async_bajo_asgi(self):
+        await sync_to_async(self.crear_orden)(titulo='Bajo ASGI')
+        token = AccessToken.for_user(self.admin)
+        with warnings.catch_warnings():
+            # Django avisa (y junta todo en memoria) si recibe un iterador sync
+            warnings.simplefilter('error')
+            response = await AsyncClient().get('/api/ordenes/exportar/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            contenido = b''.join([parte async for parte in response.streaming_content])
+        self.assertIn('Bajo ASGI', contenido.decode('utf-8-sig'))
+
+    def test_avances_filtrados_por_su_orden(self):
+        propia = self.crear_orden(tecnico=self.tecnico)
+        ajena = self.crear_orden()
+        Avance.objects.create(orden=propia, contenido='Revisé el tablero')
+        Avance.objects.create(orden=ajena, contenido='Otro')
+        contenido = self.descargar('/api/avances/exportar/', {'tecnico': self.tecnico.id}).decode('utf-8-sig')
+        filas = list(csv.DictReader(StringIO(contenido)))
+        self.assertEqual([f['contenido'] for f in filas], ['Revisé el tablero'])
+        self.assertEqual(filas[0]['orden'], str(propia.id))
+
+
+class DatosSinteticosBenchmarkTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def test_generar_datos_a_escala(self):
+        call_command('generar_datos', escala=0.005, semilla=7, stdout=StringIO())
+        self.assertEqual(OrdenTrabajo.objects.filter(cliente__username__startswith='sint_').count(), 50)
+        self.assertTrue(Avance.objects.exists())
+        self.assertTrue(User.objects.filter(username__startswith='sint_tecnico', groups__name='Tecnico').exists())
+        # Las fechas son históricas, no la hora de la carga
+        self.assertLess(OrdenTrabajo.objects.order_by('creado_en').first().creado_en, timezone.now() - timedelta(hours=1))
+        with self.assertRaises(CommandError):
+            call_command('generar_datos', escala=0.005, stdout=StringIO())
+
+    def test_benchmark_guarda_y_compara_linea_base(self):
+        call_command('generar_datos', escala=0.002, stdout=StringIO())
+        salida = f'{self.media}/base.json'
+        escenarios = 'login,ordenes_lista,ordenes_detalle,avances_orden,dashboard_stats,dashboard_stats_sin_cache'
+        call_command('benchmark', repeticiones=2, calentamiento=0, salida=salida, escenarios=escenarios, stdout=StringIO())
+        with open(salida, encoding='utf-8') as archivo:
+            resultado = json.load(archivo)
+        self.assertEqual(set(resultado['escenarios']), set(escenarios.split(',')))
+        for medicion in resultado['escenarios'].values():
+            self.assertEqual(medicion['errores'], 0)
+            self.assertGreaterEqual(medicion['p95_ms'], medicion['p50_ms'])
+
+        call_command('benchmark', repeticiones=2, calentamiento=0, salida=f'{self.media}/nueva.json',
+                     escenarios=escenarios, comparar=salida, umbral=100000, stdout=StringIO())
+        # El superusuario del benchmark no queda en la base
+        self.assertFalse(User.objects.filter(username='bench_admin').exists())
+        escenarios = resultado['escenarios']
+        self.assertGreater(escenarios['dashboard_stats_sin_cache']['queries'], escenarios['dashboard_stats']['queries'])
+
+    def test_benchmark_de_pdf_sin_cache_ni_archivos(self):
+        call_command('generar_datos', escala=0.002, stdout=StringIO())
+        with mock.patch('servicios.reportes.renderizar_reporte', return_value=b'%PDF-1.4') as renderizar:
+            for _ in range(2):
+                call_command('benchmark', repeticiones=1, calentamiento=0, salida=f'{self.media}/pdf.json',
+                             escenarios='reporte_pdf', stdout=StringIO())
+        # 3 requests medidos + 3 de queries por corrida, todos generan el PDF
+        self.assertEqual(renderizar.call_count, 12)
+        self.assertFalse(any(archivos for _, _, archivos in os.walk(f'{self.media}/reportes')))
+
+    def test_benchmark_solo_sobre_datos_sinteticos(self):
+        self.crear_orden()
+        with self.assertRaises(CommandError):
+            call_command('benchmark', repeticiones=1, calentamiento=0, salida=f'{self.media}/b.json',
+                         escenarios='ordenes_lista', stdout=StringIO())
+        User.objects.create_user('bench_admin', password='propia')
+        with self.assertRaises(CommandError):
+            # Nunca pisa la contraseña de un bench_admin existente
+            call_command('benchmark', repeticiones=1, calentamiento=0, salida=f'{self.media}/b.json',
+                         escenarios='ordenes_lista', permitir_produccion=True, stdout=StringIO())
+        call_command('benchmark', repeticiones=1, calentamiento=0, salida=f'{self.media}/b.json',
+                     escenarios='ordenes_lista', permitir_produccion=True, contrasena='propia', stdout=StringIO())
+        self.assertTrue(User.objects.get(username='bench_admin').check_password('propia'))
+
+
+@override_settings(RENDIMIENTO_ACTIVO=True, RENDIMIENTO_UMBRAL_MS=10000)
+class RendimientoMiddlewareTests(OrdenesApiTestCase):
+
+    def tramos(self, response):
+        tramos = {}
+        for parte in response['Server-Timing'].split(', '):
+            nombre, *atributos = parte.split(';')
+            tramos[nombre] = dict(a.split('=', 1) for a in atributos)
+        return tramos
+
+    def test_server_timing_con_queries_vista_y_render(self):
+        orden = self.crear_orden()
+        self.client.force_authenticate(None)
+        token = self.login('admin', 'admin123')['access']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/ordenes/{orden.id}/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        tramos = self.tramos(response)
+        self.assertEqual(tramos['db']['desc'], f'"{len(ctx.captured_queries)} queries"')
+        self.assertIn('auth', tramos)
+        self.assertIn('render', tramos)
+        self.assertGreaterEqual(float(tramos['total']['dur']), float(tramos['view']['dur']))
+
+    def test_desactivado_por_defecto(self):
+        with override_settings(RENDIMIENTO_ACTIVO=False):
+            response = APIClient().get('/api/estados/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(RENDIMIENTO_UMBRAL_QUERIES=0)
+    def test_request_lento_se_registra_como_warning(self):
+        with self.assertLogs('servicios.rendimiento', 'WARNING') as logs:
+            self.client.get('/api/ordenes/')
+        datos = logs.records[0].rendimiento
+        self.assertTrue(datos['lento'])
+        self.assertEqual(datos['vista'], 'ordentrabajo-list')
+
+    def test_perfil_de_endpoint_lento(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        with override_settings(RENDIMIENTO_UMBRAL_MS=0, RENDIMIENTO_PERFIL_RUTAS=['/api/ordenes/'],
+                               RENDIMIENTO_PERFIL_MUESTRA=1.0, RENDIMIENTO_PERFIL_DIR=directorio):
+            with self.assertLogs('servicios.rendimiento', 'WARNING') as logs:
+                self.client.get('/api/ordenes/')
+        perfil = logs.records[0].rendimiento.get('perfil')
+        # Si otro perfilador ya estaba activo (p. ej. coverage) no se guarda
+        if perfil:
+            self.assertTrue(os.path.exists(perfil))
+
+
+class LecturasAsyncTests(MediaTemporalMixin, OrdenesApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orden = self.crear_orden(estado=self.pendiente, tecnico=self.tecnico, supervisor=self.supervisor)
+        self.crear_orden(titulo='Otra', estado=self.progreso)
+        avance = Avance.objects.create(orden=self.orden, contenido='Revisión inicial')
+        FotoAvance.objects.create(avance=avance, foto=self.foto_de_prueba())
+        Avance.objects.create(orden=self.orden, contenido='Cableado listo')
+        self.factory = AsyncRequestFactory()
+
+    def peticion(self, metodo, url, datos=None, user=None, **extra):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        return getattr(self.factory, metodo)(url, datos, headers=headers, **extra)
+
+    async def test_listado_de_ordenes_igual_al_sync(self):
+        params = {'estado': 'Pendiente'}
+        response = await ordenes_lista(self.peticion('get', '/api/ordenes/', params))
+        self.assertEqual(response.status_code, 200)
+        esperado = await sync_to_async(lambda: self.client.get('/api/ordenes/', params).json())()
+        self.assertEqual(json.loads(response.content), esperado)
+        self.assertEqual([o['id'] for o in esperado], [self.orden.id])
+
+    async def test_avances_de_una_orden_con_fotos(self):
+        params = {'orden': self.orden.id}
+        response = await avances_lista(self.peticion('get', '/api/avances/', params))
+        self.assertEqual(response.status_code, 200)
+        datos = json.loads(response.content)
+        esperado = await sync_to_async(lambda: self.client.get('/api/avances/', params).json())()
+        self.assertEqual(datos, esperado)
+        self.assertEqual(sum(len(a['imagenes']) for a in datos), 1)
+
+    async def test_dashboard_requiere_token(self):
+        response = await dashboard_stats(self.peticion('get', '/api/dashboard-stats/'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+        response = await dashboard_stats(self.peticion('get', '/api/dashboard-stats/', user=self.supervisor))
+        self.assertEqual(response.status_code, 200)
+        esperado = await sync_to_async(lambda: self.client.get('/api/dashboard-stats/').json())()
+        self.assertEqual(json.loads(response.content), esperado)
+
+    async def test_token_invalido_y_filtro_invalido(self):
+        request = self.factory.get('/api/ordenes/', headers={'Authorization': 'Bearer basura'})
+        self.assertEqual((await ordenes_lista(request)).status_code, 401)
+        response = await ordenes_lista(self.peticion('get', '/api/ordenes/', {'desde': 'ayer'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('desde', json.loads(response.content))
+
+    async def test_post_y_paginado_se_delegan_a_la_vista_sync(self):
+        response = await ordenes_lista(self.peticion('get', '/api/ordenes/', {'page_size': 1}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        request = self.peticion('post', '/api/ordenes/', {'titulo': 'Nueva', 'cliente': self.cliente.id},
+                                user=self.supervisor, content_type='application/json')
+        response = await ordenes_lista(request)
+        self.assertEqual(response.status_code, 201, response.data)
+        orden = await OrdenTrabajo.objects.aget(pk=response.data['id'])
+        self.assertEqual(orden.supervisor_id, self.supervisor.id)
 
-# Create your tests here.
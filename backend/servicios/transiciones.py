@@ -0,0 +1,127 @@
+import threading
+
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .fotos import crear_avance_con_fotos
+from .models import Estado, OrdenTrabajo
+from .respuestas import version_catalogo
+from .roles import es_supervisor, es_tecnico
+
+# --- FLUJO DE ESTADOS DE LA ORDEN ---
+# Máquina de estados declarada por nombre. Los ids se resuelven con un registro
+# en memoria del proceso que se recarga solo cuando cambia la versión del
+# catálogo de estados (la misma que usa el GET condicional de /api/estados/).
+
+TECNICO = 'tecnico'
+SUPERVISOR = 'supervisor'
+
+
+class Transicion:
+    def __init__(self, origen, destino, quien, mensaje, requiere_motivo=False, cierra=False):
+        self.origen = origen
+        self.destino = destino
+        self.quien = quien
+        # Texto del avance que deja la transición en la bitácora
+        self.mensaje = mensaje
+        self.requiere_motivo = requiere_motivo
+        self.cierra = cierra
+
+
+TRANSICIONES = (
+    Transicion('Pendiente', 'En Progreso', TECNICO, '▶ TRABAJO INICIADO POR EL TÉCNICO'),
+    Transicion('En Progreso', 'En Revisión', TECNICO, '✋ REVISIÓN SOLICITADA POR EL TÉCNICO'),
+    Transicion('En Revisión', 'Finalizado', SUPERVISOR, '✅ TRABAJO APROBADO Y FINALIZADO POR SUPERVISIÓN', cierra=True),
+    Transicion('En Revisión', 'En Progreso', SUPERVISOR, '❌ RECHAZADO', requiere_motivo=True),
+    Transicion('Pendiente', 'Cancelado', SUPERVISOR, '🚫 ORDEN CANCELADA', requiere_motivo=True),
+    Transicion('En Progreso', 'Cancelado', SUPERVISOR, '🚫 ORDEN CANCELADA', requiere_motivo=True),
+    Transicion('En Revisión', 'Cancelado', SUPERVISOR, '🚫 ORDEN CANCELADA', requiere_motivo=True),
+)
+_POR_NOMBRES = {(t.origen, t.destino): t for t in TRANSICIONES}
+
+
+class RegistroEstados:
+    """Ids y nombres de los estados, en memoria y al día con la versión del catálogo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._nombres = {}
+        self._ids = {}
+
+    def _vigente(self):
+        version, _ = version_catalogo('estados')
+        if version != self._version:
+            with self._lock:
+                filas = list(Estado.objects.values_list('id', 'nombre'))
+                self._nombres = dict(filas)
+                self._ids = {nombre: estado_id for estado_id, nombre in filas}
+                self._version = version
+        return self
+
+    def nombre(self, estado_id):
+        return self._vigente()._nombres.get(estado_id)
+
+    def id(self, nombre):
+        return self._vigente()._ids.get(nombre)
+
+
+registro_estados = RegistroEstados()
+
+
+def transiciones_permitidas(orden, user):
+    """[(estado_id, Transicion)] que el usuario puede aplicar a la orden ahora."""
+    origen = registro_estados.nombre(orden.estado_id)
+    permitidas = []
+    for transicion in TRANSICIONES:
+        destino_id = registro_estados.id(transicion.destino)
+        if transicion.origen == origen and destino_id is not None and _puede(transicion, orden, user):
+            permitidas.append((destino_id, transicion))
+    return permitidas
+
+
+def buscar_transicion(orden, destino_id):
+    transicion = _POR_NOMBRES.get((registro_estados.nombre(orden.estado_id), registro_estados.nombre(destino_id)))
+    if transicion is None:
+        raise ValidationError({'estado': "La orden no puede pasar a ese estado desde el estado actual."})
+    return transicion
+
+
+def _puede(transicion, orden, user):
+    if user.is_superuser:
+        return True
+    if transicion.quien == TECNICO:
+        return es_tecnico(user) and orden.tecnico_id == user.id
+    # La misma regla que la edición de la orden (perform_update): el supervisor
+    # asignado, o cualquier supervisor si la orden todavía no tiene uno
+    return es_supervisor(user) and orden.supervisor_id in (None, user.id)
+
+
+def verificar_permiso(transicion, orden, user):
+    if not _puede(transicion, orden, user):
+        raise PermissionDenied("No tienes permiso para realizar este cambio de estado.")
+
+
+def contenido_avance(transicion, motivo):
+    return f'{transicion.mensaje}: {motivo}' if motivo else transicion.mensaje
+
+
+def aplicar_transicion(orden_id, destino_id, user, serializer_avance, fotos):
+    """
+    Cambia el estado y guarda el avance (serializer ya validado) con sus fotos en
+    una sola transacción. La orden se bloquea con select_for_update y la
+    transición se vuelve a validar adentro: de dos cambios simultáneos solo uno
+    se aplica. Devuelve el avance.
+    """
+    def cambiar_estado():
+        orden = OrdenTrabajo.objects.select_for_update().get(pk=orden_id)
+        transicion = buscar_transicion(orden, destino_id)
+        verificar_permiso(transicion, orden, user)
+        orden.estado_id = destino_id
+        campos = ['estado', 'actualizado_en']
+        if transicion.cierra:
+            orden.fecha_fin = timezone.now()
+            campos.append('fecha_fin')
+        orden.save(update_fields=campos)
+
+    return crear_avance_con_fotos(serializer_avance, fotos, antes_de_guardar=cambiar_estado)
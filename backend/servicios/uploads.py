@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+# --- LÍMITE DE TAMAÑO PARA FOTOS SUBIDAS ---
+# Va antes de TemporaryFileUploadHandler en FILE_UPLOAD_HANDLERS: revisa cada
+# bloque mientras se recibe y descarta el archivo en cuanto supera el límite,
+# sin esperar a tenerlo completo en disco. Solo aplica a los campos de fotos
+# (foto, fotos, fotos_<id_cliente>, foto_referencia); el CSV de la carga
+# masiva ('archivo') no tiene este límite.
+
+
+def es_campo_de_foto(nombre):
+    return bool(nombre) and nombre.startswith('foto')
+
+
+def limite_legible():
+    """FOTO_MAX_BYTES para mensajes de error ('15.0 MB', '512.0 KB')."""
+    limite = getattr(settings, 'FOTO_MAX_BYTES', 15 * 1024 * 1024)
+    if limite >= 1024 * 1024:
+        return f'{limite / (1024 * 1024):.1f} MB'
+    return f'{limite / 1024:.1f} KB'
+
+
+class LimiteTamanoUploadHandler(FileUploadHandler):
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limite = getattr(settings, 'FOTO_MAX_BYTES', 15 * 1024 * 1024)
+        self.recibidos = 0
+        if request is not None and not hasattr(request, 'archivos_rechazados'):
+            request.archivos_rechazados = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.recibidos = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if not es_campo_de_foto(self.field_name):
+            return raw_data
+        self.recibidos += len(raw_data)
+        if self.recibidos > self.limite:
+            if self.request is not None:
+                self.request.archivos_rechazados.append(self.file_name)
+            raise SkipFile()
+        # Se pasa el bloque al siguiente handler (el que escribe en disco)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
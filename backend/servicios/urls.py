@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     EstadoViewSet, OrdenTrabajoViewSet, ClienteViewSet, 
     SupervisorViewSet, TecnicoViewSet, AvanceViewSet, 
-    RegistroUsuarioViewSet, generar_reporte_pdf, DashboardStatsView
+    RegistroUsuarioViewSet, generar_reporte_pdf, DashboardStatsView,
+    ReportePDFViewSet, CalendarioView, CalendarioSuscripcionView, calendario_ics,
+    RutasView, EventosTicketView, eventos_sse, SincronizacionView, SincronizacionAvancesView
 )
+from .vistas_async import avances_lista, dashboard_stats, ordenes_lista
 
 router = DefaultRouter()
 router.register(r'estados', EstadoViewSet)
@@ -14,9 +18,27 @@ router.register(r'supervisores', SupervisorViewSet, basename='supervisor')
 router.register(r'tecnicos', TecnicoViewSet, basename='tecnico')
 router.register(r'avances', AvanceViewSet)
 router.register(r'crear-usuario', RegistroUsuarioViewSet, basename='crear-usuario')
+router.register(r'reportes', ReportePDFViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('ordenes/<int:pk>/pdf/', generar_reporte_pdf, name='generar_pdf'),
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
-]
\ No newline at end of file
+    path('calendario/', CalendarioView.as_view(), name='calendario'),
+    path('calendario/suscripcion/', CalendarioSuscripcionView.as_view(), name='calendario-suscripcion'),
+    path('calendario/tecnicos/<int:tecnico_id>.ics', calendario_ics, name='calendario-ics'),
+    path('rutas/', RutasView.as_view(), name='rutas'),
+    path('eventos/', eventos_sse, name='eventos'),
+    path('eventos/ticket/', EventosTicketView.as_view(), name='eventos-ticket'),
+    path('sync/', SincronizacionView.as_view(), name='sync'),
+    path('sync/avances/', SincronizacionAvancesView.as_view(), name='sync-avances'),
+]
+
+# --- LECTURAS ASÍNCRONAS (LECTURAS_ASYNC=1 con uvicorn) ---
+# Van antes que el router para atender GET /ordenes/, /avances/ y /dashboard-stats/
+if settings.LECTURAS_ASYNC:
+    urlpatterns = [
+        path('ordenes/', ordenes_lista, name='ordenes-async'),
+        path('avances/', avances_lista, name='avances-async'),
+        path('dashboard-stats/', dashboard_stats, name='dashboard-stats-async'),
+    ] + urlpatterns
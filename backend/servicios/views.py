@@ -1,41 +1,73 @@
-import os
+import json
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse
-from django.template.loader import get_template
+from django.db import IntegrityError
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import viewsets
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status, viewsets
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import api_view
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
-from xhtml2pdf import pisa
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 # Importación de modelos y serializadores
-from .models import Estado, OrdenTrabajo, Avance, FotoAvance
+from .models import Estado, OrdenTrabajo, Avance, ReportePDF
 from .serializers import (
     EstadoSerializer, OrdenTrabajoSerializer, ClienteSerializer, 
-    AvanceSerializer, RegistroUsuarioSerializer
+    AvanceSerializer, RegistroUsuarioSerializer, ReportePDFSerializer
+)
+from .filters import filtrar_avances, filtrar_ordenes, parse_entero, parse_fecha, parse_numero
+from .calendario import eventos_en_ventana, generar_ics, ordenes_para_ics, tecnico_de_token, token_suscripcion
+from .estadisticas import calcular_estadisticas, obtener_estadisticas
+from .exportacion import COLUMNAS_AVANCES, COLUMNAS_ORDENES, respuesta_exportacion
+from .eventos import consumir_ticket, crear_ticket, flujo_sse
+from .fotos import crear_avance_con_fotos
+from .geo import CAMPOS_MAPA, filtrar_caja, ordenes_cercanas
+from .asignacion import aplicar_asignaciones, ordenes_para_asignar, proponer_asignaciones, sugerir_tecnicos
+from .authentication import usuario_modelo
+from .busqueda import buscar_ordenes
+from .roles import es_supervisor, es_tecnico, rol_principal, roles_de
+from .sincronizacion import cambios_desde, leer_desde, ordenes_visibles, token_sync
+from .importacion import CSVParser, LoteInvalido, actualizar_ordenes, crear_ordenes, leer_filas
+from .rutas import ErrorRuta, rutas_del_dia
+from .reportes import ErrorReporte, encolar_reporte, pdf_en_cache, revision_reporte
+from .respuestas import CatalogoCacheMixin, respuesta_orden
+from .transiciones import (
+    aplicar_transicion, buscar_transicion, contenido_avance, registro_estados, transiciones_permitidas, verificar_permiso,
 )
+from .pagination import OrdenCursorPagination
+from .uploads import limite_legible
 
 # ... (El código de MyTokenObtainPairSerializer y MyTokenObtainPairView se mantiene igual) ...
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Los roles y datos básicos viajan en el token para no consultarlos en cada request
+        token['username'] = user.username
+        token['is_superuser'] = user.is_superuser
+        token['is_staff'] = user.is_staff
+        token['roles'] = sorted(roles_de(user))
+        token['rol'] = rol_principal(user)
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['username'] = self.user.username
         data['email'] = self.user.email
         data['user_id'] = self.user.id
         data['nombre_completo'] = self.user.first_name if self.user.first_name else self.user.username
-
-        if self.user.is_superuser:
-            data['rol'] = 'Administrador'
-        else:
-            groups = self.user.groups.values_list('name', flat=True)
-            data['rol'] = list(groups)[0] if groups else 'Usuario'
+        data['rol'] = rol_principal(self.user)
         return data
 
 class MyTokenObtainPairView(TokenObtainPairView):
@@ -43,103 +75,276 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
 # --- VISTAS DE LA API ---
 
-class EstadoViewSet(viewsets.ModelViewSet):
+class EstadoViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
+    catalogo = 'estados'
     queryset = Estado.objects.all()
     serializer_class = EstadoSerializer
 
 class OrdenTrabajoViewSet(viewsets.ModelViewSet):
-    queryset = OrdenTrabajo.objects.all()
+    # Las FK que lee el serializer (estado_data y *_nombre) se traen en el mismo JOIN
+    queryset = OrdenTrabajo.objects.select_related(
+        'estado', 'cliente', 'tecnico', 'supervisor'
+    ).order_by('-creado_en', '-id')
     serializer_class = OrdenTrabajoSerializer
+    pagination_class = OrdenCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Los filtros solo aplican al listado; el detalle se busca por pk
+        if self.action == 'list':
+            queryset = filtrar_ordenes(queryset, self.request.query_params)
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        # GET condicional: con la copia vigente responde 304 sin serializar
+        orden = self.get_object()
+        return respuesta_orden(request, orden, lambda: self.get_serializer(orden).data)
 
     def perform_create(self, serializer):
         user = self.request.user
+        verificar_subida(self.request, 'foto_referencia')
         
         # 1. Restricción: Los técnicos NO pueden crear órdenes
-        if user.groups.filter(name='Tecnico').exists():
+        if es_tecnico(user):
             raise PermissionDenied("Los técnicos no tienen permiso para generar nuevas órdenes de trabajo.")
 
         # 2. Asignación automática si es Supervisor
-        if user.groups.filter(name='Supervisor').exists():
-            serializer.save(supervisor=user)
+        if es_supervisor(user):
+            serializer.save(supervisor=usuario_modelo(user))
         else:
             serializer.save()
 
     def perform_update(self, serializer):
         user = self.request.user
         orden = serializer.instance # La orden que se intenta modificar
+        verificar_subida(self.request, 'foto_referencia')
 
         # 1. Validación para TÉCNICOS (Ya la tenías)
-        if user.groups.filter(name='Tecnico').exists():
-            if orden.tecnico and orden.tecnico != user:
+        if es_tecnico(user):
+            if orden.tecnico_id and orden.tecnico_id != user.id:
                 raise PermissionDenied("Solo el técnico asignado puede realizar cambios o gestionar esta orden.")
         
         # 2. NUEVA Validación para SUPERVISORES (Aquí está la solución)
-        if user.groups.filter(name='Supervisor').exists():
+        if es_supervisor(user):
             # Si la orden tiene supervisor asignado y NO es el usuario actual... error.
             # (El "orden.supervisor" asume que así se llama el campo en tu modelo, basado en tu perform_create)
-            if orden.supervisor and orden.supervisor != user:
+            if orden.supervisor_id and orden.supervisor_id != user.id:
                 raise PermissionDenied("No tienes permiso para modificar una orden que no te ha sido asignada.")
         
         serializer.save()
     # --------------------------------------------
 
-class ClienteViewSet(viewsets.ModelViewSet):
+    # --- CARGA MASIVA: POST crea, PATCH actualiza (JSON o CSV) ---
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk',
+            parser_classes=[JSONParser, CSVParser, MultiPartParser])
+    def bulk(self, request):
+        user = request.user
+        tecnico = es_tecnico(user)
+        supervisor = es_supervisor(user)
+        filas = leer_filas(request)
+
+        if request.method == 'POST' and tecnico:
+            raise PermissionDenied("Los técnicos no tienen permiso para generar nuevas órdenes de trabajo.")
+
+        def puede_modificar(orden):
+            if tecnico and orden.tecnico_id and orden.tecnico_id != user.id:
+                return "Solo el técnico asignado puede realizar cambios o gestionar esta orden."
+            if supervisor and orden.supervisor_id and orden.supervisor_id != user.id:
+                return "No tienes permiso para modificar una orden que no te ha sido asignada."
+            return None
+
+        try:
+            if request.method == 'POST':
+                creadas = crear_ordenes(filas, supervisor=user if supervisor else None)
+                return Response({'creadas': len(creadas), 'ids': [o.id for o in creadas]}, status=status.HTTP_201_CREATED)
+            actualizadas = actualizar_ordenes(filas, puede_modificar)
+            return Response({'actualizadas': len(actualizadas), 'ids': [o.id for o in actualizadas]})
+        except LoteInvalido as exc:
+            return Response({'errores': exc.errores}, status=status.HTTP_400_BAD_REQUEST)
+
+    # --- CAMBIO DE ESTADO + AVANCE EN UN SOLO REQUEST ---
+    # GET: estados a los que el usuario puede llevar la orden.
+    # POST (multipart): 'estado' destino, 'contenido' (motivo o comentario) y 'fotos'.
+    @action(detail=True, methods=['get', 'post'], url_path='transicion',
+            parser_classes=[MultiPartParser, JSONParser])
+    def transicion(self, request, pk=None):
+        orden = self.get_object()
+        if request.method == 'GET':
+            return Response([
+                {'estado': estado_id, 'nombre': t.destino, 'requiere_motivo': t.requiere_motivo}
+                for estado_id, t in transiciones_permitidas(orden, request.user)
+            ])
+
+        destino_id = parse_entero(request.data, 'estado', None, 1, 2**31 - 1)
+        if destino_id is None:
+            raise ValidationError({'estado': "Indica el estado destino."})
+        transicion = buscar_transicion(orden, destino_id)
+        verificar_permiso(transicion, orden, request.user)
+        motivo = (request.data.get('contenido') or '').strip()
+        if transicion.requiere_motivo and not motivo:
+            raise ValidationError({'contenido': "Indica el motivo."})
+        fotos = fotos_de_la_subida(request)
+
+        contexto = self.get_serializer_context()
+        serializer = AvanceSerializer(data={'orden': orden.id, 'contenido': contenido_avance(transicion, motivo)}, context=contexto)
+        serializer.is_valid(raise_exception=True)
+        avance = aplicar_transicion(orden.id, destino_id, request.user, serializer, fotos)
+
+        orden = self.get_queryset().get(pk=orden.id)
+        return Response({
+            'orden': self.get_serializer(orden).data,
+            'avance': AvanceSerializer(avance, context=contexto).data,
+        })
+
+    # --- EXPORTACIÓN EN STREAMING (?formato=csv|xlsx; mismos filtros del listado) ---
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), request.query_params)
+        return respuesta_exportacion(request, queryset, COLUMNAS_ORDENES, 'ordenes')
+
+    # --- BÚSQUEDA DE TEXTO COMPLETO (?q=; acepta los demás filtros del listado) ---
+    @action(detail=False, methods=['get'])
+    def buscar(self, request):
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            raise ValidationError({'q': "Este parámetro es obligatorio."})
+        limite = parse_entero(request.query_params, 'limite', 50, 1, 200)
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), request.query_params)
+        return Response(buscar_ordenes(queryset, texto, limite=limite))
+
+    # --- ASIGNACIÓN AUTOMÁTICA (carga abierta, distancia y choques de agenda) ---
+    @action(detail=True, methods=['get'], url_path='sugerir-tecnico')
+    def sugerir_tecnico(self, request, pk=None):
+        limite = parse_entero(request.query_params, 'limite', 5, 1, 50)
+        return Response(sugerir_tecnicos(self.get_object(), limite=limite))
+
+    @action(detail=False, methods=['post'], url_path='asignar-automatico')
+    def asignar_automatico(self, request):
+        user = request.user
+        if es_tecnico(user):
+            raise PermissionDenied("Los técnicos no pueden asignar órdenes.")
+
+        # {"ordenes": [ids]} o, sin lista, todas las órdenes abiertas sin técnico
+        ids = request.data.get('ordenes')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            raise ValidationError({'ordenes': "Debe ser una lista de identificadores."})
+        ordenes = ordenes_para_asignar(ids, supervisor_id=user.id if es_supervisor(user) else None)
+
+        propuestas = proponer_asignaciones(ordenes)
+        aplicar = request.data.get('aplicar') in (True, 'true', '1')
+        if aplicar:
+            aplicar_asignaciones(ordenes, propuestas)
+        # Ids pedidos que no se asignan: cerrados, inexistentes o de otro supervisor
+        omitidas = sorted(set(ids) - {o.id for o in ordenes}) if ids is not None else []
+        return Response({'aplicadas': aplicar, 'asignaciones': propuestas, 'omitidas': omitidas})
+
+    # --- BÚSQUEDA GEOGRÁFICA (respeta los filtros del listado) ---
+    @action(detail=False, methods=['get'], url_path='en-area')
+    def en_area(self, request):
+        params = request.query_params
+        sur = parse_numero(params, 'sur', -90, 90)
+        norte = parse_numero(params, 'norte', -90, 90)
+        oeste = parse_numero(params, 'oeste', -180, 180)
+        este = parse_numero(params, 'este', -180, 180)
+        if sur > norte:
+            raise ValidationError({'detail': "'sur' no puede ser mayor que 'norte'."})
+        limite = parse_entero(params, 'limite', 500, 1, 5000)
+
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), params)
+        filas = filtrar_caja(queryset, sur, oeste, norte, este).order_by('id').values(*CAMPOS_MAPA)[:limite]
+        return Response(list(filas))
+
+    @action(detail=False, methods=['get'])
+    def cercanas(self, request):
+        params = request.query_params
+        latitud = parse_numero(params, 'lat', -90, 90)
+        longitud = parse_numero(params, 'lon', -180, 180)
+        radio = parse_numero(params, 'radio_km', 0.01, 500, defecto=5)
+        limite = parse_entero(params, 'limite', 100, 1, 1000)
+
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), params)
+        return Response(ordenes_cercanas(queryset, latitud, longitud, radio, limite, CAMPOS_MAPA))
+
+class ClienteViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     # ... (Se mantiene igual)
+    catalogo = 'usuarios'
     queryset = User.objects.filter(is_superuser=False).exclude(groups__name__in=['Supervisor', 'Tecnico'])
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
 
-class SupervisorViewSet(viewsets.ModelViewSet):
+class SupervisorViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     # ... (Se mantiene igual)
+    catalogo = 'usuarios'
     queryset = User.objects.filter(groups__name='Supervisor')
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
 
-class TecnicoViewSet(viewsets.ModelViewSet):
+class TecnicoViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     # ... (Se mantiene igual)
+    catalogo = 'usuarios'
     queryset = User.objects.filter(groups__name='Tecnico')
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
 
+def verificar_puede_agregar_avance(orden, user):
+    estado = registro_estados.nombre(orden.estado_id)
+
+    # --- 1. BLOQUEO GLOBAL (ABSOLUTO) ---
+    # Si está Finalizado, NADIE puede escribir. Ni el Admin.
+    if estado == 'Finalizado':
+        raise PermissionDenied("⛔ La orden está FINALIZADA y cerrada. No se pueden agregar más registros.")
+
+    # --- 2. BLOQUEO PARA TÉCNICOS ---
+    # Si NO está finalizada, revisamos si es Técnico para aplicarle sus restricciones específicas
+    if es_tecnico(user) and estado in ['En Revisión', 'Pendiente']:
+        raise PermissionDenied("No puedes agregar avances en el estado actual de la orden.")
+
+def verificar_cantidad_fotos(fotos):
+    if len(fotos) > settings.AVANCE_MAX_FOTOS:
+        raise ValidationError({'fotos': f"Máximo {settings.AVANCE_MAX_FOTOS} fotos por avance."})
+
+def verificar_subida(request, campo):
+    """400 si LimiteTamanoUploadHandler descartó algún archivo por tamaño (si no, se perdería en silencio)."""
+    rechazados = getattr(request, 'archivos_rechazados', [])
+    if rechazados:
+        limite = limite_legible()
+        raise ValidationError({campo: [f"'{nombre}' supera el máximo de {limite}." for nombre in rechazados]})
+
+
+def fotos_de_la_subida(request):
+    verificar_subida(request, 'fotos')
+    fotos = request.FILES.getlist('fotos')
+    verificar_cantidad_fotos(fotos)
+    return fotos
+
 class AvanceViewSet(viewsets.ModelViewSet):
-    queryset = Avance.objects.all().order_by('-creado_en')
+    queryset = Avance.objects.prefetch_related('imagenes').order_by('-creado_en')
     serializer_class = AvanceSerializer
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        orden_id = self.request.query_params.get('orden', None)
-        if orden_id:
-            queryset = queryset.filter(orden_id=orden_id)
+        if self.action == 'list':
+            queryset = filtrar_avances(queryset, self.request.query_params)
         return queryset
 
+    # --- EXPORTACIÓN DE LA BITÁCORA (?formato=csv|xlsx; mismos filtros del listado) ---
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        queryset = filtrar_avances(Avance.objects.all(), request.query_params)
+        return respuesta_exportacion(request, queryset, COLUMNAS_AVANCES, 'avances')
+
     def create(self, request, *args, **kwargs):
         orden_id = request.data.get('orden')
         if orden_id:
-            orden = get_object_or_404(OrdenTrabajo, pk=orden_id)
-            
-            # --- 1. BLOQUEO GLOBAL (ABSOLUTO) ---
-            # Si está Finalizado, NADIE puede escribir. Ni el Admin.
-            if orden.estado.nombre == 'Finalizado':
-                raise PermissionDenied("⛔ La orden está FINALIZADA y cerrada. No se pueden agregar más registros.")
-
-            # --- 2. BLOQUEO PARA TÉCNICOS ---
-            # Si NO está finalizada, revisamos si es Técnico para aplicarle sus restricciones específicas
-            es_tecnico = request.user.groups.filter(name='Tecnico').exists()
-            
-            if es_tecnico and orden.estado.nombre in ['En Revisión', 'Pendiente']:
-                 raise PermissionDenied("No puedes agregar avances en el estado actual de la orden.")
-
-        # ... (El resto del código de fotos sigue igual) ...
-        fotos = request.FILES.getlist('fotos')
-        
+            verificar_puede_agregar_avance(get_object_or_404(OrdenTrabajo, pk=orden_id), request.user)
+
+        # --- 3. LÍMITES DE LA SUBIDA ---
+        fotos = fotos_de_la_subida(request)
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        avance = serializer.save()
+        avance = crear_avance_con_fotos(serializer, fotos)
 
-        if fotos:
-            for f in fotos:
-                FotoAvance.objects.create(avance=avance, foto=f)
-        
         return Response(self.get_serializer(avance).data, status=201)
 
 class RegistroUsuarioViewSet(viewsets.ModelViewSet):
@@ -148,40 +353,268 @@ class RegistroUsuarioViewSet(viewsets.ModelViewSet):
     serializer_class = RegistroUsuarioSerializer
     permission_classes = [IsAuthenticated]
 
-# ... (La función generar_reporte_pdf se mantiene igual) ...
-@api_view(['GET'])
+@api_view(['GET', 'POST'])
 def generar_reporte_pdf(request, pk):
-    orden = get_object_or_404(OrdenTrabajo, pk=pk)
-    avances = orden.avances.all().order_by('creado_en')
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'logo.png')
-    template_path = 'reporte_orden.html'
-    context = {
-        'orden': orden, 
-        'avances': avances,
-        'logo_path': logo_path
-    }
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Reporte_Orden_{pk}.pdf"'
-    template = get_template(template_path)
-    html = template.render(context)
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-       return HttpResponse('Error al generar PDF', status=500)
+    orden = get_object_or_404(OrdenTrabajo.objects.select_related('estado', 'cliente', 'tecnico'), pk=pk)
+
+    # POST: modo en segundo plano. Devuelve el id del trabajo para consultar su avance
+    if request.method == 'POST':
+        reporte = encolar_reporte(orden, usuario_modelo(request.user))
+        serializer = ReportePDFSerializer(reporte, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    # GET: generación inmediata, reutilizando el PDF en caché si la orden no cambió
+    revision = revision_reporte(orden)
+    etag = f'"{revision}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        try:
+            contenido = pdf_en_cache(orden, revision)
+        except ErrorReporte:
+            return HttpResponse('Error al generar PDF', status=500)
+        response = HttpResponse(contenido, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="Reporte_Orden_{pk}.pdf"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
+class ReportePDFViewSet(viewsets.ReadOnlyModelViewSet):
+    # Estado de los trabajos de PDF encolados con POST /ordenes/<id>/pdf/
+    queryset = ReportePDF.objects.all().order_by('-creado_en')
+    serializer_class = ReportePDFSerializer
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        reporte = self.get_object()
+        if reporte.estado != 'listo' or not reporte.archivo:
+            return Response({'detail': 'El reporte todavía no está listo.', 'estado': reporte.estado},
+                            status=status.HTTP_409_CONFLICT)
+        return FileResponse(
+            reporte.archivo.open('rb'),
+            as_attachment=True,
+            filename=f'Reporte_Orden_{reporte.orden_id}.pdf',
+            content_type='application/pdf',
+        )
+
 class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Contamos las órdenes según su estado
-        total = OrdenTrabajo.objects.count()
-        pendientes = OrdenTrabajo.objects.filter(estado__nombre='Pendiente').count()
-        progreso = OrdenTrabajo.objects.filter(estado__nombre='En Progreso').count()
-        finalizados = OrdenTrabajo.objects.filter(estado__nombre='Finalizado').count()
+        # Acepta los mismos filtros que /ordenes/ (ej: ?supervisor=3 para el panel de un supervisor)
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), request.query_params)
+        dias = parse_entero(request.query_params, 'dias', 30, 1, 366)
+        semanas = parse_entero(request.query_params, 'semanas', 12, 1, 104)
+        datos = obtener_estadisticas(
+            request.query_params,
+            lambda: calcular_estadisticas(queryset, dias=dias, semanas=semanas),
+        )
+        return Response(datos)
+
+
+# --- CALENDARIO ---
+
+class CalendarioView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        inicio = parse_fecha(params, 'inicio')
+        fin = parse_fecha(params, 'fin', fin_de_dia=True)
+        if not inicio or not fin:
+            raise ValidationError({'detail': "Los parámetros 'inicio' y 'fin' son obligatorios."})
+        if fin <= inicio or (fin - inicio).days > 366:
+            raise ValidationError({'detail': "La ventana debe ser positiva y de máximo un año."})
+
+        tecnico = params.get('tecnico')
+        if tecnico is not None and not tecnico.isdigit():
+            raise ValidationError({'tecnico': "Debe ser un identificador numérico."})
+        eventos = eventos_en_ventana(inicio, fin, int(tecnico) if tecnico else None)
+        return Response(list(eventos))
+
+class CalendarioSuscripcionView(APIView):
+    # Devuelve la URL .ics (firmada) para suscribirse desde el celular
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        tecnico_id = request.query_params.get('tecnico') or request.user.id
+        if not str(tecnico_id).isdigit():
+            raise ValidationError({'tecnico': "Debe ser un identificador numérico."})
+        tecnico_id = int(tecnico_id)
+        if es_tecnico(request.user) and tecnico_id != request.user.id:
+            raise PermissionDenied("Solo puedes suscribirte a tu propio calendario.")
+
+        url = request.build_absolute_uri(reverse('calendario-ics', args=[tecnico_id]))
+        return Response({'url': f'{url}?token={token_suscripcion(tecnico_id)}'})
+
+def calendario_ics(request, tecnico_id):
+    # Vista de Django "pura": los clientes de calendario no envían Authorization
+    if tecnico_de_token(request.GET.get('token', '')) != tecnico_id:
+        return HttpResponseForbidden('Token de suscripción inválido.')
+
+    response = StreamingHttpResponse(
+        generar_ics(ordenes_para_ics(tecnico_id), f'SystMa - Técnico {tecnico_id}'),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'inline; filename="tecnico_{tecnico_id}.ics"'
+    return response
+
+
+# --- RUTA DIARIA DE LOS TÉCNICOS ---
+
+class RutasView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        fecha = parse_fecha(params, 'fecha')
+        fecha = timezone.localdate(fecha) if fecha else timezone.localdate()
+
+        tecnico = params.get('tecnico')
+        if tecnico is not None and not tecnico.isdigit():
+            raise ValidationError({'tecnico': "Debe ser un identificador numérico."})
+        tecnico = int(tecnico) if tecnico else None
+        if es_tecnico(request.user):
+            if tecnico is not None and tecnico != request.user.id:
+                raise PermissionDenied("Solo puedes consultar tu propia ruta.")
+            tecnico = request.user.id
 
+        # Punto de partida opcional (?lat=&lon=); sin él la ruta empieza en la primera parada
+        origen = None
+        if params.get('lat') or params.get('lon'):
+            origen = (parse_numero(params, 'lat', -90, 90), parse_numero(params, 'lon', -180, 180))
+
+        try:
+            rutas = rutas_del_dia(fecha, tecnico_id=tecnico, origen=origen)
+        except ErrorRuta as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'fecha': fecha, 'rutas': rutas})
+
+
+# --- EVENTOS EN TIEMPO REAL (SSE) ---
+
+class EventosTicketView(APIView):
+    """Cambia el JWT por un ticket de un solo uso para abrir GET /api/eventos/?ticket=."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ticket = crear_ticket(request.user, request.auth['exp'])
+        return Response({'ticket': ticket}, status=status.HTTP_201_CREATED)
+
+
+async def eventos_sse(request):
+    # EventSource no permite enviar Authorization: llega un ticket de EventosTicketView
+    if 'wsgi.version' in request.META:
+        # Bajo WSGI el stream infinito bloquearía un hilo; el frontend sigue recargando
+        return JsonResponse({'detail': 'Los eventos en vivo requieren el servidor ASGI.'}, status=503)
+    ticket = request.GET.get('ticket')
+    datos = await consumir_ticket(ticket) if ticket else None
+    if datos is None:
+        return JsonResponse({'detail': 'Ticket inválido, vencido o ya usado.'}, status=401)
+
+    # El stream se corta cuando vence el JWT que pidió el ticket
+    response = StreamingHttpResponse(flujo_sse(datos['canales'], vence=datos['vence']), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# --- SINCRONIZACIÓN INCREMENTAL (celulares de los técnicos) ---
+
+class SincronizacionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        desde = leer_desde(request.query_params)
+        incluir_avances = request.query_params.get('avances', '1') not in ('0', 'false')
+        ahora, completo, ordenes, avances, estados, eliminados = cambios_desde(
+            request.user, desde, incluir_avances=incluir_avances,
+        )
+        contexto = {'request': request}
         return Response({
-            'total': total,
-            'pendientes': pendientes,
-            'en_progreso': progreso,
-            'finalizados': finalizados
-        })
\ No newline at end of file
+            'token': token_sync(ahora),
+            'completo': completo,
+            'ordenes': OrdenTrabajoSerializer(ordenes, many=True, context=contexto).data,
+            'avances': AvanceSerializer(avances, many=True, context=contexto).data,
+            'estados': EstadoSerializer(estados, many=True).data,
+            'eliminados': eliminados,
+        })
+
+
+class SincronizacionAvancesView(APIView):
+    """
+    Sube en un solo request los avances creados sin conexión. multipart con
+    'avances' = JSON [{"id_cliente", "orden", "contenido"}, ...] y las fotos de
+    cada uno en el campo 'fotos_<id_cliente>'. Cada avance se procesa por
+    separado: uno inválido no impide guardar los demás, y reintentar el mismo
+    id_cliente devuelve el avance ya creado.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, JSONParser]
+
+    def post(self, request):
+        lote = request.data.get('avances')
+        if isinstance(lote, str):
+            try:
+                lote = json.loads(lote)
+            except ValueError:
+                raise ValidationError({'avances': "JSON inválido."})
+        if not isinstance(lote, list) or not lote:
+            raise ValidationError({'avances': "Se esperaba una lista de avances."})
+        maximo = settings.SYNC_MAX_AVANCES
+        if len(lote) > maximo:
+            raise ValidationError({'avances': f"Máximo {maximo} avances por lote."})
+        if any(not isinstance(item, dict) or not item.get('id_cliente') for item in lote):
+            raise ValidationError({'avances': "Cada avance necesita su 'id_cliente'."})
+        for item in lote:
+            if str(item.get('orden', '')).isdigit():
+                item['orden'] = int(item['orden'])
+
+        rechazados = set(getattr(request, 'archivos_rechazados', []))
+        existentes = dict(
+            Avance.objects.filter(id_cliente__in=[str(i['id_cliente']) for i in lote]).values_list('id_cliente', 'id')
+        )
+        visibles = set(ordenes_visibles(request.user).filter(
+            id__in=[i.get('orden') for i in lote if isinstance(i.get('orden'), int)]
+        ).values_list('id', flat=True))
+        ordenes = OrdenTrabajo.objects.in_bulk(visibles)
+
+        resultados = []
+        for item in lote:
+            id_cliente = str(item['id_cliente'])
+            if id_cliente in existentes:
+                resultados.append({'id_cliente': id_cliente, 'id': existentes[id_cliente], 'estado': 'duplicado'})
+                continue
+            fotos = request.FILES.getlist(f'fotos_{id_cliente}')
+            try:
+                orden = ordenes.get(item.get('orden'))
+                if orden is None:
+                    raise ValidationError({'orden': "La orden no existe o no está asignada a este usuario."})
+                verificar_puede_agregar_avance(orden, request.user)
+                if any(f.name in rechazados for f in fotos):
+                    raise ValidationError({'fotos': "Alguna foto supera el tamaño máximo."})
+                verificar_cantidad_fotos(fotos)
+                serializer = AvanceSerializer(data={
+                    'orden': orden.id, 'contenido': item.get('contenido', ''), 'id_cliente': id_cliente,
+                }, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+                avance = crear_avance_con_fotos(serializer, fotos)
+            except (ValidationError, PermissionDenied, IntegrityError) as exc:
+                # Si otro request con el mismo id_cliente lo guardó después de leer
+                # `existentes` (falla el INSERT o el validador de unicidad), es un
+                # reintento del celular: se informa como duplicado, no como error
+                if isinstance(exc, IntegrityError) or 'id_cliente' in getattr(exc, 'detail', {}):
+                    previo = Avance.objects.filter(id_cliente=id_cliente).values_list('id', flat=True).first()
+                    if previo is not None:
+                        resultados.append({'id_cliente': id_cliente, 'id': previo, 'estado': 'duplicado'})
+                        continue
+                    if isinstance(exc, IntegrityError):
+                        raise
+                resultados.append({'id_cliente': id_cliente, 'estado': 'error', 'errores': exc.detail})
+                continue
+            existentes[id_cliente] = avance.id
+            resultados.append({'id_cliente': id_cliente, 'id': avance.id, 'estado': 'creado'})
+
+        creados = sum(1 for r in resultados if r['estado'] == 'creado')
+        return Response({'resultados': resultados}, status=status.HTTP_201_CREATED if creados else status.HTTP_200_OK)
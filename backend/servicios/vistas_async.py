@@ -0,0 +1,105 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, ValidationError
+
+from .authentication import RolJWTAuthentication
+from .estadisticas import aobtener_estadisticas, calcular_estadisticas
+from .filters import filtrar_avances, filtrar_ordenes, parse_entero
+from .models import OrdenTrabajo
+from .serializers import AvanceSerializer, OrdenTrabajoSerializer
+from .views import AvanceViewSet, DashboardStatsView, OrdenTrabajoViewSet
+
+# --- LECTURAS ASÍNCRONAS (LECTURAS_ASYNC, servidor ASGI) ---
+# Versiones async de los GET más pedidos: listado de órdenes, avances de una
+# orden y estadísticas del dashboard. Las queries van por el ORM async, así el
+# worker de uvicorn atiende otros requests mientras espera a PostgreSQL. Aceptan
+# los mismos filtros y devuelven el mismo JSON que las vistas DRF; el resto de
+# los métodos (POST) y el listado paginado por cursor se delegan a esas vistas.
+# Serializar no toca la base ni el storage (FK y fotos ya cargadas), así que
+# corre directo en el event loop.
+
+_ordenes_sync = OrdenTrabajoViewSet.as_view({'get': 'list', 'post': 'create'})
+_avances_sync = AvanceViewSet.as_view({'get': 'list', 'post': 'create'})
+_dashboard_sync = DashboardStatsView.as_view()
+
+
+async def _autenticar(request):
+    """(user, None) o (None, respuesta 401). Sin header Authorization el usuario es None."""
+    autenticacion = RolJWTAuthentication()
+    try:
+        resultado = await sync_to_async(autenticacion.authenticate)(request)
+    except AuthenticationFailed as exc:
+        detalle = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        return None, _no_autorizado(detalle, autenticacion, request)
+    return (resultado[0] if resultado else None), None
+
+
+def _no_autorizado(detalle, autenticacion, request):
+    response = JsonResponse(detalle, status=401)
+    response['WWW-Authenticate'] = autenticacion.authenticate_header(request)
+    return response
+
+
+async def _delegar(vista, request):
+    # La respuesta DRF sale sin renderizar; el handler de Django la renderiza
+    return await sync_to_async(vista)(request)
+
+
+@csrf_exempt
+async def ordenes_lista(request):
+    params = request.GET
+    if request.method != 'GET' or 'cursor' in params or 'page_size' in params:
+        return await _delegar(_ordenes_sync, request)
+    _, error = await _autenticar(request)
+    if error:
+        return error
+    try:
+        queryset = filtrar_ordenes(OrdenTrabajoViewSet.queryset.all(), params)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, safe=False)
+
+    ordenes = [orden async for orden in queryset]
+    datos = OrdenTrabajoSerializer(ordenes, many=True, context={'request': request}).data
+    return JsonResponse(datos, safe=False)
+
+
+@csrf_exempt
+async def avances_lista(request):
+    if request.method != 'GET':
+        return await _delegar(_avances_sync, request)
+    _, error = await _autenticar(request)
+    if error:
+        return error
+    try:
+        queryset = filtrar_avances(AvanceViewSet.queryset.all(), request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, safe=False)
+
+    # El prefetch de 'imagenes' también se resuelve en la iteración async
+    avances = [avance async for avance in queryset]
+    datos = AvanceSerializer(avances, many=True, context={'request': request}).data
+    return JsonResponse(datos, safe=False)
+
+
+@csrf_exempt
+async def dashboard_stats(request):
+    if request.method != 'GET':
+        return await _delegar(_dashboard_sync, request)
+    user, error = await _autenticar(request)
+    if error:
+        return error
+    if user is None:
+        return _no_autorizado({'detail': NotAuthenticated.default_detail}, RolJWTAuthentication(), request)
+    params = request.GET
+    try:
+        queryset = filtrar_ordenes(OrdenTrabajo.objects.all(), params)
+        dias = parse_entero(params, 'dias', 30, 1, 366)
+        semanas = parse_entero(params, 'semanas', 12, 1, 104)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, safe=False)
+
+    datos = await aobtener_estadisticas(
+        params, lambda: calcular_estadisticas(queryset, dias=dias, semanas=semanas),
+    )
+    return JsonResponse(datos)
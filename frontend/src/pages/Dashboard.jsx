@@ -42,20 +42,20 @@ export default function Dashboard() {
 
   const fetchData = async () => {
     try {
-      const { data } = await api.get('ordenes/');
+      // Los conteos se calculan en el servidor (ya no se descarga la lista completa)
+      const { data } = await api.get('dashboard-stats/');
       
-      const total = data.length;
-      const pendientes = data.filter(o => o.estado_data?.nombre === 'Pendiente').length;
-      const en_proceso = data.filter(o => o.estado_data?.nombre === 'En Progreso').length;
-      const finalizados = data.filter(o => o.estado_data?.nombre === 'Finalizado').length;
+      const total = data.total;
+      const pendientes = data.pendientes;
+      const en_proceso = data.en_progreso;
+      const finalizados = data.finalizados;
 
       let en_revision = 0;
       if (userRol === 'Administrador') {
-          en_revision = data.filter(o => o.estado_data?.nombre === 'En Revisión').length;
+          en_revision = data.en_revision;
       } else if (userRol === 'Supervisor') {
-          en_revision = data.filter(o => 
-              o.estado_data?.nombre === 'En Revisión' && o.supervisor === userId
-          ).length;
+          const { data: propias } = await api.get('dashboard-stats/', { params: { supervisor: userId } });
+          en_revision = propias.en_revision;
       }
 
       setStats({ total, pendientes, en_proceso, en_revision, finalizados });
@@ -23,6 +23,7 @@ import ArrowForwardIosIcon from '@mui/icons-material/ArrowForwardIos'; // <--- N
 import ArrowBackIosNewIcon from '@mui/icons-material/ArrowBackIosNew'; // <--- Nuevo
 
 import api from '../services/api';
+import { suscribirEventos } from '../services/eventos';
 
 // --- LEAFLET ---
 import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
@@ -66,12 +67,45 @@ export default function DetalleTrabajo() {
     cargarDatos();
   }, [id]);
 
+  // Cambios hechos desde otras pantallas llegan en vivo, sin volver a descargar todo
+  useEffect(() => {
+    return suscribirEventos({
+      'orden.actualizada': (datos) => {
+        if (datos.id !== Number(id)) return;
+        setOrden(prev => prev && {
+          ...prev,
+          estado: datos.estado,
+          estado_data: datos.estado ? { ...prev.estado_data, id: datos.estado, nombre: datos.estado_nombre, color: datos.estado_color } : null,
+          tecnico: datos.tecnico,
+          supervisor: datos.supervisor,
+          fecha_inicio: datos.fecha_inicio,
+          fecha_fin: datos.fecha_fin,
+        });
+      },
+      'avance.creado': async (datos) => {
+        if (datos.orden !== Number(id)) return;
+        const res = await api.get(`avances/${datos.id}/`);
+        agregarAvance(res.data);
+      },
+      'orden.eliminada': (datos) => {
+        if (datos.id === Number(id)) navigate(-1);
+      },
+      'resync': () => cargarDatos(),
+    });
+  }, [id]);
+
+  const agregarAvance = (avance) => {
+    // El avance propio puede llegar dos veces (respuesta del POST y evento en vivo)
+    setAvances(prev => prev.some(a => a.id === avance.id) ? prev : [avance, ...prev]);
+  };
+
   const cargarDatos = async () => {
     try {
       const [resOrden, resAvances, resEstados] = await Promise.all([
         api.get(`ordenes/${id}/`),
         api.get(`avances/?orden=${id}`),
-        api.get('estados/')
+        // Los estados casi nunca cambian: se descargan solo la primera vez
+        estados.length ? Promise.resolve({ data: estados }) : api.get('estados/')
       ]);
       setOrden(resOrden.data);
       setAvances(resAvances.data);
@@ -148,10 +182,10 @@ export default function DetalleTrabajo() {
     }
 
     try {
-      await api.post('avances/', formData);
+      const res = await api.post('avances/', formData);
       setNuevoTexto('');
       setNuevasFotos([]); 
-      cargarDatos(); 
+      agregarAvance(res.data);
     } catch (error) {
       console.error("Error enviando avance", error);
       alert("Error al guardar el avance");
@@ -185,37 +219,30 @@ export default function DetalleTrabajo() {
     }
   };
 
-  // --- ACCIONES DE SUPERVISOR CORREGIDAS ---
-  
+  // --- CAMBIOS DE ESTADO ---
+  // El estado y su registro en la bitácora se guardan juntos en un solo request
+  const aplicarTransicion = async (nombreEstado, motivo = '') => {
+    const destino = estados.find(e => e.nombre === nombreEstado);
+    if (!destino) throw new Error(`Estado ${nombreEstado} no encontrado`);
+    const formData = new FormData();
+    formData.append('estado', destino.id);
+    if (motivo) formData.append('contenido', motivo);
+    const res = await api.post(`ordenes/${id}/transicion/`, formData);
+    setOrden(res.data.orden);
+    agregarAvance(res.data.avance);
+  };
+
   const handleAprobar = async () => {
     // Mantenemos la confirmación inicial de seguridad
     if (!window.confirm("¿Confirmas que el trabajo está correcto y finalizado?")) return;
     
     try {
-        const estadoFinalizado = estados.find(e => e.nombre === 'Finalizado');
-        
-        // 1. Cambiar estado a Finalizado
-        await api.patch(`ordenes/${id}/`, {
-            estado: estadoFinalizado.id,
-            fecha_fin: new Date().toISOString()
-        });
-        
-        // 2. Agregar hito en el historial
-        const formData = new FormData();
-        formData.append('orden', id);
-        formData.append('contenido', '✅ TRABAJO APROBADO Y FINALIZADO POR SUPERVISIÓN.');
-        await api.post('avances/', formData);
-
-        // 3. MOSTRAR MODAL BONITO (En vez de alert + navigate)
+        await aplicarTransicion('Finalizado');
         setSuccessMessage({ 
             title: "¡Orden Finalizada!", 
             subtext: "El trabajo ha sido aprobado correctamente. La orden ahora está cerrada." 
         });
         setShowSuccessModal(true);
-        
-        // 4. Recargar datos para ver el cambio (estado verde) sin recargar la página
-        cargarDatos(); 
-
     } catch (error) {
         console.error("Error al aprobar", error);
         alert("Ocurrió un error al intentar finalizar la orden.");
@@ -226,28 +253,13 @@ export default function DetalleTrabajo() {
     if (!motivoRechazo) return alert("Debes escribir el motivo del rechazo.");
     
     try {
-        const estadoProgreso = estados.find(e => e.nombre === 'En Progreso');
-        
-        // 1. Devolver estado a En Progreso
-        await api.patch(`ordenes/${id}/`, { estado: estadoProgreso.id });
-
-        // 2. Registrar el rechazo en bitácora
-        const formData = new FormData();
-        formData.append('orden', id);
-        formData.append('contenido', `❌ RECHAZADO: ${motivoRechazo}`);
-        await api.post('avances/', formData);
-
-        // 3. MOSTRAR MODAL BONITO
+        await aplicarTransicion('En Progreso', motivoRechazo);
         setSuccessMessage({ 
             title: "Devuelto a Corrección", 
             subtext: "El técnico ha sido notificado y la orden está nuevamente en progreso." 
         });
         setShowSuccessModal(true);
         setOpenRechazo(false); // Cierra el modal de escribir motivo
-        
-        // 4. Actualizar vista
-        cargarDatos();
-
     } catch (error) {
         console.error("Error al rechazar", error);
         alert("Error al rechazar el trabajo.");
@@ -255,44 +267,20 @@ export default function DetalleTrabajo() {
   };
   
   const handleTecnicoAccion = async (nuevoEstadoNombre) => {
-      const nuevoEstado = estados.find(e => e.nombre === nuevoEstadoNombre);
-      if (!nuevoEstado) return alert(`Error: estado ${nuevoEstadoNombre} no encontrado`);
-
       try {
-          let mensajeHistorial = '';
-          let tituloModal = '';
-          let cuerpoModal = '';
-
-          if (nuevoEstadoNombre === 'En Progreso') {
-              mensajeHistorial = '▶ TRABAJO INICIADO POR EL TÉCNICO';
-              tituloModal = '¡Manos a la obra!';
-              cuerpoModal = 'El cronómetro ha iniciado. No olvides registrar tus avances y subir evidencia.';
-          } else {
-              mensajeHistorial = '✋ REVISIÓN SOLICITADA POR EL TÉCNICO';
-              tituloModal = '¡Excelente Trabajo!';
-              cuerpoModal = 'Se ha notificado al supervisor. Mantente atento a la validación.';
-          }
-
-          const formData = new FormData();
-          formData.append('orden', id);
-          formData.append('contenido', mensajeHistorial);
-
-          // --- LÓGICA CORREGIDA ---
+          await aplicarTransicion(nuevoEstadoNombre);
           if (nuevoEstadoNombre === 'En Progreso') {
-              // INICIAR: Primero Estado -> Luego Avance
-              await api.patch(`ordenes/${id}/`, { estado: nuevoEstado.id });
-              await api.post('avances/', formData);
+              setSuccessMessage({
+                  title: '¡Manos a la obra!',
+                  subtext: 'El cronómetro ha iniciado. No olvides registrar tus avances y subir evidencia.',
+              });
           } else {
-              // FINALIZAR: Primero Avance -> Luego Estado
-              // (Si esto está al revés, fallará)
-              await api.post('avances/', formData);
-              await api.patch(`ordenes/${id}/`, { estado: nuevoEstado.id });
+              setSuccessMessage({
+                  title: '¡Excelente Trabajo!',
+                  subtext: 'Se ha notificado al supervisor. Mantente atento a la validación.',
+              });
           }
-
-          setSuccessMessage({ title: tituloModal, subtext: cuerpoModal });
           setShowSuccessModal(true);
-          
-          cargarDatos(); 
       } catch (error) {
           console.error("Error cambiando estado técnico", error);
           alert("Error al actualizar el estado. Intenta nuevamente.");
@@ -12,6 +12,7 @@ import EngineeringIcon from '@mui/icons-material/Engineering';
 import ArrowBackIcon from '@mui/icons-material/ArrowBack';
 import FilterListIcon from '@mui/icons-material/FilterList';
 import RefreshIcon from '@mui/icons-material/Refresh'; // Icono extra para recargar
+import DownloadIcon from '@mui/icons-material/Download';
 
 import api from '../services/api';
 import { useNavigate, useLocation } from 'react-router-dom';
@@ -48,6 +49,26 @@ export default function ListaTrabajos() {
     }
   };
 
+  // Exporta a CSV con los mismos filtros de la pantalla (el servidor lo genera en streaming)
+  const exportarCSV = async () => {
+    const params = { formato: 'csv' };
+    if (filtroEstado !== 'Todos') params.estado = filtroEstado;
+    if (busqueda) params.search = busqueda;
+    try {
+      const response = await api.get('ordenes/exportar/', { params, responseType: 'blob' });
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', 'ordenes.csv');
+      document.body.appendChild(link);
+      link.click();
+      link.parentNode.removeChild(link);
+    } catch (error) {
+      console.error("Error exportando órdenes", error);
+      alert("No se pudo exportar el listado.");
+    }
+  };
+
   const ordenesFiltradas = ordenes.filter(orden => {
     const coincideTexto = 
         orden.titulo.toLowerCase().includes(busqueda.toLowerCase()) ||
@@ -72,6 +93,11 @@ export default function ListaTrabajos() {
         <Typography variant="h5" fontWeight="bold" sx={{ flexGrow: 1 }}>
             Gestión de Órdenes de Trabajo
         </Typography>
+        <Tooltip title="Exportar a CSV">
+            <IconButton onClick={exportarCSV}>
+                <DownloadIcon />
+            </IconButton>
+        </Tooltip>
         <Tooltip title="Recargar datos">
             <IconButton onClick={fetchDatos}>
                 <RefreshIcon />
@@ -31,15 +31,31 @@ export default function MisTrabajos() {
     fetchDatos();
   }, [userRol, navigate]);
 
+  // Sincronización incremental: se guarda lo último recibido y solo se piden los cambios
+  const CLAVE_SYNC = `sync_trabajos_${currentUserId}`;
+
   const fetchDatos = async () => {
+    let cache = null;
+    try {
+      cache = JSON.parse(localStorage.getItem(CLAVE_SYNC));
+    } catch {
+      cache = null;
+    }
+    if (cache) {
+      setOrdenes(cache.ordenes);
+      setEstados(cache.estados);
+      setLoading(false);
+    }
     try {
-      const [resOrdenes, resEstados] = await Promise.all([
-        api.get('ordenes/'),
-        api.get('estados/')
-      ]);
-      const misOrdenes = resOrdenes.data.filter(orden => orden.tecnico === currentUserId);
-      setOrdenes(misOrdenes);
-      setEstados(resEstados.data);
+      const res = await api.get('sync/', { params: { avances: 0, ...(cache ? { token: cache.token } : {}) } });
+      const { token, completo, ordenes: cambiadas, estados: nuevosEstados, eliminados } = res.data;
+      const base = completo || !cache ? [] : cache.ordenes;
+      const quitar = new Set([...eliminados.ordenes, ...cambiadas.map(o => o.id)]);
+      const actuales = [...base.filter(o => !quitar.has(o.id)), ...cambiadas];
+      const estadosActuales = nuevosEstados.length || !cache ? nuevosEstados : cache.estados;
+      setOrdenes(actuales);
+      setEstados(estadosActuales);
+      localStorage.setItem(CLAVE_SYNC, JSON.stringify({ token, ordenes: actuales, estados: estadosActuales }));
     } catch (error) {
       console.error("Error cargando datos", error);
     } finally {
@@ -0,0 +1,48 @@
+import api from './api';
+
+// Eventos en vivo del backend (Server-Sent Events en /api/eventos/).
+// EventSource no permite enviar cabeceras: se pide un ticket de un solo uso
+// (POST eventos/ticket/, con el JWT normal) y se abre el stream con ?ticket=.
+// El backend corta el stream con 'expirado' cuando vence el access token; se
+// pide otro ticket con el token guardado y, si sigue valiendo, se reconecta.
+// Si el backend no corre con ASGI responde 503 y EventSource se cierra solo:
+// las pantallas siguen funcionando con sus recargas normales.
+export function suscribirEventos(handlers) {
+    if (!localStorage.getItem('access_token') || typeof EventSource === 'undefined') return () => {};
+
+    let fuente = null;
+    let cerrado = false;
+
+    const conectar = async () => {
+        if (cerrado) return;
+        let ticket;
+        try {
+            ({ data: { ticket } } = await api.post('eventos/ticket/'));
+        } catch {
+            return;
+        }
+        if (cerrado) return;
+        fuente = new EventSource(`${api.defaults.baseURL}eventos/?ticket=${encodeURIComponent(ticket)}`);
+        Object.entries(handlers).forEach(([tipo, handler]) => {
+            fuente.addEventListener(tipo, (e) => handler(JSON.parse(e.data || '{}')));
+        });
+        fuente.addEventListener('expirado', () => {
+            fuente.close();
+            conectar();
+        });
+        // Un ticket ya usado no sirve para la reconexión automática de EventSource:
+        // si la conexión llegó a abrirse y se cayó, se pide otro ticket.
+        let abierta = false;
+        fuente.onopen = () => { abierta = true; };
+        fuente.onerror = () => {
+            fuente.close();
+            if (abierta && !cerrado) setTimeout(conectar, 5000);
+        };
+    };
+
+    conectar();
+    return () => {
+        cerrado = true;
+        if (fuente) fuente.close();
+    };
+}